@@ -5,6 +5,16 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
 
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_save
+
+        from .identity_cache import user_deleted, user_saved
+
+        User = get_user_model()
+        post_save.connect(user_saved, sender=User, dispatch_uid='accounts.identity_cache.saved')
+        post_delete.connect(user_deleted, sender=User, dispatch_uid='accounts.identity_cache.deleted')
+
 
 
 
@@ -0,0 +1,169 @@
+"""
+Cache of verified JWT identities.
+
+Authenticating a JWT means decoding it and loading the user by username, a
+``User`` SELECT on every authenticated request. Verified tokens are cached
+here, keyed by the token's ``jti`` or its SHA-256, as a minimal snapshot of
+the user (pk, username, is_active, is_staff). The snapshot lives in a
+per-process LRU backed by the shared cache and never outlives the token's
+``exp``. A hit is turned back into a ``User`` instance with every other field
+deferred, so a cache hit costs no query at all.
+
+Saving a user's password, ``is_active``, ``is_staff`` or username, or deleting
+the user, bumps that user's version in the shared cache. Older snapshots then
+stop matching: immediately in the process that made the change, and within
+``JWT_IDENTITY_LOCAL_TTL_SECONDS`` in other workers.
+"""
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.lru import LRUCache
+
+KEY_PREFIX = 'jwtident:'
+VERSION_PREFIX = 'jwtuserver:'
+
+# Saving any of these (or saving without update_fields) invalidates the user's tokens
+SENSITIVE_FIELDS = frozenset({'password', 'is_active', 'is_staff', 'username'})
+
+_local = LRUCache(settings.JWT_IDENTITY_CACHE_SIZE)
+
+
+def token_key(token: str, payload: Optional[Dict[str, Any]] = None) -> str:
+    jti = (payload or {}).get('jti')
+    if jti:
+        return f"{KEY_PREFIX}jti:{jti}"
+    return KEY_PREFIX + hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _version_key(user_pk) -> str:
+    return f"{VERSION_PREFIX}{user_pk}"
+
+
+def _user_version(user_pk) -> int:
+    return cache.get(_version_key(user_pk), 0)
+
+
+def _snapshot_user(snapshot: Dict[str, Any]):
+    UserModel = get_user_model()
+    field_names = [UserModel._meta.pk.attname, UserModel.USERNAME_FIELD, 'is_active', 'is_staff']
+    values = [snapshot['pk'], snapshot['username'], snapshot['is_active'], snapshot['is_staff']]
+    return UserModel.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+
+def _lookup(key: str, now: float) -> Optional[Dict[str, Any]]:
+    entry = _local.get(key)
+    if entry is not None and entry['exp'] > now:
+        if entry['checked_at'] + settings.JWT_IDENTITY_LOCAL_TTL_SECONDS > now:
+            return entry
+        if _user_version(entry['pk']) == entry['version']:
+            entry['checked_at'] = now
+            return entry
+
+    entry = cache.get(key)
+    if entry is None or entry['exp'] <= now or _user_version(entry['pk']) != entry['version']:
+        return None
+    entry = dict(entry, checked_at=now)
+    _local.set(key, entry)
+    return entry
+
+
+def _store(key: str, user, payload: Dict[str, Any], version: int, now: float) -> None:
+    ttl = settings.JWT_IDENTITY_CACHE_TTL_SECONDS
+    exp = payload.get('exp')
+    if exp is not None:
+        ttl = min(ttl, int(exp - now))
+    if ttl <= 0:
+        return
+    entry = {
+        'pk': user.pk,
+        'username': user.get_username(),
+        'is_active': user.is_active,
+        'is_staff': user.is_staff,
+        'version': version,
+        'exp': now + ttl,
+    }
+    cache.set(key, entry, timeout=ttl)
+    _local.set(key, dict(entry, checked_at=now))
+
+
+def get_user_by_token(token: str, context=None):
+    """
+    Drop-in for ``graphql_jwt.shortcuts.get_user_by_token``: returns the user
+    for a valid token, raising ``JSONWebTokenError`` for invalid ones.
+    """
+    now = time.time()
+    key = token_key(token)
+    entry = _lookup(key, now)
+    if entry is not None:
+        return _snapshot_user(entry)
+
+    from graphql_jwt.utils import get_payload, get_user_by_payload
+
+    payload = get_payload(token, context)
+    if payload.get('jti'):
+        key = token_key(token, payload)
+        entry = _lookup(key, now)
+        if entry is not None:
+            return _snapshot_user(entry)
+
+    user = get_user_by_payload(payload)
+    if user is not None:
+        _store(key, user, payload, _user_version(user.pk), now)
+    return user
+
+
+class CachedJSONWebTokenBackend:
+    """``graphql_jwt.backends.JSONWebTokenBackend`` using the identity cache."""
+
+    def authenticate(self, request=None, **kwargs):
+        if request is None or getattr(request, '_jwt_token_auth', False):
+            return None
+
+        from graphql_jwt.utils import get_credentials
+
+        token = get_credentials(request, **kwargs)
+        if token is not None:
+            return get_user_by_token(token, request)
+        return None
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            return UserModel._default_manager.get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+
+
+def invalidate_user(user_pk) -> None:
+    """Invalidate every cached identity of the user."""
+    key = _version_key(user_pk)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+    _local.discard_if(lambda _, entry: entry['pk'] == user_pk)
+
+
+def _invalidate_on_commit(user_pk) -> None:
+    # Bump now, and again once the change is committed, so a request that
+    # read the old row before the commit cannot cache it under the new version
+    invalidate_user(user_pk)
+    transaction.on_commit(lambda: invalidate_user(user_pk))
+
+
+def user_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is None or SENSITIVE_FIELDS.intersection(update_fields):
+        _invalidate_on_commit(instance.pk)
+
+
+def user_deleted(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.pk)
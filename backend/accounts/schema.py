@@ -1,15 +1,18 @@
 import graphene
 from graphene_django import DjangoObjectType
 from django.contrib.auth import get_user_model
+from core.response_cache import PRIVATE, cache_hint
 from .models import UserProfile
 
 
+@cache_hint(max_age=60, scope=PRIVATE)
 class UserType(DjangoObjectType):
     class Meta:
         model = get_user_model()
         fields = ("id", "username", "email",)
 
 
+@cache_hint(max_age=60, scope=PRIVATE)
 class UserProfileType(DjangoObjectType):
     class Meta:
         model = UserProfile
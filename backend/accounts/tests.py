@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+
+from . import identity_cache
+
+
+class IdentityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        identity_cache._local.clear()
+        User = get_user_model()
+        self.alice = User.objects.create_user('alice', password='pw', is_staff=True)
+        self.bob = User.objects.create_user('bob', password='pw')
+        self.alice_token = get_token(self.alice)
+        self.bob_token = get_token(self.bob)
+
+    def test_cache_hit_runs_no_queries(self):
+        with self.assertNumQueries(1):
+            identity_cache.get_user_by_token(self.alice_token)
+
+        with CaptureQueriesContext(connection) as queries:
+            user = identity_cache.get_user_by_token(self.alice_token)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(user.pk, self.alice.pk)
+        self.assertEqual(user.get_username(), 'alice')
+        self.assertTrue(user.is_staff)
+        self.assertTrue(user.is_authenticated)
+
+    def test_shared_cache_hit_runs_no_queries(self):
+        identity_cache.get_user_by_token(self.alice_token)
+        identity_cache._local.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            user = identity_cache.get_user_by_token(self.alice_token)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(user.pk, self.alice.pk)
+
+    def test_invalidate_user_evicts_only_that_user(self):
+        identity_cache.get_user_by_token(self.alice_token)
+        identity_cache.get_user_by_token(self.bob_token)
+
+        identity_cache.invalidate_user(self.alice.pk)
+
+        self.assertEqual(len(identity_cache._local), 1)
+        with self.assertNumQueries(0):
+            identity_cache.get_user_by_token(self.bob_token)
+        with self.assertNumQueries(1):
+            identity_cache.get_user_by_token(self.alice_token)
+
+    def test_sensitive_save_refreshes_snapshot(self):
+        identity_cache.get_user_by_token(self.alice_token)
+
+        self.alice.is_staff = False
+        self.alice.save(update_fields=['is_staff'])
+
+        self.assertFalse(identity_cache.get_user_by_token(self.alice_token).is_staff)
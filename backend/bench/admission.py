@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Admission control of playback sessions (core.admission) on the stream-only
+entry point behind the reverse proxy.
+
+Runs the /stream/ proxy (stream-only settings, read-ahead off) against a
+local fake Jellyfin. Every request arrives from 127.0.0.1 like it does from
+nginx, with the viewer's address in ``X-Forwarded-For``:
+
+- ``viewers``: ``--viewers`` clients each start ``ADMISSION_STREAMS_PER_USER``
+  sessions. Each client has its own limits, so none may be refused.
+- ``over_cap``: one client starts one session more than its cap. Only that
+  session is refused, with ``429`` and ``Retry-After``.
+- ``spoofed``: a client connecting directly (not through a trusted proxy)
+  sends a different ``X-Forwarded-For`` with every session. The header is
+  ignored, so it is held to one client's cap.
+
+    python bench/admission.py --viewers 20 --check
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+STREAMS_PER_USER = 2
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--viewers', type=int, default=20)
+    parser.add_argument('--check', action='store_true', help='fail unless every phase behaves as described')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from bench.fake_jellyfin import FakeJellyfin
+
+    upstream = FakeJellyfin(library_size=1, segment_bytes=4096).start()
+    os.environ['JELLYFIN_URL'] = upstream.url
+    os.environ['STREAM_READAHEAD_SEGMENTS'] = '0'
+    os.environ['ADMISSION_ENABLED'] = 'true'
+    os.environ['ADMISSION_STREAMS_PER_USER'] = str(STREAMS_PER_USER)
+    os.environ['ADMISSION_STREAM_START_BURST'] = str(STREAMS_PER_USER * 2)
+    os.environ['ADMISSION_MAX_TRANSCODES'] = str((args.viewers + 2) * STREAMS_PER_USER * 2)
+    os.environ['TRUSTED_PROXIES'] = '127.0.0.1'
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'core.stream_settings'
+    os.environ.setdefault('USE_SQLITE', 'true')
+
+    import django
+    django.setup()
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from core import admission
+    from videos.jellyfin_client import build_signed_url
+
+    setup_test_environment()
+    # Refusals are the point here, not worth a warning each
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    client = Client()
+    sequence = iter(range(10 ** 9))
+
+    def start_session(remote_addr: str, forwarded_for: str):
+        item = f"{next(sequence):032x}"
+        response = client.get(
+            build_signed_url(f'/stream/{item}/segment0.ts', 3600),
+            REMOTE_ADDR=remote_addr, HTTP_X_FORWARDED_FOR=forwarded_for,
+        )
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, response.get('Retry-After'), len(body)
+
+    results = {}
+
+    statuses = [
+        start_session('127.0.0.1', f"198.51.100.{viewer}")[0]
+        for viewer in range(1, args.viewers + 1) for _ in range(STREAMS_PER_USER)
+    ]
+    results['viewers'] = {
+        'sessions': len(statuses), 'admitted': statuses.count(200), 'rejected': statuses.count(429),
+    }
+
+    over = [start_session('127.0.0.1', '203.0.113.7') for _ in range(STREAMS_PER_USER + 1)]
+    results['over_cap'] = {
+        'sessions': len(over),
+        'admitted': sum(1 for status, _, _ in over if status == 200),
+        'rejected': sum(1 for status, _, _ in over if status == 429),
+        'retry_after': over[-1][1],
+    }
+
+    spoofed = [
+        start_session('192.0.2.10', f"198.51.100.{200 + i}")[0] for i in range(STREAMS_PER_USER + 3)
+    ]
+    results['spoofed'] = {
+        'sessions': len(spoofed), 'admitted': spoofed.count(200), 'rejected': spoofed.count(429),
+    }
+    results['admission'] = admission.stats()
+    upstream.stop()
+
+    failed = (
+        results['viewers']['rejected'] != 0
+        or results['over_cap']['admitted'] != STREAMS_PER_USER
+        or results['over_cap']['rejected'] != 1
+        or not results['over_cap']['retry_after']
+        or results['spoofed']['admitted'] != STREAMS_PER_USER
+    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for phase in ('viewers', 'over_cap', 'spoofed'):
+            r = results[phase]
+            print(f"{phase:>8}: {r['sessions']} sessions, {r['admitted']} admitted, {r['rejected']} rejected")
+        print(f"Retry-After on the refused session: {results['over_cap']['retry_after']}")
+        if failed:
+            print('admission did not tell the clients apart as expected')
+    return 1 if (args.check and failed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""
+Latency of multi-field GraphQL operations over the Jellyfin-backed fields
+(``jellyfinVideo``, ``jellyfinVideos``), sync versus async resolvers
+(core.async_execution, videos.jellyfin_async).
+
+A local fake Jellyfin adds ``--upstream-delay`` seconds to every request.
+Each operation is timed three ways:
+
+- ``sync``: the same Jellyfin calls made one after another with the
+  synchronous ``JellyfinClient``, which is what sync resolvers would do
+- ``wsgi``: through the served schema and ``PersistedGraphQLView`` from a
+  plain request, so the async phase runs on a short-lived loop
+- ``asgi``: through the view from an ASGI request on a long-lived loop, as
+  under uvicorn, sharing one Jellyfin client
+
+``--check`` fails the run unless every operation with more than one upstream
+call is at least ``--min-speedup`` times faster async (under both WSGI and
+ASGI) than sync.
+
+    python bench/async_graphql.py --upstream-delay 0.1 --runs 10 --check
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+ITEM = '{:032x}'.format
+
+# name -> (document, Jellyfin calls as ('item', index) or ('items', None))
+OPERATIONS = {
+    'one_video': (
+        '{ jellyfinVideo(id: "%s") { title } }' % ITEM(1),
+        [('item', 1)],
+    ),
+    'two_videos_and_list': (
+        '{ a: jellyfinVideo(id: "%s") { title } b: jellyfinVideo(id: "%s") { title } jellyfinVideos { id } }'
+        % (ITEM(1), ITEM(2)),
+        [('item', 1), ('item', 2), ('items', None)],
+    ),
+    'five_videos': (
+        '{ %s }' % ' '.join(f'v{i}: jellyfinVideo(id: "{ITEM(i)}") {{ title playbackUrl }}' for i in range(5)),
+        [('item', i) for i in range(5)],
+    ),
+}
+
+
+def _median_ms(fn, runs: int) -> float:
+    fn()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--upstream-delay', type=float, default=0.1, help='seconds added to every upstream GET')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--check', action='store_true', help='fail unless multi-call operations run concurrently')
+    parser.add_argument('--min-speedup', type=float, default=1.5)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from bench.fake_jellyfin import FakeJellyfin
+
+    upstream = FakeJellyfin(library_size=20, delay=args.upstream_delay).start()
+    os.environ['JELLYFIN_URL'] = upstream.url
+    os.environ.pop('JELLYFIN_URLS', None)
+    os.environ['JELLYFIN_USER_ID'] = 'bench'
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'core.settings'
+    os.environ.setdefault('USE_SQLITE', 'true')
+    os.environ['GRAPHQL_COST_BUDGET'] = str(10 ** 9)
+    os.environ['ADMISSION_ENABLED'] = 'false'
+    # Every run must reach Jellyfin
+    os.environ['GRAPHQL_RESPONSE_CACHE_ENABLED'] = 'false'
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = ':memory:'
+    import django
+    django.setup()
+    from asgiref.sync import sync_to_async
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import AsyncRequestFactory, RequestFactory
+    from core.views import PersistedGraphQLView
+    from videos import backends
+
+    view = PersistedGraphQLView.as_view()
+    sync_client = backends.client()
+
+    def sync(calls):
+        for kind, index in calls:
+            if kind == 'item':
+                sync_client.get_item(ITEM(index))
+            else:
+                sync_client.list_items()
+
+    def check(response):
+        assert response.status_code == 200, response.content
+        body = json.loads(response.content)
+        assert not body.get('errors'), body['errors']
+
+    def through_wsgi(document):
+        request = RequestFactory().post('/graphql/', {'query': document}, content_type='application/json')
+        request.user = AnonymousUser()
+        check(view(request))
+
+    loop = asyncio.new_event_loop()
+
+    def through_asgi(document):
+        request = AsyncRequestFactory().post('/graphql/', {'query': document}, content_type='application/json')
+        request.user = AnonymousUser()
+        check(loop.run_until_complete(sync_to_async(view)(request)))
+
+    results = {}
+    for name, (document, calls) in OPERATIONS.items():
+        results[name] = {
+            'upstream_calls': len(calls),
+            'sync_ms': _median_ms(lambda: sync(calls), args.runs),
+            'wsgi_ms': _median_ms(lambda: through_wsgi(document), args.runs),
+            'asgi_ms': _median_ms(lambda: through_asgi(document), args.runs),
+        }
+    loop.close()
+    upstream.stop()
+
+    failed = []
+    for name, r in results.items():
+        r['speedup'] = round(r['sync_ms'] / max(r['wsgi_ms'], r['asgi_ms']), 2)
+        if r['upstream_calls'] > 1 and r['speedup'] < args.min_speedup:
+            failed.append(name)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, r in results.items():
+            print(
+                f"{name:>20}: {r['upstream_calls']} upstream calls, sync {r['sync_ms']:.0f} ms, "
+                f"async {r['wsgi_ms']:.0f} ms (wsgi) / {r['asgi_ms']:.0f} ms (asgi), {r['speedup']:.2f}x"
+            )
+        if failed:
+            print(f"under {args.min_speedup}x: {', '.join(failed)}")
+    return 1 if (args.check and failed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
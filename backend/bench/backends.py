@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Routing, failover and recovery of the Jellyfin backend pool (videos.backends)
+against several local fake Jellyfin servers.
+
+Runs the /stream/ proxy (stream-only settings, read-ahead off) in front of
+``--nodes`` fake instances and fetches one segment of ``--items`` items per
+phase:
+
+- ``spread``: share of items owned by each node
+- ``sticky``: the same items again; each must land on the node it did before
+- ``failover``: one node answers 503; every request must still succeed
+- ``recovery``: the node is healthy again and gets its items back after the
+  next health check
+
+It also reports the share of items that move when a node is added to the
+ring; consistent hashing keeps it near 1/(N+1).
+
+    python bench/backends.py --nodes 3 --items 300
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+HEALTH_INTERVAL = 0.2
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--items', type=int, default=300)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from bench.fake_jellyfin import FakeJellyfin
+
+    fakes = [FakeJellyfin(library_size=1, segment_bytes=4096).start() for _ in range(args.nodes)]
+    os.environ['JELLYFIN_URLS'] = ','.join(fake.url for fake in fakes)
+    os.environ['JELLYFIN_HEALTH_INTERVAL_SECONDS'] = str(HEALTH_INTERVAL)
+    os.environ['STREAM_READAHEAD_SEGMENTS'] = '0'
+    # Hundreds of items from one client would hit the stream start limits
+    os.environ['ADMISSION_ENABLED'] = 'false'
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'core.stream_settings'
+    os.environ.setdefault('USE_SQLITE', 'true')
+
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from videos import backends
+    from videos.jellyfin_client import build_signed_url
+
+    setup_test_environment()
+    client = Client()
+    items = [f"{i:032x}" for i in range(args.items)]
+
+    def fetch_all():
+        before = [fake.calls['segment'] for fake in fakes]
+        errors = 0
+        for item in items:
+            response = client.get(build_signed_url(f'/stream/{item}/segment0.ts', 3600))
+            if response.status_code != 200:
+                errors += 1
+            # Error answers (403, 429, 502) are not streamed
+            b''.join(response.streaming_content) if response.streaming else response.content
+        return [fake.calls['segment'] - b for fake, b in zip(fakes, before)], errors
+
+    results = {}
+    spread, errors = fetch_all()
+    results['spread'] = {'segments_per_node': spread, 'errors': errors}
+
+    owners = {item: backends.pool().ring(item)[0].url for item in items}
+    sticky, errors = fetch_all()
+    results['sticky'] = {'segments_per_node': sticky, 'errors': errors, 'same_as_spread': sticky == spread}
+
+    fakes[0].failing = True
+    failover, errors = fetch_all()
+    results['failover'] = {
+        'segments_per_node': failover, 'errors': errors,
+        'node_stats': backends.stats(),
+    }
+
+    fakes[0].failing = False
+    time.sleep(HEALTH_INTERVAL * 3)
+    recovery, errors = fetch_all()
+    results['recovery'] = {'segments_per_node': recovery, 'errors': errors, 'same_as_spread': recovery == spread}
+
+    grown = backends.Pool(
+        [fake.url for fake in fakes] + ['http://127.0.0.1:1'], settings.JELLYFIN_RING_REPLICAS
+    )
+    moved = sum(1 for item in items if grown.ring(item)[0].url != owners[item])
+    results['add_node'] = {'moved_share': round(moved / len(items), 3), 'ideal_share': round(1 / (args.nodes + 1), 3)}
+
+    for fake in fakes:
+        fake.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for phase in ('spread', 'sticky', 'failover', 'recovery'):
+        r = results[phase]
+        extra = f", same routing as spread: {r['same_as_spread']}" if 'same_as_spread' in r else ''
+        print(f"{phase:>9}: segments per node {r['segments_per_node']}, errors {r['errors']}{extra}")
+    print(
+        f"add node: {results['add_node']['moved_share']:.1%} of items move "
+        f"(ideal {results['add_node']['ideal_share']:.1%})"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
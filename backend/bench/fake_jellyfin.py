@@ -0,0 +1,197 @@
+"""
+Local stand-in for the parts of the Jellyfin API the backend talks to.
+
+    server = FakeJellyfin(library_size=500, segment_bytes=256 * 1024).start()
+    os.environ['JELLYFIN_URL'] = server.url
+    ...
+    server.stop()
+
+Serves ``/Users/<user>/Items`` (synthetic library, paged with ``StartIndex`` and
+``Limit`` like Jellyfin), ``/Users/<user>/Items/<id>``,
+``/Videos/<id>/master.m3u8``, per-variant playlists and synthetic segments,
+``/System/Ping`` and ``/Library/Refresh``. Request counts per route kind are
+kept in ``server.calls``. Setting ``server.failing`` makes every request
+answer 503, as an overloaded or restarting instance would.
+
+Run it standalone with ``python bench/fake_jellyfin.py --port 8096``.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = ['Drama', 'Comedy', 'Documentary', 'Action', 'Animation']
+VARIANTS = [(800_000, '854x480'), (2_800_000, '1280x720'), (5_000_000, '1920x1080')]
+SEGMENT_SECONDS = 6
+
+
+def make_item(index: int):
+    item_id = f"{index:032x}"
+    return {
+        'Id': item_id,
+        'Name': f"Title {index}",
+        'Overview': f"Synthetic item {index} for benchmarks.",
+        'RunTimeTicks': (600 + index % 3000) * 10_000_000,
+        'Genres': [GENRES[index % len(GENRES)]],
+        'Path': f"/media/title_{index}.mp4",
+        'Type': 'Movie',
+    }
+
+
+def master_playlist() -> str:
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for i, (bandwidth, resolution) in enumerate(VARIANTS):
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={resolution}")
+        lines.append(f"{i}/index.m3u8")
+    return '\n'.join(lines) + '\n'
+
+
+def variant_playlist(segments: int) -> str:
+    lines = [
+        '#EXTM3U', '#EXT-X-VERSION:3', f"#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}",
+        '#EXT-X-PLAYLIST-TYPE:VOD', '#EXT-X-MEDIA-SEQUENCE:0',
+    ]
+    for n in range(segments):
+        lines.append(f"#EXTINF:{SEGMENT_SECONDS}.000,")
+        lines.append(f"segment{n}.ts")
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+class FakeJellyfin:
+    def __init__(self, library_size: int = 100, segment_bytes: int = 256 * 1024,
+                 segments: int = 100, delay: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.library_size = library_size
+        self.segment_bytes = segment_bytes
+        self.segments = segments
+        self.delay = delay
+        self.failing = False
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._items = [make_item(i) for i in range(library_size)]
+        self._items_body = json.dumps({'Items': self._items, 'TotalRecordCount': library_size}).encode()
+        self._segment = bytes(range(256)) * (segment_bytes // 256) + bytes(segment_bytes % 256)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, kind: str) -> None:
+        with self._lock:
+            self.calls[kind] += 1
+
+    def items_body(self, query: str) -> bytes:
+        params = parse_qs(query)
+        if 'StartIndex' not in params and 'Limit' not in params:
+            return self._items_body
+        start = int(params.get('StartIndex', ['0'])[0])
+        limit = int(params.get('Limit', [str(self.library_size)])[0])
+        page = self._items[start:start + limit]
+        return json.dumps({'Items': page, 'TotalRecordCount': self.library_size, 'StartIndex': start}).encode()
+
+    def start(self) -> 'FakeJellyfin':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this small
+            # responses wait for the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def do_POST(self):
+                if fake.failing:
+                    return self._send(503, b'', 'text/plain')
+                path = urlparse(self.path).path
+                if path == '/Library/Refresh':
+                    fake.count('refresh')
+                    return self._send(204, b'', 'text/plain')
+                return self._send(404, b'', 'text/plain')
+
+            def do_GET(self):
+                if fake.failing:
+                    return self._send(503, b'', 'text/plain')
+                url = urlparse(self.path)
+                path = url.path
+                if path == '/System/Ping':
+                    fake.count('ping')
+                    return self._send(200, b'"Jellyfin Server"', 'application/json')
+                if fake.delay:
+                    time.sleep(fake.delay)
+                if re.fullmatch(r'/Users/[^/]+/Items', path):
+                    fake.count('items')
+                    return self._send(200, fake.items_body(url.query), 'application/json')
+                m = re.fullmatch(r'/Users/[^/]+/Items/([0-9a-f]+)', path)
+                if m:
+                    fake.count('item')
+                    index = int(m.group(1), 16)
+                    if index >= fake.library_size:
+                        return self._send(404, b'', 'application/json')
+                    return self._send(200, json.dumps(fake._items[index]).encode(), 'application/json')
+                m = re.fullmatch(r'/Videos/[^/]+/(.+)', path)
+                if m:
+                    name = m.group(1)
+                    if name == 'master.m3u8':
+                        fake.count('master')
+                        return self._send(200, master_playlist().encode(), 'application/vnd.apple.mpegurl')
+                    if name.endswith('.m3u8'):
+                        fake.count('playlist')
+                        return self._send(200, variant_playlist(fake.segments).encode(), 'application/vnd.apple.mpegurl')
+                    fake.count('segment')
+                    return self._send(200, fake._segment, 'video/mp2t')
+                m = re.fullmatch(r'/Items/[^/]+/Images/.+', path)
+                if m:
+                    fake.count('image')
+                    return self._send(200, b'\xff\xd8\xff\xd9', 'image/jpeg')
+                return self._send(404, b'', 'text/plain')
+
+            do_HEAD = do_GET
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a fake Jellyfin server')
+    parser.add_argument('--port', type=int, default=8096)
+    parser.add_argument('--library-size', type=int, default=500)
+    parser.add_argument('--segment-bytes', type=int, default=256 * 1024)
+    parser.add_argument('--segments', type=int, default=100, help='segments per variant playlist')
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds of latency added to every GET')
+    args = parser.parse_args()
+    server = FakeJellyfin(args.library_size, args.segment_bytes, args.segments, delay=args.delay, port=args.port).start()
+    print(f"fake Jellyfin listening on {server.url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
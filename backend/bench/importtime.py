@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Startup import-time benchmark.
+
+Runs each boot target in a fresh interpreter under ``python -X importtime``
+and reports the total import time (sum of per-module self times) and the
+slowest top-level imports. With ``--check`` the best of ``--runs`` runs is
+compared against ``bench/importtime_budget.json`` and the script exits
+non-zero if any target is over budget.
+
+    python bench/importtime.py --check
+    python bench/importtime.py --target stream --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BUDGET_PATH = Path(__file__).resolve().parent / 'importtime_budget.json'
+
+_BOOT = (
+    "import os\n"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')\n"
+    "import core.wsgi\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+)
+
+TARGETS = {
+    # A worker after boot, before serving its first request
+    'wsgi': _BOOT,
+    # The stream-only entry point plus what its first request pulls in
+    'stream': _BOOT.replace('core.settings', 'core.stream_settings').replace('core.wsgi', 'core.stream_wsgi')
+    + "import requests\n",
+    # ...plus what the first /graphql/ request pulls in
+    'graphql': _BOOT + "import core.views, core.schema\n",
+}
+
+
+def measure(code: str):
+    env = dict(os.environ)
+    env.setdefault('USE_SQLITE', 'true')
+    env['PYTHONPATH'] = str(BACKEND_DIR) + os.pathsep + env.get('PYTHONPATH', '')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr)
+    total_us = 0
+    top = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        total_us += int(self_us)
+        if not name.startswith('  '):
+            top.append((int(cumulative_us), name.strip()))
+    top.sort(reverse=True)
+    return total_us / 1000, top
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=sorted(TARGETS), action='append')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--check', action='store_true', help='fail if a target exceeds its budget')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    budgets = json.loads(BUDGET_PATH.read_text()) if BUDGET_PATH.exists() else {}
+    results = {}
+    failed = False
+    for target in args.target or sorted(TARGETS):
+        best_ms, best_top = None, []
+        for _ in range(args.runs):
+            total_ms, top = measure(TARGETS[target])
+            if best_ms is None or total_ms < best_ms:
+                best_ms, best_top = total_ms, top
+        budget = budgets.get(target)
+        over = budget is not None and best_ms > budget
+        failed = failed or over
+        results[target] = {
+            'import_ms': round(best_ms, 1),
+            'budget_ms': budget,
+            'top': [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for us, name in best_top[:args.top]],
+        }
+        if not args.json:
+            status = 'OVER BUDGET' if over else 'ok'
+            print(f"{target}: {best_ms:.1f} ms (budget {budget} ms) {status}")
+            for us, name in best_top[:args.top]:
+                print(f"    {us / 1000:8.1f} ms  {name}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 1 if (args.check and failed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
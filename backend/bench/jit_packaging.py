@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+CPU saved by just-in-time packaging against its first-play latency.
+
+Packages one input twice through ``generate_assets_for_video``: all renditions
+up front, then only the lowest one (``MEDIA_JIT_PACKAGING``). Then plays the
+top variant of the on-demand copy through ``/hls/``: the first request of a
+segment transcodes it, the second is served from the disk cache. Finally,
+concurrent requests for one uncached segment check that it is generated once.
+
+    python bench/jit_packaging.py /path/to/input.mp4 --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _children_cpu() -> float:
+    t = os.times()
+    return t.children_user + t.children_system
+
+
+def _setup(work_dir: str):
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    os.environ.setdefault('USE_SQLITE', 'true')
+    os.environ['MEDIA_STORAGE'] = 'local'
+    os.environ['MEDIA_JIT_CACHE_DIR'] = os.path.join(work_dir, 'jit_cache')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = os.path.join(work_dir, 'db.sqlite3')
+    settings.MEDIA_ROOT = os.path.join(work_dir, 'media')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+
+def _package(input_path: str, jit: bool):
+    from django.conf import settings
+    from django.core.files import File
+    from videos.models import Video
+    from videos.schema import generate_assets_for_video
+
+    settings.MEDIA_JIT_PACKAGING = jit
+    video = Video(title=f"bench-{'jit' if jit else 'full'}")
+    with open(input_path, 'rb') as f:
+        video.original_file.save(os.path.basename(input_path), File(f), save=False)
+    cpu = _children_cpu()
+    started = time.perf_counter()
+    generate_assets_for_video(video)
+    elapsed = time.perf_counter() - started
+    video.save()
+    return video, {'cpu_seconds': round(_children_cpu() - cpu, 2), 'wall_seconds': round(elapsed, 2)}
+
+
+def _timed_get(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    body = b''.join(response.streaming_content) if response.streaming else response.content
+    return response.status_code, body, time.perf_counter() - started
+
+
+def _variant_segments(client, video, variant: int):
+    from videos.playback import master_playlist_url
+
+    _status, master, _t = _timed_get(client, master_playlist_url(video))
+    urls = [line for line in master.decode().splitlines() if line.startswith('/hls/')]
+    _status, playlist, _t = _timed_get(client, urls[variant])
+    return [line for line in playlist.decode().splitlines() if line.startswith('/hls/')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='maxstudio-jit-')
+    _setup(work_dir)
+    from django.test import Client
+    from videos import jit
+
+    input_path = os.path.abspath(args.input)
+    _full_video, full = _package(input_path, jit=False)
+    video, on_demand = _package(input_path, jit=True)
+
+    client = Client()
+    segments = _variant_segments(client, video, 2)
+    cpu = _children_cpu()
+    status, body, cold = _timed_get(client, segments[0])
+    cold_cpu = _children_cpu() - cpu
+    assert status == 200 and body, status
+    _status, _body, warm = _timed_get(client, segments[0])
+
+    runs = []
+    real_run = jit.subprocess.run
+
+    def counting_run(*a, **kw):
+        runs.append(1)
+        return real_run(*a, **kw)
+
+    jit.subprocess.run = counting_run
+    target = _variant_segments(client, video, 1)[1]
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(_timed_get(Client(), target)[0]))
+        for _ in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    jit.subprocess.run = real_run
+
+    report = {
+        'upload_full': full,
+        'upload_jit': on_demand,
+        'upload_cpu_saved': round(1 - on_demand['cpu_seconds'] / full['cpu_seconds'], 3),
+        'segments_per_variant': len(segments),
+        'first_play_segment_ms': {'cold': round(cold * 1000, 1), 'warm': round(warm * 1000, 1)},
+        'cold_segment_cpu_seconds': round(cold_cpu, 2),
+        'concurrent_requests': args.concurrency,
+        'concurrent_statuses': sorted(results),
+        'ffmpeg_runs_for_concurrent_requests': len(runs),
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+"""
+Query-count and latency regression guard for GraphQL operations.
+
+Every operation in ``OPERATIONS`` is executed against ``core.schema.schema``
+with seeded data (``SEED_VIDEOS`` videos in three genres, a user with a
+profile and saved videos, a staff user) in a throwaway SQLite database, with
+Jellyfin replaced by ``bench.fake_jellyfin``. Each operation runs inside a
+transaction that is rolled back, so mutations see the same data every time.
+
+Recorded per operation: SQL queries, upstream Jellyfin requests and the median
+wall time. Wall times depend on the machine, so the baseline keeps each one
+relative to ``REFERENCE_OPERATION`` measured in the same run (``healthcheck``,
+the cost of the GraphQL stack itself). With ``--check`` the counts are
+compared against ``bench/operations_baseline.json`` and the script exits
+non-zero when one is exceeded, or when the relative time is over
+``--latency-factor`` times its baseline.
+``--update`` rewrites the baseline. ``--profile`` prints where an operation
+spends its time: time per resolver (``Type.field``) and the top cProfile
+entries, or a pyinstrument report with ``--profiler pyinstrument``.
+
+    python bench/operations.py --check
+    python bench/operations.py --update
+    python bench/operations.py --profile videos --show-queries
+"""
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / 'operations_baseline.json'
+
+SEED_VIDEOS = 20
+GENRES = ('Drama', 'Comedy', 'Documentary')
+PASSWORD = 'bench-password'
+# Latencies are recorded as multiples of this operation's time in the same run
+REFERENCE_OPERATION = 'healthcheck'
+REFERENCE_RUNS = 25
+# Sub-millisecond operations are too noisy for a ratio alone
+LATENCY_SLACK_MS = 2.0
+TRANSACTION_SQL = ('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE', 'ROLLBACK')
+
+# name -> (document, variables, who runs it: None, 'user' or 'staff')
+OPERATIONS = {
+    'healthcheck': ('query Healthcheck { healthcheck }', {}, None),
+    'videos': (
+        'query Videos { videos { id title description durationSeconds genre { id name } '
+        'thumbnail hlsMasterPlaylist dashManifest createdAt } }',
+        {}, None,
+    ),
+    'videosByGenre': (
+        'query VideosByGenre($genre: String) { videos(genre: $genre) { id title genre { name } } }',
+        {'genre': 'drama'}, None,
+    ),
+    'video': (
+        'query Video($id: ID!) { video(id: $id) { id title description genre { name } hlsMasterPlaylist } }',
+        {'id': '$video'}, None,
+    ),
+    'me': ('query Me { me { id username email } }', {}, 'user'),
+    'myProfile': ('query MyProfile { myProfile { id bio user { username } } }', {}, 'user'),
+    'saveVideo': (
+        'mutation SaveVideo($videoId: ID!) { saveVideo(videoId: $videoId) { ok } }',
+        {'videoId': '$video'}, 'user',
+    ),
+    'unsaveVideo': (
+        'mutation UnsaveVideo($videoId: ID!) { unsaveVideo(videoId: $videoId) { ok } }',
+        {'videoId': '$video'}, 'user',
+    ),
+    'reportPlayback': (
+        'mutation ReportPlayback($kbps: Int!) { reportPlayback(throughputKbps: $kbps) { ok throughputKbps } }',
+        {'kbps': 2500}, 'user',
+    ),
+    'updateProfile': (
+        'mutation UpdateProfile($bio: String) { updateProfile(bio: $bio) { ok profile { bio } } }',
+        {'bio': 'Updated'}, 'user',
+    ),
+    # Re-upload of stored content: the dedupe path, no transcode
+    'uploadDuplicate': (
+        'mutation UploadVideo($title: String!, $file: String!) '
+        '{ uploadVideo(title: $title, file: $file) { ok video { id title } } }',
+        {'title': 'Title 0', 'file': '$upload'}, 'staff',
+    ),
+    'register': (
+        'mutation Register($username: String!, $password: String!) '
+        '{ register(username: $username, password: $password) { ok user { id } } }',
+        {'username': 'newcomer', 'password': PASSWORD}, None,
+    ),
+    'tokenAuth': (
+        'mutation TokenAuth($username: String!, $password: String!) '
+        '{ tokenAuth(username: $username, password: $password) { token } }',
+        {'username': 'viewer', 'password': PASSWORD}, None,
+    ),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class ResolverTimer:
+    """Graphene middleware adding up the time spent in each ``Type.field`` resolver."""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def resolve(self, next_, root, info, **kwargs):
+        started = time.perf_counter()
+        try:
+            return next_(root, info, **kwargs)
+        finally:
+            key = f"{info.parent_type.name}.{info.field_name}"
+            self.totals[key] += time.perf_counter() - started
+            self.calls[key] += 1
+
+    def report(self, top: int) -> str:
+        lines = [f"{'resolver':<40} {'calls':>7} {'total ms':>10}"]
+        for key, total in sorted(self.totals.items(), key=lambda kv: -kv[1])[:top]:
+            lines.append(f"{key:<40} {self.calls[key]:>7} {total * 1000:>10.2f}")
+        return '\n'.join(lines)
+
+
+def _setup(work_dir: str):
+    sys.path.insert(0, str(BACKEND_DIR))
+    from bench.fake_jellyfin import FakeJellyfin
+
+    jellyfin = FakeJellyfin(library_size=SEED_VIDEOS).start()
+    os.environ['JELLYFIN_URL'] = jellyfin.url
+    os.environ['JELLYFIN_USER_ID'] = 'bench'
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'core.settings'
+    os.environ['USE_SQLITE'] = 'true'
+    # Every operation runs as one user, back to back; rate limits would trip
+    os.environ['ADMISSION_ENABLED'] = 'false'
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = os.path.join(work_dir, 'db.sqlite3')
+    # Hashing cost is not what this guard measures
+    settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return jellyfin
+
+
+def _seed(work_dir: str) -> dict:
+    from django.contrib.auth import get_user_model
+    from accounts.models import UserProfile
+    from videos.library import hash_file
+    from videos.models import Genre, SavedVideo, Video
+
+    upload = os.path.join(work_dir, 'upload.mp4')
+    with open(upload, 'wb') as f:
+        f.write(b'\0' * 4096)
+
+    User = get_user_model()
+    genres = [Genre.objects.create(name=name) for name in GENRES]
+    videos = Video.objects.bulk_create([
+        Video(
+            title=f"Title {i}",
+            description=f"Synthetic video {i}",
+            genre=genres[i % len(genres)],
+            duration_seconds=600 + i,
+            jellyfin_item_id=f"{i:032x}",
+            hls_master_playlist=f"hls/{i}/master.m3u8",
+            thumbnail=f"thumbnails/{i}.jpg",
+            content_hash=hash_file(upload) if i == 0 else f"{i:064x}",
+        )
+        for i in range(SEED_VIDEOS)
+    ])
+    viewer = User.objects.create_user('viewer', password=PASSWORD)
+    UserProfile.objects.get_or_create(user=viewer, defaults={'bio': 'Seeded'})
+    SavedVideo.objects.bulk_create([SavedVideo(user=viewer, video=v) for v in videos[:5]])
+    staff = User.objects.create_user('staff', password=PASSWORD, is_staff=True)
+    return {'user': viewer, 'staff': staff, 'video': str(videos[0].pk), 'upload': upload}
+
+
+def _request(user):
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+
+    request = RequestFactory().post('/graphql/')
+    # A fresh instance each time, so relations cached by an earlier run do not hide queries
+    request.user = type(user).objects.get(pk=user.pk) if user else AnonymousUser()
+    return request
+
+
+def _variables(variables: dict, fixtures: dict) -> dict:
+    return {k: fixtures[v[1:]] if isinstance(v, str) and v.startswith('$') else v for k, v in variables.items()}
+
+
+def execute(name: str, fixtures: dict, middleware=None):
+    """Run operation ``name`` once, rolled back. Returns (result, captured queries)."""
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+    from core.schema import schema
+
+    document, variables, who = OPERATIONS[name]
+    request = _request(fixtures.get(who) if who else None)
+    with CaptureQueriesContext(connection) as queries:
+        try:
+            with transaction.atomic():
+                result = schema.execute(
+                    document,
+                    variable_values=_variables(variables, fixtures),
+                    context_value=request,
+                    middleware=middleware,
+                )
+                raise _Rollback
+        except _Rollback:
+            pass
+    if result.errors:
+        raise SystemExit(f"{name}: {result.errors[0]}")
+    return result, queries
+
+
+def measure(name: str, fixtures: dict, jellyfin, runs: int) -> dict:
+    execute(name, fixtures)
+    calls_before = sum(jellyfin.calls.values())
+    _result, queries = execute(name, fixtures)
+    calls = sum(jellyfin.calls.values()) - calls_before
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        execute(name, fixtures)
+        samples.append((time.perf_counter() - started) * 1000)
+    # Transaction control of the wrapping atomic block is not the operation's
+    own = [q for q in queries.captured_queries if not q['sql'].startswith(TRANSACTION_SQL)]
+    return {'queries': len(own), 'jellyfin_calls': calls, 'ms': round(statistics.median(samples), 2), 'sql': own}
+
+
+def profile(name: str, fixtures: dict, profiler: str, top: int) -> str:
+    # Warm up first so imports and schema construction are not profiled
+    execute(name, fixtures)
+    timer = ResolverTimer()
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        p = Profiler()
+        p.start()
+        execute(name, fixtures, middleware=[timer])
+        p.stop()
+        return timer.report(top) + '\n\n' + p.output_text(unicode=True, color=False)
+
+    p = cProfile.Profile()
+    p.enable()
+    execute(name, fixtures, middleware=[timer])
+    p.disable()
+    out = io.StringIO()
+    pstats.Stats(p, stream=out).sort_stats('cumulative').print_stats(top)
+    return timer.report(top) + '\n\n' + out.getvalue()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--operation', choices=sorted(OPERATIONS), action='append')
+    parser.add_argument('--runs', type=int, default=5, help='timed runs per operation (median is reported)')
+    parser.add_argument('--check', action='store_true', help='fail if an operation exceeds its baseline')
+    parser.add_argument('--update', action='store_true', help='write the measured counts as the new baseline')
+    parser.add_argument('--latency-factor', type=float, default=2.0,
+                        help='with --check, fail when the relative time exceeds this multiple of the baseline')
+    parser.add_argument('--profile', choices=sorted(OPERATIONS), help='print a per-resolver profile of one operation')
+    parser.add_argument('--profiler', choices=('cprofile', 'pyinstrument'), default='cprofile')
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--show-queries', action='store_true', help='print the SQL of each operation')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='maxstudio-operations-')
+    jellyfin = _setup(work_dir)
+    try:
+        fixtures = _seed(work_dir)
+        if args.profile:
+            print(profile(args.profile, fixtures, args.profiler, args.top))
+            return 0
+
+        baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        results = {}
+        report = {}
+        failures = []
+        reference = measure(REFERENCE_OPERATION, fixtures, jellyfin, max(args.runs, REFERENCE_RUNS))
+        reference_ms = reference['ms']
+        for name in args.operation or OPERATIONS:
+            measured = reference if name == REFERENCE_OPERATION else measure(name, fixtures, jellyfin, args.runs)
+            sql = measured.pop('sql')
+            ms = measured.pop('ms')
+            measured['relative_latency'] = round(ms / reference_ms, 2)
+            results[name] = measured
+            report[name] = dict(measured, ms=ms)
+            expected = baseline.get(name)
+            problems = []
+            if expected is not None:
+                for key in ('queries', 'jellyfin_calls'):
+                    if measured[key] > expected[key]:
+                        problems.append(f"{key} {measured[key]} > {expected[key]}")
+                expected_ms = expected.get('relative_latency', 0) * reference_ms
+                limit = max(expected_ms * args.latency_factor, expected_ms + LATENCY_SLACK_MS)
+                if expected_ms and ms > limit:
+                    problems.append(
+                        f"{measured['relative_latency']} x {REFERENCE_OPERATION} > "
+                        f"{args.latency_factor} x {expected['relative_latency']}"
+                    )
+            elif args.check:
+                problems.append('no baseline')
+            if problems:
+                failures.append(name)
+            if not args.json:
+                status = ('REGRESSED: ' + ', '.join(problems)) if problems else 'ok'
+                print(f"{name:<16} {measured['queries']:>3} queries {measured['jellyfin_calls']:>3} jellyfin "
+                      f"{ms:>8.2f} ms {measured['relative_latency']:>6.2f}x  {status}")
+                if args.show_queries:
+                    for q in sql:
+                        print(f"    {q['sql']}")
+    finally:
+        jellyfin.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    if args.update:
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f"wrote {BASELINE_PATH.name}")
+    return 1 if (args.check and failures) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
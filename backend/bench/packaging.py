@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Storage and request cost of the two packaging modes of
+``generate_assets_for_video``: MPEG-TS HLS vs. CMAF (HLS + DASH).
+
+Both ffmpeg command lines are built by ``videos.packaging`` exactly as uploads
+use them and run against the same input. Reported per mode: bytes stored for
+the title, number of files, and the segment requests a player makes to watch
+the whole title at one rendition (video + audio for CMAF, whose audio is a
+separate rendition).
+
+    python bench/packaging.py /path/to/input.mp4 --json results.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SEGMENT_EXTS = ('.ts', '.m4s')
+
+
+def _setup():
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    os.environ.setdefault('USE_SQLITE', 'true')
+    import django
+    django.setup()
+
+
+def _media_playlists(out_dir: str):
+    master = Path(out_dir, 'master.m3u8').read_text()
+    uris = [line.strip() for line in master.splitlines() if line.strip() and not line.startswith('#')]
+    audio = re.findall(r'TYPE=AUDIO[^\n]*URI="([^"]+)"', master)
+    return uris, audio
+
+
+def _segment_count(out_dir: str, playlist: str) -> int:
+    text = Path(out_dir, playlist).read_text()
+    return sum(1 for line in text.splitlines() if line.strip() and not line.startswith('#'))
+
+
+def measure(mode: str, input_path: str) -> dict:
+    from videos import packaging
+
+    out_dir = tempfile.mkdtemp(prefix=f'maxstudio-{mode}-')
+    if mode == 'cmaf':
+        cmd = packaging.cmaf_command(input_path, out_dir)
+    else:
+        cmd = packaging.ts_command(input_path, out_dir)
+    started = time.perf_counter()
+    cpu_before = os.times()
+    subprocess.run(cmd[:1] + ['-loglevel', 'error'] + cmd[1:], check=True)
+    cpu_after = os.times()
+    elapsed = time.perf_counter() - started
+
+    total_bytes = 0
+    files = 0
+    segment_bytes = 0
+    for root, _dirs, names in os.walk(out_dir):
+        for name in names:
+            size = os.path.getsize(os.path.join(root, name))
+            total_bytes += size
+            files += 1
+            if name.endswith(SEGMENT_EXTS):
+                segment_bytes += size
+
+    variants, audio = _media_playlists(out_dir)
+    per_variant = [_segment_count(out_dir, uri) for uri in variants]
+    audio_segments = _segment_count(out_dir, audio[0]) if audio else 0
+    return {
+        'mode': mode,
+        'bytes': total_bytes,
+        'segment_bytes': segment_bytes,
+        'files': files,
+        'variants': len(variants),
+        'audio_renditions': len(audio) if audio else len(variants),
+        'segment_requests_per_play': per_variant[0] + audio_segments if per_variant else 0,
+        'has_dash': os.path.exists(os.path.join(out_dir, 'manifest.mpd')),
+        'encode_seconds': round(elapsed, 2),
+        'encode_cpu_seconds': round(
+            (cpu_after.children_user + cpu_after.children_system)
+            - (cpu_before.children_user + cpu_before.children_system), 2
+        ),
+        'output_dir': out_dir,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input')
+    parser.add_argument('--modes', default='ts,cmaf')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    _setup()
+    results = [measure(mode, os.path.abspath(args.input)) for mode in args.modes.split(',')]
+    for r in results:
+        print(
+            f"{r['mode']:>5}: {r['bytes'] / 1e6:8.2f} MB in {r['files']} files, "
+            f"{r['variants']} variants / {r['audio_renditions']} audio, "
+            f"{r['segment_requests_per_play']} segment requests per play, "
+            f"dash={r['has_dash']}, {r['encode_cpu_seconds']} CPU s"
+        )
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
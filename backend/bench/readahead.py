@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Segment latency seen by players through the /stream/ proxy, with and without
+segment read-ahead (videos.readahead).
+
+Each mode runs in its own interpreter with the stream-only settings against a
+local fake Jellyfin that adds ``--upstream-delay`` seconds to every request,
+standing in for on-the-fly transcoding. ``--viewers`` players each load the
+variant playlist and then fetch ``--segments`` segments in order, waiting
+``--playback`` seconds between segments (a player keeps a few segments
+buffered, so it asks for the next one well before it needs it).
+
+    python bench/readahead.py --viewers 4 --segments 20 --upstream-delay 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+MODES = {
+    'off': '0',
+    'on': '3',
+}
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def run_worker(mode: str, args) -> dict:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from bench.fake_jellyfin import FakeJellyfin
+
+    upstream = FakeJellyfin(
+        library_size=1, segment_bytes=args.segment_bytes, segments=args.segments, delay=args.upstream_delay,
+    ).start()
+    cache_dir = tempfile.mkdtemp(prefix='readahead-bench-')
+    os.environ['JELLYFIN_URL'] = upstream.url
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'core.stream_settings'
+    os.environ['STREAM_READAHEAD_SEGMENTS'] = MODES[mode]
+    os.environ['STREAM_READAHEAD_CACHE_DIR'] = cache_dir
+    os.environ.setdefault('USE_SQLITE', 'true')
+
+    import django
+    django.setup()
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from videos import readahead
+    from videos.jellyfin_client import build_signed_url
+
+    setup_test_environment()
+    samples = []
+    lock = threading.Lock()
+
+    def viewer():
+        client = Client()
+        response = client.get(build_signed_url('/stream/0/0/index.m3u8', 3600))
+        assert response.status_code == 200, response.status_code
+        for n in range(args.segments):
+            started = time.perf_counter()
+            response = client.get(build_signed_url(f'/stream/0/0/segment{n}.ts', 3600))
+            assert response.status_code == 200, response.status_code
+            b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples.append(elapsed)
+            time.sleep(args.playback)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=viewer) for _ in range(args.viewers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    upstream.stop()
+    return {
+        'segments': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 1),
+        'p50_ms': round(_percentile(samples, 50), 1),
+        'p95_ms': round(_percentile(samples, 95), 1),
+        'wall_s': round(wall, 2),
+        'upstream_segment_requests': upstream.calls['segment'],
+        'readahead': readahead.stats(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--viewers', type=int, default=4)
+    parser.add_argument('--segments', type=int, default=20, help='segments fetched by each viewer')
+    parser.add_argument('--segment-bytes', type=int, default=256 * 1024)
+    parser.add_argument('--upstream-delay', type=float, default=0.2, help='seconds added to every upstream GET')
+    parser.add_argument('--playback', type=float, default=0.25, help='seconds between segment requests')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--worker', choices=sorted(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args)))
+        return 0
+
+    results = {}
+    for mode in MODES:
+        proc = subprocess.run(
+            [sys.executable, __file__, '--worker', mode,
+             '--viewers', str(args.viewers), '--segments', str(args.segments),
+             '--segment-bytes', str(args.segment_bytes), '--upstream-delay', str(args.upstream_delay),
+             '--playback', str(args.playback)],
+            cwd=BACKEND_DIR, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise SystemExit(proc.stderr)
+        results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for mode, r in results.items():
+        stats = r['readahead']
+        print(
+            f"read-ahead {mode:>3}: segment mean {r['mean_ms']:.0f} ms, p50 {r['p50_ms']:.0f} ms, "
+            f"p95 {r['p95_ms']:.0f} ms; hit rate {stats.get('hit_rate', 0):.0%}, "
+            f"{r['upstream_segment_requests']} upstream segment requests, "
+            f"{stats.get('wasted_bytes', 0)} wasted bytes"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Per-request overhead of the /stream/ proxy: full application vs. the
+stream-only entry point.
+
+Each chain runs in its own interpreter against a local fake Jellyfin. Every
+request fetches one synthetic segment through Django's request handler (the
+full middleware stack of the chosen settings module); the direct upstream
+fetch time is subtracted to get the Django-side overhead.
+
+    python bench/stream_overhead.py --requests 2000 --segment-bytes 65536
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+CHAINS = {
+    'full': 'core.settings',
+    'stream': 'core.stream_settings',
+}
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def run_worker(chain: str, requests_count: int, segment_bytes: int) -> dict:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from bench.fake_jellyfin import FakeJellyfin
+
+    upstream = FakeJellyfin(library_size=1, segment_bytes=segment_bytes).start()
+    os.environ['JELLYFIN_URL'] = upstream.url
+    os.environ['DJANGO_SETTINGS_MODULE'] = CHAINS[chain]
+    os.environ.setdefault('USE_SQLITE', 'true')
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = ':memory:'
+    import django
+    django.setup()
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    import requests
+    from videos.jellyfin_client import build_signed_url
+
+    setup_test_environment()
+    client = Client()
+    if chain == 'full':
+        from django.contrib.auth import get_user_model
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+        client.force_login(get_user_model().objects.create_user('bench', password='bench'))
+
+    url = build_signed_url('/stream/0/segment0.ts', 3600)
+    session = requests.Session()
+    direct_url = f"{upstream.url}/Videos/0/segment0.ts"
+
+    def through_django():
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+        b''.join(response.streaming_content)
+
+    def direct():
+        session.get(direct_url).content
+
+    results = {}
+    for name, fn in (('direct', direct), ('django', through_django)):
+        for _ in range(min(100, requests_count)):
+            fn()
+        samples = []
+        for _ in range(requests_count):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1e6)
+        results[name] = {
+            'mean_us': round(statistics.fmean(samples), 1),
+            'p50_us': round(_percentile(samples, 50), 1),
+            'p95_us': round(_percentile(samples, 95), 1),
+        }
+    results['overhead_us'] = round(results['django']['mean_us'] - results['direct']['mean_us'], 1)
+    results['middleware'] = list(settings.MIDDLEWARE)
+    upstream.stop()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--segment-bytes', type=int, default=64 * 1024)
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--worker', choices=sorted(CHAINS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.requests, args.segment_bytes)))
+        return 0
+
+    results = {}
+    for chain in CHAINS:
+        proc = subprocess.run(
+            [sys.executable, __file__, '--worker', chain,
+             '--requests', str(args.requests), '--segment-bytes', str(args.segment_bytes)],
+            cwd=BACKEND_DIR, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise SystemExit(proc.stderr)
+        results[chain] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for chain, r in results.items():
+        print(
+            f"{chain:>6}: {len(r['middleware'])} middleware, overhead {r['overhead_us']:.0f} us/request "
+            f"(django mean {r['django']['mean_us']:.0f} us, p95 {r['django']['p95_us']:.0f} us; "
+            f"direct mean {r['direct']['mean_us']:.0f} us)"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
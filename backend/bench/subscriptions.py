@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""
+Fan-out of GraphQL subscription events to many simultaneous WebSocket
+subscribers (core.subscriptions, core.events).
+
+Runs ``core.asgi`` under uvicorn on a local port with a throwaway SQLite
+database and opens ``--subscribers`` connections. Each one subscribes to
+``videoAdded``. Then ``--events`` videos are created one after another, and
+the bench measures:
+
+- ``delivered``: ``next`` messages received, against subscribers x events.
+  ``--check`` fails the run if any subscriber misses an event or receives an
+  error.
+- ``latency``: from the commit that publishes each event to its arrival at
+  each subscriber. The clients run in the same process as the server, so
+  this includes their own message handling.
+- ``executions``: GraphQL executions on the server. Subscribers sharing an
+  operation share one execution per event, so this stays at ``--events``.
+
+    python bench/subscriptions.py --subscribers 1000 --events 20 --check
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DOCUMENT = 'subscription OnVideoAdded { videoAdded { id title hlsMasterPlaylist } }'
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def _subscriber(url: str, received: dict, errors: list, ready: asyncio.Event, done: asyncio.Event):
+    import websockets
+
+    async with websockets.connect(url, subprotocols=['graphql-transport-ws'], max_queue=None) as ws:
+        await ws.send(json.dumps({'type': 'connection_init', 'payload': {}}))
+        assert json.loads(await ws.recv())['type'] == 'connection_ack'
+        await ws.send(json.dumps({'id': '1', 'type': 'subscribe', 'payload': {'query': DOCUMENT}}))
+        ready.set()
+        receiver = asyncio.ensure_future(ws.recv())
+        finished = asyncio.ensure_future(done.wait())
+        while True:
+            await asyncio.wait([receiver, finished], return_when=asyncio.FIRST_COMPLETED)
+            if not receiver.done():
+                receiver.cancel()
+                return
+            message = json.loads(receiver.result())
+            if message['type'] == 'next' and not message['payload'].get('errors'):
+                video_id = message['payload']['data']['videoAdded']['id']
+                received[video_id] = time.perf_counter()
+            else:
+                errors.append(message)
+            receiver = asyncio.ensure_future(ws.recv())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05, help='seconds between published events')
+    parser.add_argument('--check', action='store_true', help='fail unless every subscriber gets every event')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    workdir = tempfile.mkdtemp(prefix='maxstudio-subscriptions-')
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'core.settings'
+    os.environ.setdefault('USE_SQLITE', 'true')
+    os.environ['EVENTS_BROKER'] = 'local'
+    os.environ['EVENTS_SUBSCRIBER_QUEUE_SIZE'] = str(max(args.events, 100))
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = os.path.join(workdir, 'db.sqlite3')
+    import uvicorn
+    from core.asgi import application
+    from django.core.management import call_command
+    from core import events, subscriptions
+    from videos.models import Video
+
+    call_command('migrate', verbosity=0)
+
+    executions = [0]
+    execute = subscriptions._execute
+
+    def counting_execute(*a, **kw):
+        executions[0] += 1
+        return execute(*a, **kw)
+
+    subscriptions._execute = counting_execute
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        application, host='127.0.0.1', port=port, log_level='warning', ws='websockets', lifespan='off',
+        ws_max_queue=max(args.events, 32),
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    url = f'ws://127.0.0.1:{port}/graphql/'
+
+    published = {}
+
+    def publish_all():
+        for i in range(args.events):
+            video = Video.objects.create(title=f'bench {i}')
+            # post_save publishes on commit, which under autocommit is now
+            published[str(video.pk)] = time.perf_counter()
+            time.sleep(args.interval)
+
+    async def run():
+        received = [dict() for _ in range(args.subscribers)]
+        errors: list = []
+        ready = [asyncio.Event() for _ in range(args.subscribers)]
+        done = asyncio.Event()
+        started = time.perf_counter()
+        clients = [
+            asyncio.ensure_future(_subscriber(url, received[i], errors, ready[i], done))
+            for i in range(args.subscribers)
+        ]
+        await asyncio.gather(*(r.wait() for r in ready))
+        while events.stats()['subscribers'] < args.subscribers:
+            await asyncio.sleep(0.01)
+        connect_seconds = time.perf_counter() - started
+
+        await asyncio.get_running_loop().run_in_executor(None, publish_all)
+        expected = args.subscribers * args.events
+        deadline = time.monotonic() + 30
+        while sum(len(r) for r in received) + len(errors) < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        done.set()
+        await asyncio.gather(*clients, return_exceptions=True)
+        return received, errors, connect_seconds
+
+    received, errors, connect_seconds = asyncio.run(run())
+    server.should_exit = True
+
+    latencies = [
+        (at - published[video_id]) * 1000
+        for per_subscriber in received for video_id, at in per_subscriber.items()
+    ]
+    expected = args.subscribers * args.events
+    delivered = sum(len(r) for r in received)
+    results = {
+        'subscribers': args.subscribers,
+        'events': args.events,
+        'connect_seconds': round(connect_seconds, 2),
+        'delivered': delivered,
+        'expected': expected,
+        'errors': len(errors),
+        'executions': executions[0],
+        'latency_ms': {
+            'p50': round(statistics.median(latencies), 1) if latencies else None,
+            'p95': round(_percentile(latencies, 0.95), 1) if latencies else None,
+            'max': round(max(latencies), 1) if latencies else None,
+        },
+        'broker': events.stats(),
+    }
+    failed = delivered != expected or errors
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        latency = results['latency_ms']
+        print(f"{args.subscribers} subscribers connected in {results['connect_seconds']:.2f}s")
+        print(f"delivered {delivered}/{expected} events, {len(errors)} errors, {executions[0]} executions")
+        print(f"latency p50 {latency['p50']} ms, p95 {latency['p95']} ms, max {latency['max']} ms")
+        if errors:
+            print(f"first error: {errors[0]}")
+    return 1 if (args.check and failed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
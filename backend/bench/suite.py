@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+"""
+Offline performance suite for the API and streaming paths.
+
+Everything runs locally: Jellyfin is replaced by ``bench.fake_jellyfin``, the
+database is a throwaway SQLite file and load scenarios go through the real
+WSGI application on a threaded local server. Benchmarks:
+
+- ``sign`` / ``verify``: ``build_signed_url`` and ``verify_signature`` per call
+- ``jellyfin_items``: ``JellyfinClient.list_items`` per library size
+- ``graphql_resolve``: executing the ``videos`` query against the schema
+  (resolver and type construction, URL signing) per library size
+- ``graphql_load``: concurrent ``videos`` reads through ``/graphql/``, with
+  the response cache on and off
+- ``stream_load``: concurrent segment fetches through the ``/stream/`` proxy
+- ``transcode``: HLS packaging of a short ffmpeg ``testsrc`` clip, using the
+  command uploads run in ``generate_assets_for_video``
+
+Results are written as JSON; ``--compare`` prints the change against an
+earlier results file.
+
+    python bench/suite.py --json before.json
+    python bench/suite.py --json after.json --compare before.json
+    python bench/suite.py --only sign,verify,graphql_load
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+VIDEOS_QUERY = '{ videos { id title durationSeconds genre { name } hlsMasterPlaylist } }'
+
+# Scenario parameters recorded next to the measurements; --compare skips them
+PARAMETERS = {'requests', 'concurrency', 'videos', 'segment_bytes', 'input_seconds'}
+
+BENCHMARKS = ('sign', 'verify', 'jellyfin_items', 'graphql_resolve', 'graphql_load', 'stream_load', 'transcode')
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def _per_call_us(fn, number: int, repeat: int = 5) -> dict:
+    fn()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - started) * 1e6 / number)
+    return {'best_us': round(min(runs), 2), 'median_us': round(statistics.median(runs), 2)}
+
+
+def _latencies(samples_ms) -> dict:
+    return {
+        'p50_ms': round(_percentile(samples_ms, 50), 2),
+        'p95_ms': round(_percentile(samples_ms, 95), 2),
+        'p99_ms': round(_percentile(samples_ms, 99), 2),
+    }
+
+
+def _load(fn, requests_count: int, concurrency: int) -> dict:
+    """Call ``fn`` ``requests_count`` times from ``concurrency`` threads."""
+    samples = []
+    lock = threading.Lock()
+
+    def worker(count):
+        local = []
+        for _ in range(count):
+            started = time.perf_counter()
+            fn()
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            samples.extend(local)
+
+    shares = [requests_count // concurrency + (1 if i < requests_count % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, shares))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests_count,
+        'concurrency': concurrency,
+        'requests_per_second': round(requests_count / elapsed, 1),
+        **_latencies(samples),
+    }
+
+
+class Environment:
+    """Django, a temporary database, the fake Jellyfin and a local WSGI server."""
+
+    def __init__(self, args):
+        self.args = args
+        self.work_dir = tempfile.mkdtemp(prefix='maxstudio-bench-')
+        sys.path.insert(0, str(BACKEND_DIR))
+        from bench.fake_jellyfin import FakeJellyfin
+
+        self.jellyfin = FakeJellyfin(
+            library_size=max(args.library_sizes), segment_bytes=args.segment_bytes
+        ).start()
+        os.environ['JELLYFIN_URL'] = self.jellyfin.url
+        os.environ['JELLYFIN_USER_ID'] = 'bench'
+        os.environ['DJANGO_SETTINGS_MODULE'] = 'core.settings'
+        os.environ['USE_SQLITE'] = 'true'
+        os.environ['DEBUG'] = 'false'
+        # Load scenarios would otherwise run into the per-user cost budget
+        os.environ['GRAPHQL_COST_BUDGET'] = str(10 ** 9)
+        # ... and the stream scenarios into the admission limits
+        os.environ['ADMISSION_ENABLED'] = 'false'
+
+        # There is no collectstatic output in a checkout
+        warnings.filterwarnings('ignore', message='No directory at')
+        from django.conf import settings
+        settings.DATABASES['default']['NAME'] = os.path.join(self.work_dir, 'db.sqlite3')
+        import django
+        django.setup()
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            self._start_server()
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _start_server(self):
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+        from django.core.wsgi import get_wsgi_application
+
+        class QuietHandler(WSGIRequestHandler):
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+        self._server.daemon_threads = True
+        self._server.set_app(get_wsgi_application())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def seed_videos(self, count: int) -> None:
+        """Make exactly ``count`` videos visible to the ``videos`` query."""
+        from videos.models import Genre, Video
+
+        existing = Video.objects.count()
+        if existing < count:
+            genres = [Genre.objects.get_or_create(name=name)[0] for name in ('Drama', 'Comedy', 'Documentary')]
+            Video.objects.bulk_create([
+                Video(
+                    title=f"Title {i}",
+                    description=f"Synthetic video {i}",
+                    genre=genres[i % len(genres)],
+                    duration_seconds=600 + i,
+                    hls_master_playlist=f"hls/{i}/master.m3u8",
+                    thumbnail=f"thumbnails/{i}.jpg",
+                )
+                for i in range(existing, count)
+            ], batch_size=500)
+        visible = list(Video.objects.order_by('pk').values_list('pk', flat=True)[:count])
+        Video.objects.exclude(pk__in=visible).update(is_active=False)
+        Video.objects.filter(pk__in=visible).update(is_active=True)
+
+    def login_cookie(self) -> dict:
+        from django.contrib.auth import get_user_model
+        from django.test import Client
+
+        user, _ = get_user_model().objects.get_or_create(username='bench')
+        client = Client()
+        client.force_login(user)
+        return {name: morsel.value for name, morsel in client.cookies.items()}
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self.jellyfin.stop()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def bench_sign(env) -> dict:
+    from videos.jellyfin_client import build_signed_url
+
+    return _per_call_us(lambda: build_signed_url('/stream/0/master.m3u8', 900), env.args.number)
+
+
+def bench_verify(env) -> dict:
+    from urllib.parse import parse_qs, urlparse
+    from videos.jellyfin_client import build_signed_url, verify_signature
+
+    url = urlparse(build_signed_url('/stream/0/master.m3u8', 3600))
+    query = parse_qs(url.query)
+    expires, sig = int(query['expires'][0]), query['sig'][0]
+    assert verify_signature(url.path, expires, sig)
+    return _per_call_us(lambda: verify_signature(url.path, expires, sig), env.args.number)
+
+
+def bench_jellyfin_items(env) -> dict:
+    from django.conf import settings
+    from videos.jellyfin_client import JellyfinClient
+
+    client = JellyfinClient(settings.JELLYFIN_URL, settings.JELLYFIN_API_KEY, settings.JELLYFIN_USER_ID)
+    results = {}
+    for size in env.args.library_sizes:
+        query = {'StartIndex': 0, 'Limit': size}
+        url = f"{client.base_url}/Users/{client.user_id}/Items"
+
+        def fetch():
+            items = client.session.get(url, params=query, timeout=15).json()['Items']
+            assert len(items) == size
+
+        timing = _per_call_us(fetch, max(env.args.number // (size * 10), 5), repeat=3)
+        results[str(size)] = {'ms': round(timing['median_us'] / 1000, 3)}
+    return results
+
+
+def bench_graphql_resolve(env) -> dict:
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from core.schema import schema
+    from videos.models import Video
+
+    results = {}
+    for size in env.args.library_sizes:
+        env.seed_videos(size)
+        request = RequestFactory().get('/graphql/')
+        request.user = AnonymousUser()
+
+        def execute():
+            result = schema.execute(VIDEOS_QUERY, context_value=request)
+            assert not result.errors, result.errors
+
+        rows = Video.objects.filter(is_active=True).count()
+        timing = _per_call_us(execute, max(env.args.number // (rows * 20), 3), repeat=3)
+        results[str(size)] = {
+            'videos': rows,
+            'ms': round(timing['median_us'] / 1000, 3),
+            'us_per_video': round(timing['median_us'] / rows, 2),
+        }
+    return results
+
+
+def bench_graphql_load(env) -> dict:
+    import requests
+    from django.conf import settings
+
+    env.seed_videos(min(env.args.library_sizes))
+    url = f"{env.url}/graphql/"
+    sessions = threading.local()
+
+    def read():
+        session = getattr(sessions, 'session', None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        response = session.post(url, json={'query': VIDEOS_QUERY})
+        assert response.status_code == 200, response.text[:200]
+        assert 'errors' not in response.json(), response.text[:200]
+
+    results = {}
+    for name, enabled in (('cached', True), ('uncached', False)):
+        settings.GRAPHQL_RESPONSE_CACHE_ENABLED = enabled
+        read()
+        results[name] = _load(read, env.args.requests, env.args.concurrency)
+    settings.GRAPHQL_RESPONSE_CACHE_ENABLED = True
+    return results
+
+
+def bench_stream_load(env) -> dict:
+    import requests
+    from videos.jellyfin_client import build_signed_url
+
+    cookies = env.login_cookie()
+    urls = [f"{env.url}{build_signed_url(f'/stream/0/segment{n}.ts', 3600)}" for n in range(50)]
+    sessions = threading.local()
+    counter = iter(range(10 ** 9))
+    before = env.jellyfin.calls['segment']
+
+    def fetch():
+        session = getattr(sessions, 'session', None)
+        if session is None:
+            session = sessions.session = requests.Session()
+            session.cookies.update(cookies)
+        response = session.get(urls[next(counter) % len(urls)])
+        assert response.status_code == 200, response.status_code
+        assert len(response.content) == env.args.segment_bytes
+
+    fetch()
+    result = _load(fetch, env.args.requests, env.args.concurrency)
+    result['segment_bytes'] = env.args.segment_bytes
+    result['megabytes_per_second'] = round(result['requests_per_second'] * env.args.segment_bytes / 1e6, 1)
+    result['upstream_requests'] = env.jellyfin.calls['segment'] - before
+    return result
+
+
+def bench_transcode(env) -> dict:
+    if shutil.which('ffmpeg') is None:
+        return {'skipped': 'ffmpeg not found'}
+    from videos.packaging import ts_command
+
+    source = os.path.join(env.work_dir, 'testsrc.mp4')
+    subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc=duration={env.args.transcode_seconds}:size=1280x720:rate=30",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:duration={env.args.transcode_seconds}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest', source,
+    ], check=True)
+    out_dir = os.path.join(env.work_dir, 'hls')
+    os.makedirs(out_dir)
+    cmd = ts_command(source, out_dir)
+    cpu_before = os.times()
+    started = time.perf_counter()
+    subprocess.run(cmd[:1] + ['-loglevel', 'error'] + cmd[1:], check=True)
+    elapsed = time.perf_counter() - started
+    cpu_after = os.times()
+    cpu = (cpu_after.children_user + cpu_after.children_system) - (cpu_before.children_user + cpu_before.children_system)
+    return {
+        'input_seconds': env.args.transcode_seconds,
+        'wall_seconds': round(elapsed, 2),
+        'cpu_seconds': round(cpu, 2),
+        'realtime_factor': round(env.args.transcode_seconds / elapsed, 2),
+    }
+
+
+def _flatten(results, prefix=''):
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(previous: dict, current: dict) -> None:
+    before = dict(_flatten(previous['results']))
+    for name, value in _flatten(current['results']):
+        if name.rsplit('.', 1)[-1] in PARAMETERS:
+            continue
+        old = before.get(name)
+        if old is None:
+            print(f"{name:<55} {value:>12}")
+        elif old == 0:
+            print(f"{name:<55} {old:>12} -> {value:<12}")
+        else:
+            change = (value - old) / old * 100
+            print(f"{name:<55} {old:>12} -> {value:<12} {change:+6.1f}%")
+
+
+def _git_revision() -> str:
+    proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True)
+    return proc.stdout.strip()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help='Comma-separated benchmarks to run')
+    parser.add_argument('--library-sizes', default='100,1000',
+                        type=lambda s: [int(n) for n in s.split(',')])
+    parser.add_argument('--number', type=int, default=20000, help='Calls per micro-benchmark run')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per load scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--segment-bytes', type=int, default=256 * 1024)
+    parser.add_argument('--transcode-seconds', type=int, default=4)
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    selected = [name for name in args.only.split(',') if name]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    env = Environment(args)
+    results = {}
+    try:
+        for name in selected:
+            started = time.perf_counter()
+            results[name] = globals()[f"bench_{name}"](env)
+            print(f"{name}: {json.dumps(results[name])} ({time.perf_counter() - started:.1f} s)", file=sys.stderr)
+    finally:
+        env.close()
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'timestamp': int(time.time()),
+            'options': {k: v for k, v in vars(args).items() if k not in ('json', 'compare')},
+        },
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    elif not args.json:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
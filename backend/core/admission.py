@@ -0,0 +1,281 @@
+"""
+Admission control for playback sessions and uploads.
+
+State lives in the shared cache, so with ``REDIS_URL`` the limits hold across
+workers; with the local-memory cache they are per process.
+
+Playback (``admit_stream``): a session is one identity (user, or client IP on
+the stream-only entry point, read through the trusted proxy by
+``core.client_ip``) playing one item. The first request of a
+session must pass, in order:
+
+- a token bucket of ``ADMISSION_STREAM_STARTS_PER_MINUTE`` session starts per
+  identity, bursting to ``ADMISSION_STREAM_START_BURST``, and a bucket per
+  client IP ``ADMISSION_USERS_PER_IP`` times that size, shared by every user
+  behind the address
+- ``ADMISSION_STREAMS_PER_USER`` concurrent sessions per identity
+- ``ADMISSION_MAX_TRANSCODES`` concurrent sessions overall (each one keeps a
+  Jellyfin transcode busy)
+
+A start refused by a cap still spends its token, so clients retrying in a
+tight loop end up on the bucket's pace.
+
+An admitted session holds a lease that every request of the session renews.
+Playback that has started is therefore never cut off by the limits. A
+session ends after ``ADMISSION_STREAM_IDLE_SECONDS`` without requests.
+
+Uploads (``upload``): token buckets of ``ADMISSION_UPLOADS_PER_HOUR`` per
+identity and per client IP (scaled the same way),
+``ADMISSION_UPLOADS_PER_USER`` concurrent uploads per identity and
+``ADMISSION_MAX_UPLOADS`` overall. An upload over the global cap waits up to
+``ADMISSION_UPLOAD_QUEUE_SECONDS`` for a slot, behind at most
+``ADMISSION_UPLOAD_QUEUE_MAX`` others.
+
+Rejections raise ``AdmissionRejected``, and callers answer ``429`` with
+``Retry-After``. Admissions, rejections per reason and the upload queue depth
+are counted in the shared cache; ``python manage.py admission`` shows them
+with the active sessions and uploads.
+
+Token buckets and slot tables are read-modify-write cache entries. Slot
+tables are updated under a short cache lock. Buckets are not locked, so
+simultaneous requests from one identity can overshoot its bucket slightly.
+"""
+import math
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .client_ip import client_ip
+
+KEY_PREFIX = 'admission:'
+LOCK_TTL_SECONDS = 2
+# Give up on a busy slot-table lock after this long and update it unlocked
+LOCK_WAIT_SECONDS = 0.2
+QUEUE_POLL_SECONDS = 0.25
+# Upload slots outlive a crashed worker by at most this long
+UPLOAD_SLOT_TTL_SECONDS = 3600
+
+REASONS = ('stream_rate', 'streams_per_user', 'transcodes', 'upload_rate', 'uploads_per_user', 'upload_queue_full',
+           'upload_queue_timeout')
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Too many requests ({reason}), retry in {math.ceil(retry_after)}s")
+        self.reason = reason
+        self.retry_after = max(int(math.ceil(retry_after)), 1)
+
+
+def retry_later(response, exc: AdmissionRejected):
+    """``response`` turned into the 429 answer to a rejected request."""
+    response.status_code = 429
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+def identity(request) -> str:
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return 'ip:' + client_ip(request)
+
+
+def _rate_limit(kind: str, request, who: str, per_second: float, burst: int) -> None:
+    """Take a token from the identity's bucket and from its client IP's bucket."""
+    wait = take_token(f"bucket:{kind}:{who}", per_second, burst)
+    if wait is None:
+        users = settings.ADMISSION_USERS_PER_IP
+        wait = take_token(f"bucket:{kind}:net:{client_ip(request)}", per_second * users, burst * users)
+    if wait is not None:
+        _reject(f"{kind}_rate", wait)
+
+
+def _count(name: str, delta: int = 1) -> None:
+    key = f"{KEY_PREFIX}metric:{name}"
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, max(delta, 0), timeout=None)
+
+
+def _reject(reason: str, retry_after: float):
+    _count(f"rejected:{reason}")
+    raise AdmissionRejected(reason, retry_after)
+
+
+def take_token(key: str, per_second: float, burst: int) -> Optional[float]:
+    """
+    Take one token from the bucket at ``key`` (GCRA). Returns ``None`` when
+    allowed, else the seconds until a token is available.
+    """
+    if per_second <= 0:
+        return None
+    interval = 1 / per_second
+    now = time.time()
+    arrival = max(cache.get(KEY_PREFIX + key) or now, now) + interval
+    allowed_at = arrival - max(burst, 1) * interval
+    if allowed_at > now:
+        return allowed_at - now
+    cache.set(KEY_PREFIX + key, arrival, timeout=math.ceil(arrival - now) + 1)
+    return None
+
+
+@contextmanager
+def _locked(key: str) -> Iterator[None]:
+    lock = f"{KEY_PREFIX}{key}:lock"
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    held = cache.add(lock, 1, timeout=LOCK_TTL_SECONDS)
+    while not held and time.monotonic() < deadline:
+        time.sleep(0.005)
+        held = cache.add(lock, 1, timeout=LOCK_TTL_SECONDS)
+    try:
+        yield
+    finally:
+        if held:
+            cache.delete(lock)
+
+
+class Slots:
+    """At most ``capacity`` holders at once (0 = unlimited), each with a deadline."""
+
+    def __init__(self, key: str, capacity: int):
+        self.key = KEY_PREFIX + key
+        self.capacity = capacity
+
+    def _live(self, now: float) -> Dict[str, float]:
+        return {holder: until for holder, until in (cache.get(self.key) or {}).items() if until > now}
+
+    def _store(self, holders: Dict[str, float], now: float) -> None:
+        if holders:
+            cache.set(self.key, holders, timeout=math.ceil(max(holders.values()) - now) + 1)
+        else:
+            cache.delete(self.key)
+
+    def acquire(self, holder: str, ttl: float) -> Optional[float]:
+        """Take or renew a slot; ``None`` on success, else seconds until one frees up."""
+        if self.capacity <= 0:
+            return None
+        now = time.time()
+        with _locked(self.key):
+            holders = self._live(now)
+            if holder not in holders and len(holders) >= self.capacity:
+                self._store(holders, now)
+                return min(holders.values()) - now
+            holders[holder] = now + ttl
+            self._store(holders, now)
+        return None
+
+    def release(self, holder: str) -> None:
+        if self.capacity <= 0:
+            return
+        now = time.time()
+        with _locked(self.key):
+            holders = self._live(now)
+            if holders.pop(holder, None) is not None:
+                self._store(holders, now)
+
+    def count(self) -> int:
+        return len(self._live(time.time()))
+
+
+def _user_streams(who: str) -> Slots:
+    return Slots(f"streams:{who}", settings.ADMISSION_STREAMS_PER_USER)
+
+
+def _transcodes() -> Slots:
+    return Slots('transcodes', settings.ADMISSION_MAX_TRANSCODES)
+
+
+def admit_stream(request, item_id: str) -> None:
+    """Admit a request of a playback session or raise ``AdmissionRejected``."""
+    if not settings.ADMISSION_ENABLED:
+        return
+    who = identity(request)
+    session = f"{who}|{item_id}"
+    lease_key = f"{KEY_PREFIX}lease:{session}"
+    idle = settings.ADMISSION_STREAM_IDLE_SECONDS
+    renewed_at = cache.get(lease_key)
+    now = time.time()
+    if renewed_at is not None:
+        # Running session: renew the lease (and its slots) at most every idle/2
+        if now - renewed_at > idle / 2:
+            cache.set(lease_key, now, timeout=idle)
+            _user_streams(who).acquire(session, idle)
+            _transcodes().acquire(session, idle)
+        return
+
+    _rate_limit(
+        'stream', request, who, settings.ADMISSION_STREAM_STARTS_PER_MINUTE / 60, settings.ADMISSION_STREAM_START_BURST
+    )
+    user_slots = _user_streams(who)
+    wait = user_slots.acquire(session, idle)
+    if wait is not None:
+        _reject('streams_per_user', wait)
+    wait = _transcodes().acquire(session, idle)
+    if wait is not None:
+        user_slots.release(session)
+        _reject('transcodes', wait)
+    cache.set(lease_key, now, timeout=idle)
+    _count('admitted:stream')
+
+
+@contextmanager
+def upload(request) -> Iterator[None]:
+    """Hold an upload slot for the duration of the block, or raise ``AdmissionRejected``."""
+    if not settings.ADMISSION_ENABLED:
+        yield
+        return
+    who = identity(request)
+    _rate_limit('upload', request, who, settings.ADMISSION_UPLOADS_PER_HOUR / 3600, settings.ADMISSION_UPLOAD_BURST)
+
+    holder = f"{who}|{uuid.uuid4().hex}"
+    user_slots = Slots(f"uploads:{who}", settings.ADMISSION_UPLOADS_PER_USER)
+    wait = user_slots.acquire(holder, UPLOAD_SLOT_TTL_SECONDS)
+    if wait is not None:
+        _reject('uploads_per_user', wait)
+    try:
+        _acquire_upload_slot(holder)
+        try:
+            _count('admitted:upload')
+            yield
+        finally:
+            Slots('uploads', settings.ADMISSION_MAX_UPLOADS).release(holder)
+    finally:
+        user_slots.release(holder)
+
+
+def _acquire_upload_slot(holder: str) -> None:
+    slots = Slots('uploads', settings.ADMISSION_MAX_UPLOADS)
+    if slots.acquire(holder, UPLOAD_SLOT_TTL_SECONDS) is None:
+        return
+    if queue_depth() >= settings.ADMISSION_UPLOAD_QUEUE_MAX:
+        _reject('upload_queue_full', settings.ADMISSION_UPLOAD_QUEUE_SECONDS)
+    _count('upload_queue')
+    try:
+        deadline = time.monotonic() + settings.ADMISSION_UPLOAD_QUEUE_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(QUEUE_POLL_SECONDS)
+            if slots.acquire(holder, UPLOAD_SLOT_TTL_SECONDS) is None:
+                return
+    finally:
+        _count('upload_queue', -1)
+    _reject('upload_queue_timeout', settings.ADMISSION_UPLOAD_QUEUE_SECONDS)
+
+
+def queue_depth() -> int:
+    return max(cache.get(f"{KEY_PREFIX}metric:upload_queue") or 0, 0)
+
+
+def stats() -> Dict[str, int]:
+    keys = ['admitted:stream', 'admitted:upload'] + [f"rejected:{reason}" for reason in REASONS]
+    values = cache.get_many([f"{KEY_PREFIX}metric:{key}" for key in keys])
+    snapshot = {key: values.get(f"{KEY_PREFIX}metric:{key}", 0) for key in keys}
+    snapshot['upload_queue_depth'] = queue_depth()
+    snapshot['active_transcodes'] = _transcodes().count()
+    snapshot['active_uploads'] = Slots('uploads', settings.ADMISSION_MAX_UPLOADS).count()
+    return snapshot
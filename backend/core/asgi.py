@@ -2,6 +2,8 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections to ``/graphql/`` carry GraphQL
+subscriptions (``core.subscriptions``).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -11,6 +13,17 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from core.env import load_env
+
+load_env()
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core import subscriptions  # noqa: E402  (needs the apps loaded above)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await subscriptions.application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,44 @@
+"""
+Async phase of GraphQL execution.
+
+``graphql.execute`` runs resolvers synchronously until one returns an
+awaitable (an ``async def`` resolver, such as ``jellyfinVideo`` and
+``jellyfinVideos`` in ``videos.schema``). From then on the remaining work is
+a coroutine, in which graphql-core gathers sibling fields concurrently.
+``complete`` finishes that coroutine with ``async_to_sync``:
+
+- under ASGI it runs on the server's event loop, and every request shares
+  that loop's Jellyfin client (``videos.jellyfin_async``)
+- under WSGI it runs on a short-lived loop, whose client is closed before the
+  loop goes away
+
+Operations without async resolvers never leave the synchronous path.
+
+Synchronous fields, and everything below them, are completed on the request
+thread before the async phase starts, so model resolvers keep their ORM
+access. Only the selections below an async field run on the event loop
+thread; an async resolver that needs the database wraps that access in
+``sync_to_async``.
+"""
+from inspect import isawaitable
+
+from asgiref.sync import async_to_sync
+
+
+def complete(result, request):
+    """``result`` of ``graphql.execute``, awaited if execution went async."""
+    if not isawaitable(result):
+        return result
+    # An ASGI server keeps its loop; the WSGI fallback gets a new one per call
+    short_lived = not hasattr(request, 'scope')
+    return async_to_sync(_finish)(result, short_lived)
+
+
+async def _finish(result, short_lived: bool):
+    try:
+        return await result
+    finally:
+        if short_lived:
+            from videos.jellyfin_async import close_client
+
+            await close_client()
@@ -0,0 +1,51 @@
+"""
+The client address of a request, seen through the reverse proxy.
+
+Behind nginx (``deploy/nginx.conf``) every request arrives from 127.0.0.1,
+so ``REMOTE_ADDR`` alone would put all anonymous clients under one identity
+for rate limits and budgets. When the peer is one of ``TRUSTED_PROXIES``
+(addresses or CIDR networks), ``X-Forwarded-For`` is walked from the right,
+skipping trusted hops, and the first untrusted address is the client;
+``X-Real-IP`` is used when there is no forwarded chain. Headers from any
+other peer are ignored, since the client could have written them itself.
+"""
+import ipaddress
+from functools import lru_cache
+from typing import Tuple
+
+from django.conf import settings
+
+
+@lru_cache(maxsize=8)
+def _networks(proxies: Tuple[str, ...]):
+    networks = []
+    for proxy in proxies:
+        try:
+            networks.append(ipaddress.ip_network(proxy, strict=False))
+        except ValueError:
+            continue
+    return tuple(networks)
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _networks(tuple(settings.TRUSTED_PROXIES)))
+
+
+def client_ip(request) -> str:
+    remote = request.META.get('REMOTE_ADDR', '')
+    if not _trusted(remote):
+        return remote
+    forwarded = [
+        hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()
+    ]
+    for hop in reversed(forwarded):
+        if not _trusted(hop):
+            return hop
+    if forwarded:
+        # Every hop was a trusted proxy; the leftmost is closest to the client
+        return forwarded[0]
+    return request.META.get('HTTP_X_REAL_IP', '').strip() or remote
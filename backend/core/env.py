@@ -0,0 +1,12 @@
+from pathlib import Path
+
+
+def load_env() -> None:
+    """Load the repository-level .env file, if present, into os.environ."""
+    env_path = Path(__file__).resolve().parent.parent.parent / '.env'
+    if env_path.exists():
+        try:
+            from dotenv import load_dotenv
+            load_dotenv(env_path)
+        except Exception:
+            pass
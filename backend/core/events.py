@@ -0,0 +1,218 @@
+"""
+Publish/subscribe for events pushed to GraphQL subscriptions
+(``core.subscriptions``).
+
+``publish(topic, payload)`` may be called from any thread. Subscribers are
+asyncio consumers. Every event loop gets one callback per event, which hands
+the same ``Event`` object to each of its subscribers. Subscribers can
+therefore share work done for an event (see ``Event.shared``).
+
+Brokers (``EVENTS_BROKER``):
+
+- ``local``: events reach only subscribers in the publishing process. This
+  suits a single worker, and management commands publish into the void.
+- ``redis``: events go through one Redis pub/sub channel
+  (``EVENTS_REDIS_CHANNEL``). A relay thread in each process with subscribers
+  fans them out locally. This is the default when ``REDIS_URL`` is set and
+  needs the redis package.
+
+A subscriber that falls ``EVENTS_SUBSCRIBER_QUEUE_SIZE`` events behind loses
+its oldest events. Losses are counted in ``stats()``.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+RELAY_RETRY_SECONDS = 1
+
+
+class Event:
+    __slots__ = ('topic', 'payload', '_shared')
+
+    def __init__(self, topic: str, payload: Dict[str, Any]):
+        self.topic = topic
+        self.payload = payload
+        self._shared: Dict[Any, asyncio.Future] = {}
+
+    def shared(self, key, factory: Callable[[], Awaitable[Any]]) -> Awaitable[Any]:
+        """
+        The result of ``factory()`` for ``key``, computed once per event on
+        this loop however many subscribers ask for it.
+        """
+        future = self._shared.get(key)
+        if future is None:
+            future = self._shared[key] = asyncio.ensure_future(factory())
+        # One subscriber going away must not cancel the others' result
+        return asyncio.shield(future)
+
+
+class Subscription:
+    """Events on ``topics`` for one consumer, in publication order."""
+
+    def __init__(self, broker: 'LocalBroker', topics: Iterable[str], maxsize: int):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.loop = asyncio.get_running_loop()
+        self._events: deque = deque()
+        self._maxsize = max(maxsize, 1)
+        self._waiter: Optional[asyncio.Future] = None
+        self.closed = False
+
+    def deliver(self, event: Event) -> None:
+        if len(self._events) >= self._maxsize:
+            self._events.popleft()
+            self.broker.counters['dropped'] += 1
+        self._events.append(event)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        while not self._events:
+            if self.closed:
+                raise StopAsyncIteration
+            self._waiter = self.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._events.popleft()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+            if self._waiter is not None and not self._waiter.done():
+                self._waiter.set_result(None)
+
+
+class LocalBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_loop: Dict[asyncio.AbstractEventLoop, Set[Subscription]] = {}
+        self.counters = {'published': 0, 'delivered': 0, 'dropped': 0}
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """Subscribe the running loop to ``topics``; ``close()`` the result when done."""
+        subscription = Subscription(self, topics, settings.EVENTS_SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._by_loop.setdefault(subscription.loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._by_loop.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._by_loop[subscription.loop]
+
+    def publish(self, topic: str, payload: Dict[str, Any]) -> None:
+        self.counters['published'] += 1
+        self.fan_out(Event(topic, payload))
+
+    def fan_out(self, event: Event) -> None:
+        with self._lock:
+            loops = list(self._by_loop.items())
+        for loop, subscriptions in loops:
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscriptions, event)
+            except RuntimeError:
+                # Loop closed without its subscribers closing first
+                with self._lock:
+                    self._by_loop.pop(loop, None)
+
+    def _deliver(self, subscriptions: Set[Subscription], event: Event) -> None:
+        for subscription in list(subscriptions):
+            if event.topic in subscription.topics:
+                subscription.deliver(event)
+                self.counters['delivered'] += 1
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._by_loop.values())
+
+
+class RedisBroker(LocalBroker):
+    """``LocalBroker`` fed from a Redis pub/sub channel shared by every process."""
+
+    def __init__(self, url: str, channel: str):
+        super().__init__()
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._channel = channel
+        self._relay: Optional[threading.Thread] = None
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        if self._relay is None:
+            with self._lock:
+                if self._relay is None:
+                    self._relay = threading.Thread(target=self._run_relay, name='events-relay', daemon=True)
+                    self._relay.start()
+        return super().subscribe(topics)
+
+    def publish(self, topic: str, payload: Dict[str, Any]) -> None:
+        self.counters['published'] += 1
+        self._redis.publish(self._channel, json.dumps({'topic': topic, 'payload': payload}))
+
+    def _run_relay(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    data = json.loads(message['data'])
+                    self.fan_out(Event(data['topic'], data['payload']))
+            except Exception:
+                logger.exception('events relay lost %s, reconnecting', self._channel)
+                time.sleep(RELAY_RETRY_SECONDS)
+
+
+_broker: Optional[LocalBroker] = None
+_broker_lock = threading.Lock()
+
+
+def broker() -> LocalBroker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if settings.EVENTS_BROKER == 'redis':
+                    _broker = RedisBroker(settings.REDIS_URL, settings.EVENTS_REDIS_CHANNEL)
+                else:
+                    _broker = LocalBroker()
+    return _broker
+
+
+def subscribe(topics: Iterable[str]) -> Subscription:
+    return broker().subscribe(topics)
+
+
+def publish(topic: str, payload: Dict[str, Any]) -> None:
+    """Publish now; failures are logged, never raised to the publisher."""
+    try:
+        broker().publish(topic, payload)
+    except Exception:
+        logger.exception('could not publish %s event', topic)
+
+
+def publish_on_commit(topic: str, payload: Dict[str, Any]) -> None:
+    """Publish once the current transaction commits (now, outside one)."""
+    transaction.on_commit(lambda: publish(topic, payload))
+
+
+def stats() -> Dict[str, int]:
+    current = broker()
+    return dict(current.counters, subscribers=current.subscriber_count())
@@ -0,0 +1,56 @@
+"""
+Process-local LRU used for per-worker caches of derived data: parsed GraphQL
+documents, cost and cache-policy analyses, verified identities, filtered
+playlists. Unlike ``django.core.cache`` values are kept as live objects, never
+pickled, so hits cost a dict lookup under a lock.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Thread-safe LRU of at most ``maxsize`` entries (0 disables it); ``None`` is not a value."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which ``predicate(key, value)`` holds; returns how many."""
+        with self._lock:
+            doomed = [key for key, value in self._data.items() if predicate(key, value)]
+            for key in doomed:
+                del self._data[key]
+        return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,139 @@
+"""
+Automatic persisted queries (APQ) and a process-local LRU of parsed and
+validated GraphQL documents.
+
+Clients send ``extensions.persistedQuery.sha256Hash`` instead of the full
+query text. The text is kept in the shared cache backend so every worker can
+resolve a hash, while the parsed ``DocumentNode`` lives in a per-process LRU
+so repeated operations skip parsing and validation entirely. Only query texts
+that passed validation are registered, for
+``GRAPHQL_PERSISTED_QUERY_TTL_SECONDS`` and up to
+``GRAPHQL_PERSISTED_QUERY_MAX_BYTES``, so anonymous clients cannot fill the
+shared cache with arbitrary text.
+"""
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .lru import LRUCache
+
+CACHE_KEY_PREFIX = 'apq:'
+
+
+class PersistedQueryError(Exception):
+    code = 'PERSISTED_QUERY_ERROR'
+
+
+class PersistedQueryNotFound(PersistedQueryError):
+    code = 'PERSISTED_QUERY_NOT_FOUND'
+
+    def __init__(self):
+        super().__init__('PersistedQueryNotFound')
+
+
+class PersistedQueryNotAllowed(PersistedQueryError):
+    code = 'PERSISTED_QUERY_NOT_ALLOWED'
+
+    def __init__(self):
+        super().__init__('PersistedQueryNotAllowed')
+
+
+class PersistedQueryHashMismatch(PersistedQueryError):
+    code = 'PERSISTED_QUERY_HASH_MISMATCH'
+
+    def __init__(self):
+        super().__init__('provided sha does not match query')
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+document_cache = LRUCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+_manifest: Optional[Dict[str, str]] = None
+_manifest_lock = threading.Lock()
+
+
+def load_manifest() -> Dict[str, str]:
+    """
+    Read the allowlist manifest. Accepts either a plain ``{hash: query}`` object
+    or Apollo's ``persisted-query-manifest`` format with an ``operations`` list.
+    """
+    global _manifest
+    if _manifest is not None:
+        return _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            path = settings.GRAPHQL_PERSISTED_QUERIES_MANIFEST
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    raw = json.load(f)
+            except FileNotFoundError:
+                raw = {}
+            if isinstance(raw, dict) and isinstance(raw.get('operations'), list):
+                _manifest = {op['id']: op['body'] for op in raw['operations']}
+            else:
+                _manifest = {k: v for k, v in raw.items() if isinstance(v, str)}
+    return _manifest
+
+
+def get_persisted_hash(data: Any, request_get: Any = None) -> Optional[str]:
+    extensions = None
+    if request_get is not None:
+        extensions = request_get.get('extensions')
+    if not extensions and hasattr(data, 'get'):
+        extensions = data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    if not isinstance(extensions, dict):
+        return None
+    persisted = extensions.get('persistedQuery') or {}
+    if persisted.get('version', 1) != 1:
+        return None
+    return persisted.get('sha256Hash')
+
+
+def resolve_query(query: Optional[str], sha256: Optional[str]):
+    """
+    Return ``(query_text, hash)`` for an incoming request and enforce the
+    allowlist when it is enabled. The caller is expected to have checked
+    ``document_cache`` for the hash already, so a hash-only request only
+    reaches the shared cache on a miss. Queries sent alongside their hash are
+    registered by the caller with ``register_query`` once they validate.
+    """
+    if query:
+        computed = query_hash(query)
+        if sha256 and computed != sha256:
+            raise PersistedQueryHashMismatch()
+        sha256 = computed
+
+    if settings.GRAPHQL_PERSISTED_QUERIES_ALLOWLIST:
+        allowed = load_manifest().get(sha256) if sha256 else None
+        if allowed is None:
+            raise PersistedQueryNotAllowed()
+        return allowed, sha256
+
+    if not sha256:
+        return query, None
+    if not query:
+        query = cache.get(CACHE_KEY_PREFIX + sha256)
+        if query is None:
+            raise PersistedQueryNotFound()
+    return query, sha256
+
+
+def register_query(sha256: str, query: str) -> None:
+    """Store a validated query so hash-only requests resolve on every worker."""
+    if settings.GRAPHQL_PERSISTED_QUERIES_ALLOWLIST:
+        return
+    if len(query.encode('utf-8')) > settings.GRAPHQL_PERSISTED_QUERY_MAX_BYTES:
+        return
+    cache.set(CACHE_KEY_PREFIX + sha256, query, timeout=settings.GRAPHQL_PERSISTED_QUERY_TTL_SECONDS)
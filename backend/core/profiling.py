@@ -0,0 +1,336 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+With ``PROFILING_ENABLED`` a request is profiled when it is picked by
+``PROFILING_SAMPLE_RATE`` or carries a valid ``X-Profile-Token`` header (see
+``sign_token``; ``python manage.py profile_token`` prints one). A profiled
+request gets:
+
+- stack samples of the request thread every ``PROFILING_INTERVAL_MS``, taken
+  by a helper thread through ``sys._current_frames()``
+- the timing of every SQL query (``connection.execute_wrapper``)
+- the timing of upstream HTTP requests made with ``record_upstream`` as a
+  ``requests`` response hook (Jellyfin client, stream proxy)
+- the timing of each GraphQL resolver, through ``ResolverProfilingMiddleware``
+
+and is written to ``PROFILING_DIR`` as a speedscope file with two profiles:
+the sampled stacks, and a timeline of queries, upstream requests and
+resolvers. Only the newest ``PROFILING_MAX_FILES`` files (at most
+``PROFILING_MAX_BYTES`` in total) are kept. Streaming responses are profiled
+until their body has been sent. The response carries ``X-Profile-Id``.
+
+When ``PROFILING_ENABLED`` is off the middleware removes itself from the
+chain at startup and the resolver middleware is not installed, so there is no
+per-request cost.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = 'X-Profile-Token'
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+SUFFIX = '.speedscope.json'
+MAX_SQL_LENGTH = 300
+
+_local = threading.local()
+
+
+def sign_token(ttl: int = 600, now: Optional[float] = None) -> str:
+    """Header value that forces profiling of requests for ``ttl`` seconds."""
+    expires = int((now or time.time()) + ttl)
+    return f"{expires}.{_signature(expires)}"
+
+
+def _signature(expires: int) -> str:
+    return hmac.new(
+        settings.PROFILING_SECRET.encode('utf-8'), f"profile.{expires}".encode('utf-8'), hashlib.sha256
+    ).hexdigest()
+
+
+def verify_token(token: str) -> bool:
+    expires, _, sig = token.partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(_signature(int(expires)), sig)
+
+
+def current() -> Optional['RequestProfile']:
+    return getattr(_local, 'profile', None)
+
+
+class RequestProfile:
+    """Stack samples and timed events of one request."""
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.ended: Optional[float] = None
+        self.frames: List[Dict] = []
+        self._frame_index: Dict[Tuple, int] = {}
+        self._frames_lock = threading.Lock()
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        # (start ms, end ms, frame index) of queries, upstream requests and resolvers
+        self.events: List[Tuple[float, float, int]] = []
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.upstream_ms = 0.0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='request-profiler', daemon=True)
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        if self.ended is None:
+            self.ended = time.perf_counter()
+            self._stop.set()
+            self._sampler.join()
+
+    def now_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def frame(self, name: str, file: str = '', line: int = 0) -> int:
+        key = (name, file, line)
+        index = self._frame_index.get(key)
+        if index is None:
+            # The sampler thread and the request thread both add frames
+            with self._frames_lock:
+                index = self._frame_index.get(key)
+                if index is None:
+                    entry = {'name': name}
+                    if file:
+                        entry.update(file=file, line=line)
+                    self.frames.append(entry)
+                    index = self._frame_index[key] = len(self.frames) - 1
+        return index
+
+    def event(self, name: str, start_ms: float, end_ms: float) -> None:
+        self.events.append((start_ms, end_ms, self.frame(name)))
+
+    def _sample(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(self.frame(code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append((now - last) * 1000)
+            last = now
+
+    def _evented(self) -> Dict:
+        # speedscope needs properly nested open/close events. An event that
+        # outlives its parent (e.g. a lazily evaluated query) is cut short.
+        events = []
+        stack: List[Tuple[float, int]] = []
+        for start, end, index in sorted(self.events, key=lambda e: (e[0], -e[1])):
+            while stack and stack[-1][0] <= start:
+                at, frame = stack.pop()
+                events.append({'type': 'C', 'at': at, 'frame': frame})
+            if stack:
+                end = min(end, stack[-1][0])
+            stack.append((end, index))
+            events.append({'type': 'O', 'at': start, 'frame': index})
+        while stack:
+            at, frame = stack.pop()
+            events.append({'type': 'C', 'at': at, 'frame': frame})
+        return {
+            'type': 'evented',
+            'name': f"{self.name} (sql, upstream, resolvers)",
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': self.duration_ms,
+            'events': events,
+        }
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.ended or time.perf_counter()) - self.started) * 1000
+
+    def to_speedscope(self) -> Dict:
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': self.name,
+            'exporter': 'maxstudio core.profiling',
+            'activeProfileIndex': 0,
+            'shared': {'frames': self.frames},
+            'profiles': [
+                {
+                    'type': 'sampled',
+                    'name': f"{self.name} (stack samples)",
+                    'unit': 'milliseconds',
+                    'startValue': 0,
+                    'endValue': self.duration_ms,
+                    'samples': self.samples,
+                    'weights': self.weights,
+                },
+                self._evented(),
+            ],
+        }
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    profile = current()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = profile.now_ms()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        end = profile.now_ms()
+        profile.sql_count += 1
+        profile.sql_ms += end - start
+        profile.event(f"SQL {sql[:MAX_SQL_LENGTH]}", start, end)
+
+
+def record_upstream(response, *args, **kwargs):
+    """``requests`` response hook recording the upstream request in the current profile."""
+    profile = current()
+    if profile is not None:
+        end = profile.now_ms()
+        elapsed = response.elapsed.total_seconds() * 1000
+        profile.upstream_ms += elapsed
+        profile.event(
+            f"{response.request.method} {response.url.split('?')[0]} -> {response.status_code}",
+            end - elapsed, end,
+        )
+    return response
+
+
+class ResolverProfilingMiddleware:
+    """Graphene middleware timing each resolver of a profiled request."""
+
+    def resolve(self, next_, root, info, **kwargs):
+        profile = current()
+        if profile is None:
+            return next_(root, info, **kwargs)
+        start = profile.now_ms()
+        try:
+            return next_(root, info, **kwargs)
+        finally:
+            profile.event(f"resolve {info.parent_type.name}.{info.field_name}", start, profile.now_ms())
+
+
+class ProfilingMiddleware:
+    """Profiles sampled or explicitly requested requests; see the module docstring."""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.rate = settings.PROFILING_SAMPLE_RATE
+        self.interval = settings.PROFILING_INTERVAL_MS / 1000
+
+    def should_profile(self, request) -> bool:
+        token = request.headers.get(TOKEN_HEADER)
+        if token:
+            return verify_token(token)
+        return self.rate > 0 and random.random() < self.rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profile = RequestProfile(f"{request.method} {request.path}", self.interval)
+        stack = ExitStack()
+        for conn in connections.all(initialized_only=False):
+            stack.enter_context(conn.execute_wrapper(_sql_wrapper))
+        _local.profile = profile
+        profile.start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _finish(profile, stack, status=500)
+            raise
+        name = _filename(profile, response.status_code)
+        response['X-Profile-Id'] = name
+        if response.streaming:
+            response.streaming_content = _finish_after(response.streaming_content, profile, stack, name)
+        else:
+            _finish(profile, stack, response.status_code, name)
+        return response
+
+
+def _finish_after(content, profile, stack, name):
+    try:
+        yield from content
+    finally:
+        _finish(profile, stack, 200, name)
+
+
+def _finish(profile: RequestProfile, stack: ExitStack, status: int, name: Optional[str] = None) -> None:
+    profile.stop()
+    stack.close()
+    if current() is profile:
+        _local.profile = None
+    try:
+        write(profile, name or _filename(profile, status))
+    except OSError:
+        logger.exception('Could not write profile of %s', profile.name)
+
+
+def _filename(profile: RequestProfile, status: int) -> str:
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', profile.name).strip('-')[:80]
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{threading.get_ident() % 10000:04d}-{slug}-{status}{SUFFIX}"
+
+
+def write(profile: RequestProfile, name: str) -> str:
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    tmp = f"{path}.part"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(profile.to_speedscope(), f, separators=(',', ':'))
+    os.replace(tmp, path)
+    logger.info(
+        'Profiled %s in %.1f ms: %d samples, %d queries (%.1f ms), upstream %.1f ms -> %s',
+        profile.name, profile.duration_ms, len(profile.samples), profile.sql_count,
+        profile.sql_ms, profile.upstream_ms, name,
+    )
+    prune(directory, settings.PROFILING_MAX_FILES, settings.PROFILING_MAX_BYTES)
+    return path
+
+
+def prune(directory: str, max_files: int, max_bytes: int) -> None:
+    """Delete the oldest profiles beyond ``max_files`` files or ``max_bytes`` in total."""
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(SUFFIX):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, entry.path))
+    files.sort(reverse=True)
+    total = 0
+    for count, (_mtime, size, path) in enumerate(files, 1):
+        total += size
+        if count > max_files or total > max_bytes:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,206 @@
+"""
+Static cost analysis, depth and alias limits for GraphQL operations.
+
+The cost of a field is its weight plus the cost of its selections multiplied
+by a list multiplier when the field returns a list. Weights default to 1 for
+object fields and 0 for scalars; expensive fields (Jellyfin-backed lookups,
+uploads, password hashing) are weighted explicitly and can be overridden with
+``GRAPHQL_FIELD_COSTS``. ``QueryCostRule`` rejects over-limit operations during
+validation, before anything executes; ``charge_budget`` enforces a per-identity
+cost budget per time window through the shared cache backend.
+"""
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLNonNull,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    get_named_type,
+    get_operation_ast,
+    is_composite_type,
+)
+from graphql.language import OperationType
+from graphql.validation import ValidationRule
+
+from .lru import LRUCache
+
+FIELD_WEIGHTS: Dict[str, int] = {
+    'Query.videos': 10,
+    'Query.video': 5,
+    'Query.jellyfinVideos': 10,
+    'Query.jellyfinVideo': 5,
+    'Mutation.uploadVideo': 200,
+    'Mutation.tokenAuth': 20,
+    'Mutation.register': 20,
+}
+
+LIST_MULTIPLIERS: Dict[str, int] = {}
+
+BUDGET_KEY_PREFIX = 'gqlbudget:'
+
+
+@dataclass
+class OperationAnalysis:
+    cost: int = 0
+    depth: int = 0
+    aliases: int = 0
+    root_fields: int = 0
+
+
+def _field_weight(parent_name: str, field_name: str, named_type) -> int:
+    key = f"{parent_name}.{field_name}"
+    overrides = settings.GRAPHQL_FIELD_COSTS
+    if key in overrides:
+        return overrides[key]
+    if key in FIELD_WEIGHTS:
+        return FIELD_WEIGHTS[key]
+    return 1 if is_composite_type(named_type) else 0
+
+
+def _list_multiplier(parent_name: str, field_name: str, field_type) -> int:
+    multiplier = 1
+    while True:
+        if isinstance(field_type, GraphQLNonNull):
+            field_type = field_type.of_type
+        elif isinstance(field_type, GraphQLList):
+            multiplier *= LIST_MULTIPLIERS.get(
+                f"{parent_name}.{field_name}", settings.GRAPHQL_DEFAULT_LIST_MULTIPLIER
+            )
+            field_type = field_type.of_type
+        else:
+            return multiplier
+
+
+def _selection_cost(schema, selection_set, parent_type, fragments, depth, analysis, visiting) -> int:
+    total = 0
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            name = selection.name.value
+            if name.startswith('__'):
+                continue
+            analysis.depth = max(analysis.depth, depth)
+            if selection.alias is not None:
+                analysis.aliases += 1
+            fields = getattr(parent_type, 'fields', None) or {}
+            field_def = fields.get(name)
+            if field_def is None:
+                continue
+            named = get_named_type(field_def.type)
+            child = 0
+            if selection.selection_set and is_composite_type(named):
+                child = _selection_cost(
+                    schema, selection.selection_set, named, fragments, depth + 1, analysis, visiting
+                )
+            weight = _field_weight(parent_type.name, name, named)
+            total += weight + _list_multiplier(parent_type.name, name, field_def.type) * child
+        elif isinstance(selection, InlineFragmentNode):
+            fragment_type = parent_type
+            if selection.type_condition is not None:
+                fragment_type = schema.get_type(selection.type_condition.name.value) or parent_type
+            total += _selection_cost(
+                schema, selection.selection_set, fragment_type, fragments, depth, analysis, visiting
+            )
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            fragment = fragments.get(name)
+            if fragment is None or name in visiting:
+                continue
+            fragment_type = schema.get_type(fragment.type_condition.name.value) or parent_type
+            visiting.add(name)
+            total += _selection_cost(
+                schema, fragment.selection_set, fragment_type, fragments, depth, analysis, visiting
+            )
+            visiting.discard(name)
+    return total
+
+
+def analyze_operation(schema, document, operation: OperationDefinitionNode) -> OperationAnalysis:
+    root = {
+        OperationType.QUERY: schema.query_type,
+        OperationType.MUTATION: schema.mutation_type,
+        OperationType.SUBSCRIPTION: schema.subscription_type,
+    }[operation.operation]
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    analysis = OperationAnalysis()
+    if root is None:
+        return analysis
+    analysis.root_fields = sum(
+        1 for s in operation.selection_set.selections
+        if not (isinstance(s, FieldNode) and s.name.value.startswith('__'))
+    )
+    analysis.cost = _selection_cost(schema, operation.selection_set, root, fragments, 1, analysis, set())
+    return analysis
+
+
+class QueryCostRule(ValidationRule):
+    """Reject operations exceeding the configured cost, depth, alias or root-field limits."""
+
+    def enter_operation_definition(self, node: OperationDefinitionNode, *_args):
+        analysis = analyze_operation(self.context.schema, self.context.document, node)
+        checks = (
+            (analysis.depth, settings.GRAPHQL_MAX_QUERY_DEPTH, 'QUERY_TOO_DEEP', 'depth'),
+            (analysis.aliases, settings.GRAPHQL_MAX_ALIASES, 'TOO_MANY_ALIASES', 'alias count'),
+            (analysis.root_fields, settings.GRAPHQL_MAX_ROOT_FIELDS, 'TOO_MANY_ROOT_FIELDS', 'root field count'),
+            (analysis.cost, settings.GRAPHQL_MAX_QUERY_COST, 'QUERY_TOO_COMPLEX', 'cost'),
+        )
+        for value, limit, code, label in checks:
+            if limit and value > limit:
+                self.report_error(GraphQLError(
+                    f"Operation {label} {value} exceeds maximum of {limit}.",
+                    node,
+                    extensions={'code': code},
+                ))
+
+
+_costs = LRUCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+
+def cost_for(schema, document, operation_name: Optional[str], sha256: Optional[str]) -> int:
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0
+    key = f"{sha256}:{operation_name or ''}"
+    if sha256:
+        cost = _costs.get(key)
+        if cost is not None:
+            return cost
+    cost = analyze_operation(schema, document, operation).cost
+    if sha256:
+        _costs.set(key, cost)
+    return cost
+
+
+def charge_budget(identity: str, cost: int) -> Optional[int]:
+    """
+    Add ``cost`` to ``identity``'s spend in the current window. Returns the
+    number of seconds until the window resets if the budget is exhausted.
+    """
+    budget = settings.GRAPHQL_COST_BUDGET
+    if not budget or cost <= 0:
+        return None
+    window = settings.GRAPHQL_COST_BUDGET_WINDOW_SECONDS
+    now = time.time()
+    key = f"{BUDGET_KEY_PREFIX}{identity}:{int(now // window)}"
+    cache.add(key, 0, timeout=window)
+    try:
+        spent = cache.incr(key, cost)
+    except ValueError:
+        cache.set(key, cost, timeout=window)
+        spent = cost
+    if spent > budget:
+        return max(int(math.ceil(window - now % window)), 1)
+    return None
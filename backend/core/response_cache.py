@@ -0,0 +1,198 @@
+"""
+Whole-response cache for GraphQL query operations.
+
+Object types opt in with ``@cache_hint(max_age=..., scope=..., tags=...)``. The
+cache policy of an operation is the minimum ``max_age`` over every composite
+field it selects (leaf fields inherit their parent's); any unhinted composite
+field makes the whole operation uncacheable. Types that embed signed stream
+URLs are capped so a cached response never outlives its signatures.
+
+Entries are keyed by (operation hash, operation name, variables, auth scope)
+and carry the versions of their tags, so bumping a tag version invalidates
+every response that touched it.
+"""
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLObjectType,
+    InlineFragmentNode,
+    get_named_type,
+    get_operation_ast,
+    is_leaf_type,
+)
+from graphql.language import OperationType
+
+from .lru import LRUCache
+
+PUBLIC = 'PUBLIC'
+PRIVATE = 'PRIVATE'
+
+KEY_PREFIX = 'gqlresp:'
+TAG_PREFIX = 'gqltag:'
+
+
+@dataclass(frozen=True)
+class CacheHint:
+    max_age: int
+    scope: str = PUBLIC
+    signed_urls: bool = False
+    tags: FrozenSet[str] = frozenset()
+
+
+@dataclass
+class CachePolicy:
+    max_age: int = 0
+    scope: str = PUBLIC
+    tags: FrozenSet[str] = field(default_factory=frozenset)
+
+    @property
+    def cacheable(self) -> bool:
+        return settings.GRAPHQL_RESPONSE_CACHE_ENABLED and self.max_age > 0
+
+
+def cache_hint(max_age: int, scope: str = PUBLIC, signed_urls: bool = False, tags: Iterable[str] = ()):
+    """Class decorator attaching a cache hint to a graphene type."""
+    def decorator(cls):
+        cls._cache_hint = CacheHint(max_age, scope, signed_urls, frozenset(tags))
+        return cls
+    return decorator
+
+
+def _hint_for(graphql_type) -> Optional[CacheHint]:
+    graphene_type = getattr(graphql_type, 'graphene_type', None)
+    return getattr(graphene_type, '_cache_hint', None)
+
+
+def _signed_url_cap() -> int:
+    return max(settings.SIGNED_URL_TTL_SECONDS - settings.SIGNED_URL_MIN_REMAINING_SECONDS, 0)
+
+
+def _walk(selection_set, parent_type, parent_age, fragments, state, seen_fragments):
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            name = selection.name.value
+            if name.startswith('__'):
+                continue
+            field_def = parent_type.fields.get(name)
+            if field_def is None:
+                continue
+            named = get_named_type(field_def.type)
+            if is_leaf_type(named):
+                state['max_age'] = min(state['max_age'], parent_age)
+                continue
+            hint = _hint_for(named)
+            if hint is None:
+                state['max_age'] = 0
+                continue
+            age = hint.max_age
+            if hint.signed_urls:
+                age = min(age, _signed_url_cap())
+            if hint.scope == PRIVATE:
+                state['scope'] = PRIVATE
+            state['tags'] |= hint.tags
+            state['max_age'] = min(state['max_age'], age)
+            if selection.selection_set and isinstance(named, GraphQLObjectType):
+                _walk(selection.selection_set, named, age, fragments, state, seen_fragments)
+        elif isinstance(selection, InlineFragmentNode):
+            _walk(selection.selection_set, parent_type, parent_age, fragments, state, seen_fragments)
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            fragment = fragments.get(name)
+            if fragment is None or name in seen_fragments:
+                continue
+            seen_fragments.add(name)
+            _walk(fragment.selection_set, parent_type, parent_age, fragments, state, seen_fragments)
+
+
+def compute_policy(schema, document, operation_name: Optional[str]) -> CachePolicy:
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return CachePolicy()
+    root = schema.query_type
+    root_hint = _hint_for(root)
+    root_age = root_hint.max_age if root_hint else 0
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    state: Dict[str, Any] = {
+        'max_age': settings.GRAPHQL_RESPONSE_CACHE_MAX_AGE,
+        'scope': PUBLIC,
+        'tags': set(root_hint.tags) if root_hint else set(),
+    }
+    _walk(operation.selection_set, root, root_age, fragments, state, set())
+    return CachePolicy(max_age=state['max_age'], scope=state['scope'], tags=frozenset(state['tags']))
+
+
+_policies = LRUCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+
+def policy_for(schema, document, operation_name: Optional[str], sha256: Optional[str]) -> CachePolicy:
+    if not sha256:
+        return compute_policy(schema, document, operation_name)
+    key = f"{sha256}:{operation_name or ''}"
+    policy = _policies.get(key)
+    if policy is None:
+        policy = compute_policy(schema, document, operation_name)
+        _policies.set(key, policy)
+    return policy
+
+
+def make_key(sha256: str, operation_name: Optional[str], variables: Any, scope: str) -> str:
+    raw = json.dumps([sha256, operation_name or '', variables or {}, scope], sort_keys=True, separators=(',', ':'))
+    return KEY_PREFIX + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def tag_versions(tags: Iterable[str]) -> Dict[str, int]:
+    tags = sorted(tags)
+    if not tags:
+        return {}
+    found = cache.get_many([TAG_PREFIX + t for t in tags])
+    return {t: found.get(TAG_PREFIX + t, 0) for t in tags}
+
+
+def lookup(key: str) -> Optional[Dict[str, Any]]:
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry['expires_at'] <= time.time():
+        return None
+    if tag_versions(entry['tags']) != entry['tags']:
+        return None
+    return entry
+
+
+def store(key: str, body: str, policy: CachePolicy, versions: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Store ``body``. ``versions`` must be read before the operation executed so an
+    invalidation racing with execution is not masked.
+    """
+    entry = {
+        'body': body,
+        'etag': '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"',
+        'expires_at': time.time() + policy.max_age,
+        'tags': versions,
+    }
+    cache.set(key, entry, timeout=policy.max_age)
+    return entry
+
+
+def invalidate_tags(tags: Iterable[str]) -> None:
+    """Invalidate every cached response that touched any of ``tags``."""
+    for tag in tags:
+        key = TAG_PREFIX + tag
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
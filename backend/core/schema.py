@@ -1,9 +1,11 @@
 import graphene
 import graphql_jwt
 from accounts.schema import AccountsQuery, AccountsMutation
-from videos.schema import VideosQuery, VideosMutation
+from videos.schema import VideosQuery, VideosMutation, VideosSubscription
+from .response_cache import cache_hint
 
 
+@cache_hint(max_age=60)
 class Query(AccountsQuery, VideosQuery, graphene.ObjectType):
     healthcheck = graphene.String(description="Basic healthcheck")
 
@@ -18,6 +20,10 @@ class Mutation(AccountsMutation, VideosMutation, graphene.ObjectType):
     refresh_token = graphql_jwt.Refresh.Field()
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+class Subscription(VideosSubscription, graphene.ObjectType):
+    pass
+
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
 
 
@@ -12,12 +12,12 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
-from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
+# The .env file is loaded by the entry points (manage.py, core.wsgi, core.asgi)
+# so importing settings has no side effects.
 BASE_DIR = Path(__file__).resolve().parent.parent
 ENV_PATH = BASE_DIR.parent / '.env'
-load_dotenv(ENV_PATH)
 
 
 # Quick-start development settings - unsuitable for production
@@ -31,6 +31,10 @@ DEBUG = os.getenv('DEBUG', 'true').lower() == 'true'
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
+# Reverse proxies (deploy/nginx.conf) trusted to name the client in
+# X-Forwarded-For / X-Real-IP; addresses or CIDR networks, see core.client_ip
+TRUSTED_PROXIES = [p.strip() for p in os.getenv('TRUSTED_PROXIES', '127.0.0.1,::1').split(',') if p.strip()]
+
 
 # Application definition
 
@@ -48,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -105,6 +110,27 @@ else:
     }
 
 
+# Cache
+# Process-local by default; set REDIS_URL to share caches across workers
+# (requires the redis package).
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -141,11 +167,71 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Signed URL settings
+SIGNED_URL_SECRET = os.getenv('SIGNED_URL_SECRET', os.getenv('SECRET_KEY', 'change-me'))
+SIGNED_URL_TTL_SECONDS = int(os.getenv('SIGNED_URL_TTL_SECONDS', '900'))
+# Cached responses embedding signed URLs expire this long before the URLs do
+SIGNED_URL_MIN_REMAINING_SECONDS = int(os.getenv('SIGNED_URL_MIN_REMAINING_SECONDS', '300'))
+
+# Media storage for originals, thumbnails and HLS output: 'local' (MEDIA_ROOT)
+# or 's3' for any S3-compatible service (AWS, DigitalOcean Spaces, MinIO).
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 'local')
+MEDIA_UPLOAD_CONCURRENCY = int(os.getenv('MEDIA_UPLOAD_CONCURRENCY', '8'))
+# Lifetime of presigned URLs handed to ffmpeg and to players for segments
+MEDIA_TRANSCODE_URL_TTL_SECONDS = int(os.getenv('MEDIA_TRANSCODE_URL_TTL_SECONDS', '21600'))
+MEDIA_SEGMENT_URL_TTL_SECONDS = int(os.getenv('MEDIA_SEGMENT_URL_TTL_SECONDS', '21600'))
+# Packaging of generated renditions: 'ts' (MPEG-TS HLS, audio per variant) or
+# 'cmaf' (fMP4 segments with one shared audio rendition, served as HLS and DASH).
+# MEDIA_PART_SECONDS > 0 splits CMAF segments into fragments of that length.
+MEDIA_PACKAGING = os.getenv('MEDIA_PACKAGING', 'ts')
+MEDIA_SEGMENT_SECONDS = float(os.getenv('MEDIA_SEGMENT_SECONDS', '6'))
+MEDIA_PART_SECONDS = float(os.getenv('MEDIA_PART_SECONDS', '0'))
+# Package only the lowest TS rendition at upload; other variants' segments are
+# transcoded on first request and kept in an LRU disk cache (videos.jit).
+MEDIA_JIT_PACKAGING = os.getenv('MEDIA_JIT_PACKAGING', 'false').lower() == 'true'
+MEDIA_JIT_CACHE_DIR = os.getenv('MEDIA_JIT_CACHE_DIR', str(BASE_DIR / 'media' / 'jit_cache'))
+MEDIA_JIT_CACHE_MAX_BYTES = int(os.getenv('MEDIA_JIT_CACHE_MAX_BYTES', str(20 * 1024 ** 3)))
+
+if MEDIA_STORAGE == 's3':
+    from boto3.s3.transfer import TransferConfig
+
+    DEFAULT_STORAGE = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.getenv('S3_BUCKET', 'maxstudio-media'),
+            'endpoint_url': os.getenv('S3_ENDPOINT_URL') or None,
+            'region_name': os.getenv('S3_REGION', 'us-east-1'),
+            'access_key': os.getenv('S3_ACCESS_KEY_ID'),
+            'secret_key': os.getenv('S3_SECRET_ACCESS_KEY'),
+            'addressing_style': os.getenv('S3_ADDRESSING_STYLE', 'path'),
+            'default_acl': None,
+            'file_overwrite': False,
+            'querystring_auth': True,
+            'querystring_expire': SIGNED_URL_TTL_SECONDS,
+            'transfer_config': TransferConfig(
+                multipart_threshold=int(os.getenv('S3_MULTIPART_THRESHOLD', str(16 * 1024 * 1024))),
+                multipart_chunksize=int(os.getenv('S3_MULTIPART_CHUNKSIZE', str(16 * 1024 * 1024))),
+                max_concurrency=int(os.getenv('S3_MAX_CONCURRENCY', '8')),
+                use_threads=True,
+            ),
+        },
+    }
+else:
+    DEFAULT_STORAGE = {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    }
+
+STORAGES = {
+    'default': DEFAULT_STORAGE,
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 CORS_ALLOW_ALL_ORIGINS = os.getenv('CORS_ALLOW_ALL_ORIGINS', 'true').lower() == 'true'
 CORS_ALLOWED_ORIGINS = [origin for origin in os.getenv('CORS_ALLOWED_ORIGINS', '').split(',') if origin]
 
@@ -156,22 +242,128 @@ GRAPHENE = {
     ],
 }
 
+# Request profiling (core.profiling). Off by default; when enabled, a
+# PROFILING_SAMPLE_RATE fraction of requests, plus requests with a valid
+# X-Profile-Token header, are written as speedscope files to PROFILING_DIR.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', '5'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '200'))
+PROFILING_MAX_BYTES = int(os.getenv('PROFILING_MAX_BYTES', str(500 * 1024 * 1024)))
+PROFILING_SECRET = os.getenv('PROFILING_SECRET', os.getenv('SECRET_KEY', 'change-me'))
+if PROFILING_ENABLED:
+    GRAPHENE['MIDDLEWARE'].append('core.profiling.ResolverProfilingMiddleware')
+
+# GraphQL persisted queries: parsed documents are kept in a per-process LRU.
+# In allowlist mode only operations listed in the manifest are executed.
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.getenv('GRAPHQL_DOCUMENT_CACHE_SIZE', '500'))
+GRAPHQL_PERSISTED_QUERIES_ALLOWLIST = os.getenv('GRAPHQL_PERSISTED_QUERIES_ALLOWLIST', 'false').lower() == 'true'
+GRAPHQL_PERSISTED_QUERIES_MANIFEST = os.getenv('GRAPHQL_PERSISTED_QUERIES_MANIFEST', str(BASE_DIR / 'persisted_queries.json'))
+# Registered (hash -> query) texts expire from the shared cache after this long
+# (clients then re-register), and longer query texts are not stored at all
+GRAPHQL_PERSISTED_QUERY_TTL_SECONDS = int(os.getenv('GRAPHQL_PERSISTED_QUERY_TTL_SECONDS', '86400'))
+GRAPHQL_PERSISTED_QUERY_MAX_BYTES = int(os.getenv('GRAPHQL_PERSISTED_QUERY_MAX_BYTES', '16384'))
+
+# Whole-response cache for GraphQL queries. Per-type hints are declared with
+# core.response_cache.cache_hint; this is the upper bound for any operation.
+GRAPHQL_RESPONSE_CACHE_ENABLED = os.getenv('GRAPHQL_RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+GRAPHQL_RESPONSE_CACHE_MAX_AGE = int(os.getenv('GRAPHQL_RESPONSE_CACHE_MAX_AGE', '300'))
+
+# Query cost analysis (core.query_cost). Limits of 0 disable the check.
+GRAPHQL_MAX_QUERY_COST = int(os.getenv('GRAPHQL_MAX_QUERY_COST', '1000'))
+GRAPHQL_MAX_QUERY_DEPTH = int(os.getenv('GRAPHQL_MAX_QUERY_DEPTH', '6'))
+GRAPHQL_MAX_ALIASES = int(os.getenv('GRAPHQL_MAX_ALIASES', '10'))
+GRAPHQL_MAX_ROOT_FIELDS = int(os.getenv('GRAPHQL_MAX_ROOT_FIELDS', '10'))
+GRAPHQL_DEFAULT_LIST_MULTIPLIER = int(os.getenv('GRAPHQL_DEFAULT_LIST_MULTIPLIER', '20'))
+GRAPHQL_FIELD_COSTS = {}
+GRAPHQL_COST_BUDGET = int(os.getenv('GRAPHQL_COST_BUDGET', '20000'))
+GRAPHQL_COST_BUDGET_WINDOW_SECONDS = int(os.getenv('GRAPHQL_COST_BUDGET_WINDOW_SECONDS', '60'))
+# Share of an operation's cost charged when the response cache answers it
+GRAPHQL_CACHED_COST_FACTOR = float(os.getenv('GRAPHQL_CACHED_COST_FACTOR', '0.1'))
+
 AUTHENTICATION_BACKENDS = [
-    'graphql_jwt.backends.JSONWebTokenBackend',
+    'accounts.identity_cache.CachedJSONWebTokenBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Verified JWT identities (accounts.identity_cache): entries never outlive the
+# token's exp; other workers re-check invalidations every LOCAL_TTL seconds.
+JWT_IDENTITY_CACHE_TTL_SECONDS = int(os.getenv('JWT_IDENTITY_CACHE_TTL_SECONDS', '300'))
+JWT_IDENTITY_CACHE_SIZE = int(os.getenv('JWT_IDENTITY_CACHE_SIZE', '10000'))
+JWT_IDENTITY_LOCAL_TTL_SECONDS = int(os.getenv('JWT_IDENTITY_LOCAL_TTL_SECONDS', '5'))
+
 # Jellyfin integration
 JELLYFIN_URL = os.getenv('JELLYFIN_URL', 'http://127.0.0.1:8096')
 JELLYFIN_API_KEY = os.getenv('JELLYFIN_API_KEY', '')
 JELLYFIN_USER_ID = os.getenv('JELLYFIN_USER_ID', '')
+# Jellyfin instances sharing the library (videos.backends): items are routed by
+# consistent hashing, health-checked, and fail over along the ring.
+JELLYFIN_URLS = [url.strip() for url in os.getenv('JELLYFIN_URLS', JELLYFIN_URL).split(',') if url.strip()]
+JELLYFIN_RING_REPLICAS = int(os.getenv('JELLYFIN_RING_REPLICAS', '100'))
+JELLYFIN_HEALTH_INTERVAL_SECONDS = float(os.getenv('JELLYFIN_HEALTH_INTERVAL_SECONDS', '10'))
+JELLYFIN_HEALTH_TIMEOUT_SECONDS = float(os.getenv('JELLYFIN_HEALTH_TIMEOUT_SECONDS', '2'))
+JELLYFIN_FAIL_THRESHOLD = int(os.getenv('JELLYFIN_FAIL_THRESHOLD', '2'))
+# Connection pool of the async client shared by GraphQL resolvers on one event loop
+JELLYFIN_ASYNC_MAX_CONNECTIONS = int(os.getenv('JELLYFIN_ASYNC_MAX_CONNECTIONS', '100'))
 # Local path where Jellyfin scans for media files
+# (created on demand by the upload paths, not at import time)
 JELLYFIN_LIBRARY_PATH = os.getenv('JELLYFIN_LIBRARY_PATH', str((BASE_DIR / 'media' / 'jellyfin_library').resolve()))
-os.makedirs(JELLYFIN_LIBRARY_PATH, exist_ok=True)
 
-# Signed URL settings
-SIGNED_URL_SECRET = os.getenv('SIGNED_URL_SECRET', os.getenv('SECRET_KEY', 'change-me'))
-SIGNED_URL_TTL_SECONDS = int(os.getenv('SIGNED_URL_TTL_SECONDS', '900'))
+# Admission control (core.admission): per-identity token buckets and caps on
+# concurrent playback sessions and uploads; 0 disables a limit. Shared across
+# workers through the cache (set REDIS_URL).
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_STREAM_STARTS_PER_MINUTE = float(os.getenv('ADMISSION_STREAM_STARTS_PER_MINUTE', '20'))
+ADMISSION_STREAM_START_BURST = int(os.getenv('ADMISSION_STREAM_START_BURST', '10'))
+ADMISSION_STREAMS_PER_USER = int(os.getenv('ADMISSION_STREAMS_PER_USER', '3'))
+ADMISSION_MAX_TRANSCODES = int(os.getenv('ADMISSION_MAX_TRANSCODES', '50'))
+ADMISSION_STREAM_IDLE_SECONDS = int(os.getenv('ADMISSION_STREAM_IDLE_SECONDS', '90'))
+ADMISSION_UPLOADS_PER_HOUR = float(os.getenv('ADMISSION_UPLOADS_PER_HOUR', '60'))
+ADMISSION_UPLOAD_BURST = int(os.getenv('ADMISSION_UPLOAD_BURST', '5'))
+ADMISSION_UPLOADS_PER_USER = int(os.getenv('ADMISSION_UPLOADS_PER_USER', '2'))
+ADMISSION_MAX_UPLOADS = int(os.getenv('ADMISSION_MAX_UPLOADS', '4'))
+ADMISSION_UPLOAD_QUEUE_MAX = int(os.getenv('ADMISSION_UPLOAD_QUEUE_MAX', '8'))
+ADMISSION_UPLOAD_QUEUE_SECONDS = float(os.getenv('ADMISSION_UPLOAD_QUEUE_SECONDS', '10'))
+# Per-IP buckets hold this many users' worth of stream starts and uploads
+# (households and offices share an address); 0 disables them
+ADMISSION_USERS_PER_IP = int(os.getenv('ADMISSION_USERS_PER_IP', '4'))
+
+# GraphQL subscriptions over WebSocket (core.subscriptions, core.events).
+# The local broker reaches only its own process; with several workers or
+# nodes use redis (the default when REDIS_URL is set).
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', 'redis' if REDIS_URL else 'local')
+EVENTS_REDIS_CHANNEL = os.getenv('EVENTS_REDIS_CHANNEL', 'maxstudio:events')
+EVENTS_SUBSCRIBER_QUEUE_SIZE = int(os.getenv('EVENTS_SUBSCRIBER_QUEUE_SIZE', '100'))
+EVENTS_INIT_TIMEOUT_SECONDS = float(os.getenv('EVENTS_INIT_TIMEOUT_SECONDS', '10'))
+EVENTS_MAX_SUBSCRIPTIONS_PER_CONNECTION = int(os.getenv('EVENTS_MAX_SUBSCRIPTIONS_PER_CONNECTION', '10'))
+EVENTS_PROGRESS_INTERVAL_SECONDS = float(os.getenv('EVENTS_PROGRESS_INTERVAL_SECONDS', '1'))
+
+# Segment read-ahead in the /stream/ proxy (videos.readahead). The next
+# STREAM_READAHEAD_SEGMENTS segments are prefetched from Jellyfin; 0 disables.
+STREAM_READAHEAD_SEGMENTS = int(os.getenv('STREAM_READAHEAD_SEGMENTS', '3'))
+STREAM_READAHEAD_WORKERS = int(os.getenv('STREAM_READAHEAD_WORKERS', '4'))
+STREAM_READAHEAD_MAX_PENDING = int(os.getenv('STREAM_READAHEAD_MAX_PENDING', '32'))
+STREAM_READAHEAD_SATURATED_MS = int(os.getenv('STREAM_READAHEAD_SATURATED_MS', '5000'))
+STREAM_READAHEAD_BACKOFF_SECONDS = int(os.getenv('STREAM_READAHEAD_BACKOFF_SECONDS', '10'))
+STREAM_READAHEAD_CACHE_DIR = os.getenv('STREAM_READAHEAD_CACHE_DIR', str(BASE_DIR / 'media' / 'readahead_cache'))
+STREAM_READAHEAD_CACHE_MAX_BYTES = int(os.getenv('STREAM_READAHEAD_CACHE_MAX_BYTES', str(5 * 1024 ** 3)))
+
+# Per-client HLS master playlists (videos.abr): variants are listed lowest
+# bandwidth first and pruned to the client's cap in kbps (0 = no cap).
+HLS_ABR_FILTERING = os.getenv('HLS_ABR_FILTERING', 'true').lower() == 'true'
+HLS_ABR_SAVE_DATA_KBPS = int(os.getenv('HLS_ABR_SAVE_DATA_KBPS', '1500'))
+HLS_ABR_DEVICE_KBPS = {
+    'cellular': 1500,
+    'mobile': 4000,
+    'tablet': 0,
+    'desktop': 0,
+    'tv': 0,
+}
+# Share of the measured throughput a variant may use
+HLS_ABR_HEADROOM = float(os.getenv('HLS_ABR_HEADROOM', '0.8'))
+HLS_ABR_REPORT_TTL_SECONDS = int(os.getenv('HLS_ABR_REPORT_TTL_SECONDS', '1800'))
+HLS_ABR_CACHE_SIZE = int(os.getenv('HLS_ABR_CACHE_SIZE', '2000'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -0,0 +1,18 @@
+"""
+ASGI config for the stream-only entry point.
+
+Serves only ``/stream/`` with a minimal middleware chain (see
+``core.stream_settings``) so it can be deployed and scaled separately from the
+GraphQL API.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+from core.env import load_env
+
+load_env()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.stream_settings')
+
+application = get_asgi_application()
@@ -0,0 +1,25 @@
+"""
+Settings for the stream-only entry point (core.stream_wsgi / core.stream_asgi).
+
+Serves nothing but ``/stream/``: signed URLs are the authorization, so the
+session, CSRF, auth, messages, clickjacking and WhiteNoise layers of the full
+application are left out. Only CORS is kept so browser players can fetch
+playlists and segments cross-origin, plus the request profiler, which removes
+itself unless ``PROFILING_ENABLED`` is set.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'corsheaders',
+]
+
+MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+]
+
+ROOT_URLCONF = 'core.stream_urls'
+
+WSGI_APPLICATION = 'core.stream_wsgi.application'
+
+TEMPLATES = []
@@ -0,0 +1,9 @@
+"""
+URL configuration for the stream-only entry point.
+"""
+from django.urls import re_path
+from videos.stream import ProxyHLSView
+
+urlpatterns = [
+    re_path(r'^stream/(?P<item_id>[^/]+)/(?P<filename>.*)$', ProxyHLSView.as_view(), name='proxy_hls'),
+]
@@ -0,0 +1,325 @@
+"""
+GraphQL subscriptions over WebSocket, ``graphql-transport-ws`` protocol
+(the one spoken by the ``graphql-ws`` client library and Apollo's
+``GraphQLWsLink``), served by ``core.asgi`` at ``/graphql/``.
+
+A client opens the socket and sends ``connection_init``. It may authenticate
+with ``{"authorization": "JWT <token>"}`` in the payload, because browsers
+cannot set headers on a WebSocket. Each ``subscribe`` message then runs one
+subscription operation until the client sends ``complete``, or the socket
+closes.
+
+Documents are resolved like ``PersistedGraphQLView`` resolves them:
+persisted-query hashes, the parsed-document LRU, and the cost and depth
+limits. Subscription resolvers yield ``core.events.Event`` objects. Each
+event is executed once per distinct (document, variables, operation, viewer)
+on this worker, and the result is sent to every subscriber of that
+operation. The viewer is the authenticated user, or one shared anonymous
+scope, because the execution runs with the first subscriber's context and
+resolvers may read ``info.context.user``. A thousand anonymous players
+watching ``videoAdded`` thus cost one database read per event, not a
+thousand. Executions and token checks run on worker threads
+(``thread_sensitive=False``) rather than Django's single thread-sensitive
+executor, so operations on one worker do not queue behind each other, and
+resolvers may use the ORM.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    create_source_event_stream,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+)
+from graphql.validation import specified_rules
+
+from .persisted_queries import (
+    PersistedQueryError,
+    document_cache,
+    get_persisted_hash,
+    register_query,
+    resolve_query,
+)
+from .query_cost import QueryCostRule
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL = 'graphql-transport-ws'
+
+# Close codes defined by the protocol
+BAD_REQUEST = 4400
+UNAUTHORIZED = 4401
+FORBIDDEN = 4403
+INIT_TIMEOUT = 4408
+DUPLICATE_ID = 4409
+TOO_MANY_INIT = 4429
+
+
+class SubscriptionContext:
+    """``info.context`` for subscription resolvers; stands in for the request."""
+
+    def __init__(self, scope, user):
+        self.scope = scope
+        self.user = user
+        self.META = {'REMOTE_ADDR': (scope.get('client') or ('', 0))[0]}
+
+
+class _Rejected(Exception):
+    def __init__(self, errors):
+        super().__init__('rejected')
+        self.errors = errors
+
+
+def _schema():
+    from graphene_django.settings import graphene_settings
+
+    return graphene_settings.SCHEMA.graphql_schema
+
+
+def _document(payload: Dict[str, Any]):
+    query = payload.get('query')
+    sha256 = get_persisted_hash(payload)
+    if sha256 and not query:
+        document = document_cache.get(sha256)
+        if document is not None:
+            return document, sha256
+    registering = bool(query and sha256)
+    query, sha256 = resolve_query(query, sha256)
+    if sha256:
+        document = document_cache.get(sha256)
+        if document is not None:
+            if registering:
+                register_query(sha256, query)
+            return document, sha256
+    if not query:
+        raise _Rejected([GraphQLError('Must provide query string.')])
+    document = parse(query)
+    errors = validate(_schema(), document, (*specified_rules, QueryCostRule))
+    if errors:
+        raise _Rejected(errors)
+    if sha256:
+        document_cache.set(sha256, document)
+        if registering:
+            register_query(sha256, query)
+    return document, sha256
+
+
+def _authenticate(authorization: str):
+    if not authorization:
+        return AnonymousUser()
+    prefix, _, token = authorization.partition(' ')
+    if prefix != 'JWT' or not token:
+        return None
+    from accounts.identity_cache import get_user_by_token
+
+    close_old_connections()
+    try:
+        return get_user_by_token(token) or None
+    except Exception:
+        return None
+    finally:
+        close_old_connections()
+
+
+def _execute(document, event, context, variables, operation_name) -> str:
+    close_old_connections()
+    try:
+        result = execute(
+            _schema(), document, root_value=event, context_value=context,
+            variable_values=variables, operation_name=operation_name,
+        )
+        return json.dumps(result.formatted)
+    finally:
+        close_old_connections()
+
+
+class Connection:
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.context: Optional[SubscriptionContext] = None
+        self.operations: Dict[str, asyncio.Task] = {}
+
+    async def send_json(self, message: Dict[str, Any]) -> None:
+        await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def close(self, code: int, reason: str = '') -> None:
+        await self.send({'type': 'websocket.close', 'code': code, 'reason': reason})
+
+    async def run(self) -> None:
+        message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+        protocols = self.scope.get('subprotocols') or []
+        if PROTOCOL not in protocols:
+            await self.send({'type': 'websocket.close', 'code': BAD_REQUEST})
+            return
+        await self.send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+        try:
+            await self._serve()
+        finally:
+            for task in self.operations.values():
+                task.cancel()
+            if self.operations:
+                await asyncio.gather(*self.operations.values(), return_exceptions=True)
+
+    async def _serve(self) -> None:
+        try:
+            init = await asyncio.wait_for(self._next_message(), settings.EVENTS_INIT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            await self.close(INIT_TIMEOUT, 'Connection initialisation timeout')
+            return
+        if init is None:
+            return
+        if init.get('type') != 'connection_init':
+            await self.close(UNAUTHORIZED, 'Unauthorized')
+            return
+        payload = init.get('payload') or {}
+        user = await sync_to_async(_authenticate, thread_sensitive=False)(
+            payload.get('authorization') or payload.get('Authorization') or ''
+        )
+        if user is None:
+            await self.close(FORBIDDEN, 'Forbidden')
+            return
+        self.context = SubscriptionContext(self.scope, user)
+        await self.send_json({'type': 'connection_ack'})
+
+        while True:
+            message = await self._next_message()
+            if message is None:
+                return
+            kind = message.get('type')
+            if kind == 'ping':
+                await self.send_json({'type': 'pong'})
+            elif kind == 'pong':
+                pass
+            elif kind == 'connection_init':
+                await self.close(TOO_MANY_INIT, 'Too many initialisation requests')
+                return
+            elif kind == 'subscribe':
+                if not await self._subscribe(message):
+                    return
+            elif kind == 'complete':
+                task = self.operations.pop(message.get('id'), None)
+                if task is not None:
+                    task.cancel()
+            else:
+                await self.close(BAD_REQUEST, f"Invalid message type {kind!r}")
+                return
+
+    async def _next_message(self) -> Optional[Dict[str, Any]]:
+        """The next protocol message, or ``None`` once the socket is gone."""
+        message = await self.receive()
+        if message['type'] == 'websocket.disconnect':
+            return None
+        text = message.get('text')
+        if text is None and message.get('bytes') is not None:
+            text = message['bytes'].decode('utf-8', 'replace')
+        try:
+            parsed = json.loads(text or '')
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict):
+            return parsed
+        await self.close(BAD_REQUEST, 'Invalid message')
+        return None
+
+    async def _subscribe(self, message: Dict[str, Any]) -> bool:
+        operation_id = message.get('id')
+        payload = message.get('payload')
+        if not isinstance(operation_id, str) or not isinstance(payload, dict):
+            await self.close(BAD_REQUEST, 'Invalid subscribe message')
+            return False
+        if operation_id in self.operations:
+            await self.close(DUPLICATE_ID, f"Subscriber for {operation_id} already exists")
+            return False
+        if len(self.operations) >= settings.EVENTS_MAX_SUBSCRIPTIONS_PER_CONNECTION:
+            await self.send_json({'id': operation_id, 'type': 'error', 'payload': [
+                {'message': 'Too many subscriptions on this connection.', 'extensions': {'code': 'RATE_LIMITED'}}
+            ]})
+            return True
+        task = asyncio.ensure_future(self._operation(operation_id, payload))
+        self.operations[operation_id] = task
+        task.add_done_callback(lambda _: self._forget(operation_id, task))
+        return True
+
+    def _forget(self, operation_id: str, task: asyncio.Task) -> None:
+        if self.operations.get(operation_id) is task:
+            del self.operations[operation_id]
+
+    async def _operation(self, operation_id: str, payload: Dict[str, Any]) -> None:
+        try:
+            document, sha256 = _document(payload)
+        except _Rejected as e:
+            await self._send_errors(operation_id, e.errors)
+            return
+        except PersistedQueryError as e:
+            await self._send_errors(operation_id, [GraphQLError(str(e), extensions={'code': e.code})])
+            return
+        except GraphQLError as e:
+            await self._send_errors(operation_id, [e])
+            return
+
+        operation_name = payload.get('operationName')
+        variables = payload.get('variables') or {}
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.SUBSCRIPTION:
+            await self._send_errors(operation_id, [GraphQLError(
+                'Only subscriptions are served over WebSocket; send queries and mutations to POST /graphql/.'
+            )])
+            return
+
+        stream = await create_source_event_stream(
+            _schema(), document, context_value=self.context,
+            variable_values=variables, operation_name=operation_name,
+        )
+        if isinstance(stream, ExecutionResult):
+            await self._send_errors(operation_id, stream.errors)
+            return
+
+        # Results may depend on the user, so they are only shared within one auth scope
+        user = self.context.user
+        viewer = user.pk if user.is_authenticated else None
+        key = (sha256, json.dumps(variables, sort_keys=True), operation_name, viewer)
+        next_prefix = '{"id": %s, "type": "next", "payload": ' % json.dumps(operation_id)
+        execute_event = sync_to_async(_execute, thread_sensitive=False)
+        try:
+            async for event in stream:
+                payload_json = await event.shared(
+                    key, lambda: execute_event(document, event, self.context, variables, operation_name)
+                )
+                # The payload is serialised once per event, not per subscriber
+                await self.send({'type': 'websocket.send', 'text': next_prefix + payload_json + '}'})
+        except Exception:
+            logger.exception('subscription %s failed', operation_name or sha256)
+            await self._send_errors(operation_id, [GraphQLError('Subscription failed.')])
+            return
+        finally:
+            aclose = getattr(stream, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+        await self.send_json({'id': operation_id, 'type': 'complete'})
+
+    async def _send_errors(self, operation_id: str, errors) -> None:
+        await self.send_json({'id': operation_id, 'type': 'error', 'payload': [e.formatted for e in errors]})
+
+
+async def application(scope, receive, send) -> None:
+    """ASGI application for ``websocket`` connections."""
+    if scope['path'].rstrip('/') != '/graphql':
+        await receive()
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await Connection(scope, receive, send).run()
@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from videos.models import Video
+
+QUERY = 'query Videos { videos { id title } }'
+
+
+@override_settings(
+    GRAPHQL_RESPONSE_CACHE_ENABLED=True, GRAPHQL_COST_BUDGET=25, GRAPHQL_CACHED_COST_FACTOR=0.5,
+    ADMISSION_ENABLED=False,
+)
+class CostBudgetTests(TestCase):
+    # videos: weight 10 plus 20 x (id, title) = 10
+    COST = 10
+
+    def setUp(self):
+        cache.clear()
+        Video.objects.create(title='Movie')
+
+    def query(self):
+        return self.client.get('/graphql/', {'query': QUERY}, REMOTE_ADDR='203.0.113.7')
+
+    def test_cache_hits_are_charged(self):
+        first = self.query()
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('response_cache', first['Server-Timing'])
+
+        # 10 executed, then 5 per hit: the third hit brings the spend to 25
+        for _ in range(3):
+            hit = self.query()
+            self.assertEqual(hit.status_code, 200)
+            self.assertIn('response_cache', hit['Server-Timing'])
+
+        refused = self.query()
+        self.assertEqual(refused.status_code, 429)
+        self.assertIn('Retry-After', refused)
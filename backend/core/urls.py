@@ -15,16 +15,32 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.auth.decorators import login_required
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import re_path
-from videos.views import ProxyHLSView
+from videos.playback import StoragePlaylistView
+from videos.stream import ProxyHLSView
+
+_graphql_view = None
+
+
+@csrf_exempt
+def graphql_view(request, *args, **kwargs):
+    # The GraphQL/graphene stack is imported on the first /graphql/ request so
+    # workers that only serve /stream/ never load it.
+    global _graphql_view
+    if _graphql_view is None:
+        from .views import PersistedGraphQLView
+        _graphql_view = PersistedGraphQLView.as_view(graphiql=True)
+    return _graphql_view(request, *args, **kwargs)
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
-    re_path(r'^stream/(?P<item_id>[^/]+)/(?P<filename>.*)$', ProxyHLSView.as_view(), name='proxy_hls'),
+    path('graphql/', graphql_view),
+    re_path(r'^hls/(?P<video_id>\d+)/(?P<filename>.+)$', StoragePlaylistView.as_view(), name='storage_hls'),
+    re_path(r'^stream/(?P<item_id>[^/]+)/(?P<filename>.*)$', login_required(ProxyHLSView.as_view()), name='proxy_hls'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
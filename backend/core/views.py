@@ -0,0 +1,260 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from django.utils.cache import patch_vary_headers
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, parse, validate
+from graphql.validation import specified_rules
+from graphql_jwt.utils import get_http_authorization
+
+from . import response_cache
+from .async_execution import complete
+from .client_ip import client_ip
+from .query_cost import QueryCostRule, charge_budget, cost_for
+from .persisted_queries import (
+    PersistedQueryError,
+    document_cache,
+    get_persisted_hash,
+    register_query,
+    resolve_query,
+)
+
+
+class PersistedGraphQLView(GraphQLView):
+    """
+    GraphQLView with automatic persisted queries, a parsed-document LRU and a
+    whole-response cache for query operations.
+
+    Documents are cached only after they pass validation, so a cache hit skips
+    both ``parse`` and ``validate``. Per-request parse/validate time is
+    reported in a ``Server-Timing`` header. Cacheable responses to GET requests
+    carry ``Cache-Control`` and ``ETag`` so nginx can cache them as well.
+    Operations over the static cost/depth/alias limits fail validation, and
+    executed operations are charged against a per-identity cost budget.
+    Response-cache hits are charged too, at ``GRAPHQL_CACHED_COST_FACTOR``
+    of the operation's cost.
+    Operations with ``async def`` resolvers finish in ``core.async_execution``.
+    """
+    validation_rules = (*specified_rules, QueryCostRule)
+
+    def dispatch(self, request, *args, **kwargs):
+        request.graphql_timings = {}
+        response = super().dispatch(request, *args, **kwargs)
+        timings = request.graphql_timings
+        if timings:
+            response['Server-Timing'] = ', '.join(
+                f"{name};dur={value * 1000:.3f}" for name, value in timings.items()
+            )
+        retry_after = getattr(request, 'retry_after', None)
+        if retry_after is not None:
+            # A mutation was refused by core.admission
+            response.status_code = 429
+            response['Retry-After'] = str(retry_after)
+        if request.method == 'GET' and response.status_code == 200:
+            response = self.apply_http_caching(request, response)
+        return response
+
+    def apply_http_caching(self, request, response):
+        entry = getattr(request, 'graphql_cache', None)
+        if entry is None:
+            response['Cache-Control'] = 'no-store'
+            return response
+        remaining = max(int(entry['expires_at'] - time.time()), 0)
+        visibility = 'private' if request.graphql_cache_policy.scope == response_cache.PRIVATE else 'public'
+        if request.headers.get('If-None-Match') == entry['etag']:
+            response = HttpResponseNotModified()
+        response['Cache-Control'] = f"{visibility}, max-age={remaining}"
+        response['ETag'] = entry['etag']
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def get_identity(self, request) -> str:
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        token = get_http_authorization(request)
+        if token:
+            return 'token:' + hashlib.sha256(token.encode('utf-8')).hexdigest()
+        return 'ip:' + client_ip(request)
+
+    def get_cache_scope(self, request, policy) -> str:
+        if policy.scope == response_cache.PUBLIC:
+            return 'public'
+        identity = self.get_identity(request)
+        return 'anon' if identity.startswith('ip:') else identity
+
+    def charge(self, request, cost: int) -> None:
+        """Charge ``cost`` to the request's budget, or answer ``429``."""
+        retry_after = charge_budget(self.get_identity(request), cost)
+        if retry_after is not None:
+            response = HttpResponse(status=429)
+            response['Retry-After'] = str(retry_after)
+            raise HttpError(response, "Query cost budget exceeded, retry later.")
+
+    def get_response(self, request, data, show_graphiql=False):
+        if show_graphiql:
+            return super().get_response(request, data, show_graphiql)
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        try:
+            document, sha256 = self.get_document(request, data, query)
+        except Exception:
+            return super().get_response(request, data, show_graphiql)
+        policy = response_cache.policy_for(self.schema.graphql_schema, document, operation_name, sha256)
+        if not (sha256 and policy.cacheable):
+            return super().get_response(request, data, show_graphiql)
+
+        request.graphql_cache_policy = policy
+        key = response_cache.make_key(sha256, operation_name, variables, self.get_cache_scope(request, policy))
+        entry = response_cache.lookup(key)
+        if entry is not None:
+            cost = cost_for(self.schema.graphql_schema, document, operation_name, sha256)
+            self.charge(request, math.ceil(cost * settings.GRAPHQL_CACHED_COST_FACTOR))
+            request.graphql_cache = entry
+            request.graphql_timings['response_cache'] = 0.0
+            return entry['body'], 200
+
+        versions = response_cache.tag_versions(policy.tags)
+        result, status_code = super().get_response(request, data, show_graphiql)
+        execution_result = getattr(request, 'graphql_result', None)
+        if status_code == 200 and result is not None and execution_result is not None and not execution_result.errors:
+            request.graphql_cache = response_cache.store(key, result, policy, versions)
+        return result, status_code
+
+    def get_document(self, request, data, query):
+        """
+        Return ``(document, query_hash)`` or raise ``GraphQLError``/``PersistedQueryError``.
+        """
+        resolved = getattr(request, '_graphql_document', None)
+        if resolved is not None and resolved[0] == query:
+            return resolved[1], resolved[2]
+        document, sha256 = self._get_document(request, data, query)
+        request._graphql_document = (query, document, sha256)
+        return document, sha256
+
+    def _get_document(self, request, data, query):
+        timings = getattr(request, 'graphql_timings', {})
+        sha256 = get_persisted_hash(data, request.GET)
+        if sha256 and not query:
+            document = document_cache.get(sha256)
+            if document is not None:
+                timings['doc_cache'] = 0.0
+                return document, sha256
+
+        provided = query
+        registering = bool(provided and sha256)
+        query, sha256 = resolve_query(query, sha256)
+        if provided and sha256:
+            document = document_cache.get(sha256)
+            if document is not None:
+                timings['doc_cache'] = 0.0
+                if registering:
+                    register_query(sha256, query)
+                return document, sha256
+
+        started = time.perf_counter()
+        document = parse(query)
+        timings['parse'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        validation_errors = validate(
+            self.schema.graphql_schema,
+            document,
+            self.validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        timings['validate'] = time.perf_counter() - started
+        if validation_errors:
+            raise _ValidationFailed(validation_errors)
+
+        if sha256:
+            document_cache.set(sha256, document)
+            if registering:
+                register_query(sha256, query)
+        return document, sha256
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        result = self._execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        request.graphql_result = result
+        return result
+
+    def _execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        if not query and not get_persisted_hash(data, request.GET):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        try:
+            document, sha256 = self.get_document(request, data, query)
+        except _ValidationFailed as e:
+            return ExecutionResult(data=None, errors=e.errors)
+        except PersistedQueryError as e:
+            return ExecutionResult(errors=[GraphQLError(str(e), extensions={'code': e.code})])
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if operation_ast is not None and operation_ast.operation == OperationType.SUBSCRIPTION:
+            return ExecutionResult(errors=[GraphQLError('Subscriptions are served over WebSocket at /graphql/.')])
+
+        self.charge(request, cost_for(self.schema.graphql_schema, document, operation_name, sha256))
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = complete(execute(self.schema.graphql_schema, document, **execute_options), request)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return complete(execute(self.schema.graphql_schema, document, **execute_options), request)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class _ValidationFailed(Exception):
+    def __init__(self, errors):
+        super().__init__('validation failed')
+        self.errors = errors
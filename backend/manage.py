@@ -2,20 +2,14 @@
 """Django's command-line utility for administrative tasks."""
 import os
 import sys
-from pathlib import Path
 
 
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
     # Load .env if present
-    env_path = Path(__file__).resolve().parent.parent / '.env'
-    if env_path.exists():
-        try:
-            from dotenv import load_dotenv
-            load_dotenv(env_path)
-        except Exception:
-            pass
+    from core.env import load_env
+    load_env()
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
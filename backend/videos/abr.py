@@ -0,0 +1,129 @@
+"""
+Per-client filtering of HLS master playlists.
+
+Every master playlist is served with its variants ordered lowest bandwidth
+first, so players that start on the first listed variant start fast, and
+with the variants above the client's bandwidth cap removed (the lowest is
+always kept). The cap, in kbps, is the smallest of:
+
+- ``HLS_ABR_SAVE_DATA_KBPS`` when the request carries ``Save-Data: on``
+- ``HLS_ABR_DEVICE_KBPS[device]`` for a device class declared with the
+  ``X-Device-Class`` header or a ``device`` query parameter
+- ``HLS_ABR_HEADROOM`` times the throughput given in a ``bw`` query parameter
+  (kbps), or else reported by the user through the ``reportPlayback``
+  mutation
+
+Throughput caps are rounded down to one of ``CAP_STEPS``, so a master has only
+a handful of filtered forms. These are kept in a per-process LRU keyed by
+playlist and cap.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.lru import LRUCache
+
+CAP_STEPS = (400, 800, 1200, 2000, 3000, 4500, 6500, 10000)
+THROUGHPUT_KEY_PREFIX = 'abr:bw:'
+# Weight of a new report in the moving average of a user's throughput
+THROUGHPUT_SMOOTHING = 0.3
+
+_BANDWIDTH = re.compile(r'[:,]BANDWIDTH=(\d+)')
+
+_filtered = LRUCache(settings.HLS_ABR_CACHE_SIZE)
+
+
+def _step(kbps: float) -> int:
+    for step in reversed(CAP_STEPS):
+        if kbps >= step:
+            return step
+    return CAP_STEPS[0]
+
+
+def _throughput_key(user_pk) -> str:
+    return f"{THROUGHPUT_KEY_PREFIX}{user_pk}"
+
+
+def record_throughput(user_pk, kbps: int) -> int:
+    """Fold a throughput report into the user's moving average and return it."""
+    previous = cache.get(_throughput_key(user_pk))
+    average = kbps if previous is None else previous + THROUGHPUT_SMOOTHING * (kbps - previous)
+    average = int(average)
+    cache.set(_throughput_key(user_pk), average, timeout=settings.HLS_ABR_REPORT_TTL_SECONDS)
+    return average
+
+
+def reported_throughput(user_pk) -> Optional[int]:
+    return cache.get(_throughput_key(user_pk))
+
+
+def bandwidth_cap(request) -> int:
+    """The request's bandwidth cap in kbps; 0 means no cap."""
+    caps = []
+    if request.headers.get('Save-Data', '').lower() == 'on':
+        caps.append(settings.HLS_ABR_SAVE_DATA_KBPS)
+
+    device = (request.GET.get('device') or request.headers.get('X-Device-Class') or '').lower()
+    if settings.HLS_ABR_DEVICE_KBPS.get(device):
+        caps.append(settings.HLS_ABR_DEVICE_KBPS[device])
+
+    throughput = request.GET.get('bw', '')
+    if throughput.isdigit():
+        kbps = int(throughput)
+    else:
+        user = getattr(request, 'user', None)
+        kbps = reported_throughput(user.pk) if user is not None and user.is_authenticated else None
+    if kbps:
+        caps.append(_step(kbps * settings.HLS_ABR_HEADROOM))
+    return min(caps) if caps else 0
+
+
+def _variants(text: str) -> Tuple[List[str], List[Tuple[int, List[str]]], List[str]]:
+    head: List[str] = []
+    variants: List[Tuple[int, List[str]]] = []
+    tail: List[str] = []
+    pending: Optional[List[str]] = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if pending is not None:
+            pending.append(line)
+            if stripped and not stripped.startswith('#'):
+                match = _BANDWIDTH.search(pending[0])
+                variants.append((int(match.group(1)) if match else 0, pending))
+                pending = None
+        elif stripped.startswith('#EXT-X-STREAM-INF'):
+            pending = [line]
+        elif variants:
+            tail.append(line)
+        else:
+            head.append(line)
+    return head, variants, tail
+
+
+def filter_master(text: str, cap_kbps: int) -> str:
+    """``text`` with variants sorted by bandwidth and those over ``cap_kbps`` dropped."""
+    head, variants, tail = _variants(text)
+    if not variants:
+        return text
+    variants.sort(key=lambda v: v[0])
+    if cap_kbps:
+        kept = [v for v in variants if v[0] <= cap_kbps * 1000] or variants[:1]
+    else:
+        kept = variants
+    lines = head + [line for _bandwidth, entry in kept for line in entry] + [line for line in tail if line.strip()]
+    return '\n'.join(lines) + '\n'
+
+
+def filtered_master(name: str, cap_kbps: int, load) -> str:
+    """
+    Filtered form of the master playlist stored as ``name``, from the LRU or
+    built from ``load()``. Stored masters never change, so entries stay valid.
+    """
+    key = f"{name}|{cap_kbps}"
+    text = _filtered.get(key)
+    if text is None:
+        text = filter_master(load(), cap_kbps)
+        _filtered.set(key, text)
+    return text
@@ -5,6 +5,14 @@ class VideosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'videos'
 
+    def ready(self):
+        from django.db.models.signals import post_save
+
+        from .events import video_saved
+        from .models import Video
+
+        post_save.connect(video_saved, sender=Video, dispatch_uid='videos.events.saved')
+
 
 
 
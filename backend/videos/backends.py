@@ -0,0 +1,276 @@
+"""
+Pool of Jellyfin backends sharing one library.
+
+``JELLYFIN_URLS`` lists the instances (comma-separated; defaults to
+``JELLYFIN_URL``). Requests about an item are routed by consistent hashing
+on its id: each node owns ``JELLYFIN_RING_REPLICAS`` points on a hash ring,
+and an item goes to the first healthy node clockwise from its hash. The same
+item keeps landing on the same node, so that node's transcode and image
+caches stay warm. Adding or removing a node moves only about 1/N of the
+items.
+
+With more than one node, a daemon thread probes ``/System/Ping`` on each
+node every ``JELLYFIN_HEALTH_INTERVAL_SECONDS``. A node goes down after
+``JELLYFIN_FAIL_THRESHOLD`` consecutive failures, from probes or from real
+requests (connection errors, timeouts, 5xx). It comes back after its next
+successful probe. ``get`` fails over to the next node on the ring. If every
+node is down, the item's own node is tried anyway.
+
+Each node keeps per-process load metrics: requests, in-flight requests,
+failures, failovers and the moving average of time to headers. ``stats()``
+returns them, the health thread logs them every ``STATS_LOG_EVERY`` rounds,
+and ``python manage.py jellyfin_backends`` probes the nodes and shows how
+items spread over the ring.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+
+from core.profiling import record_upstream
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PATH = '/System/Ping'
+CONNECT_TIMEOUT_SECONDS = 3
+# Weight of a new sample in the moving average of time to headers
+LATENCY_SMOOTHING = 0.2
+STATS_LOG_EVERY = 6
+
+_sessions = threading.local()
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _session():
+    session = getattr(_sessions, 'session', None)
+    if session is None:
+        import requests
+
+        session = _sessions.session = requests.Session()
+        session.hooks['response'].append(record_upstream)
+    return session
+
+
+class Node:
+    """One Jellyfin instance and its health and load counters."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.failovers = 0
+        self.latency_ms = 0.0
+        self._lock = threading.Lock()
+
+    def begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def end(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def succeeded(self, seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            if seconds is not None:
+                sample = seconds * 1000
+                self.latency_ms = sample if not self.latency_ms else self.latency_ms + LATENCY_SMOOTHING * (sample - self.latency_ms)
+            came_back = not self.healthy
+            self.healthy = True
+        if came_back:
+            logger.warning('Jellyfin backend %s is back up', self.url)
+
+    def failed(self, failover: bool = False) -> None:
+        with self._lock:
+            self.failures += 1
+            self.failovers += failover
+            self.consecutive_failures += 1
+            went_down = self.healthy and self.consecutive_failures >= settings.JELLYFIN_FAIL_THRESHOLD
+            if went_down:
+                self.healthy = False
+        if went_down:
+            logger.warning('Jellyfin backend %s is down', self.url)
+
+    def stats(self) -> Dict:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+            'failovers': self.failovers,
+            'latency_ms': round(self.latency_ms, 1),
+        }
+
+
+class Pool:
+    """Consistent-hash ring over the configured nodes."""
+
+    def __init__(self, urls: List[str], replicas: int):
+        if not urls:
+            raise ValueError('At least one Jellyfin URL is required')
+        self.nodes = [Node(url) for url in urls]
+        points = sorted(
+            (_hash(f"{node.url}#{i}"), index)
+            for index, node in enumerate(self.nodes)
+            for i in range(replicas)
+        )
+        self._hashes = [h for h, _index in points]
+        self._owners = [index for _h, index in points]
+        self._checker: Optional[threading.Thread] = None
+
+    def ring(self, key: str) -> List[Node]:
+        """Every node in ring order starting from the owner of ``key``."""
+        if len(self.nodes) == 1:
+            return self.nodes
+        order: List[Node] = []
+        start = bisect.bisect(self._hashes, _hash(key))
+        for i in range(len(self._owners)):
+            node = self.nodes[self._owners[(start + i) % len(self._owners)]]
+            if node not in order:
+                order.append(node)
+                if len(order) == len(self.nodes):
+                    break
+        return order
+
+    def candidates(self, key: str) -> List[Node]:
+        """Healthy nodes for ``key`` in ring order, or its owner if none is healthy."""
+        order = self.ring(key)
+        healthy = [node for node in order if node.healthy]
+        return healthy or order[:1]
+
+    def node_for(self, key: str) -> Node:
+        return self.candidates(key)[0]
+
+    def start_health_checks(self) -> None:
+        if len(self.nodes) > 1 and self._checker is None:
+            self._checker = threading.Thread(target=self._check_forever, name='jellyfin-health', daemon=True)
+            self._checker.start()
+
+    def check(self) -> None:
+        """Probe every node once."""
+        for node in self.nodes:
+            started = time.perf_counter()
+            try:
+                r = _session().get(
+                    node.url + HEALTH_PATH, timeout=settings.JELLYFIN_HEALTH_TIMEOUT_SECONDS
+                )
+                ok = r.status_code == 200
+            except Exception:
+                ok = False
+            if ok:
+                node.succeeded(time.perf_counter() - started)
+            else:
+                node.failed()
+
+    def _check_forever(self) -> None:
+        rounds = 0
+        while True:
+            time.sleep(settings.JELLYFIN_HEALTH_INTERVAL_SECONDS)
+            self.check()
+            rounds += 1
+            if rounds % STATS_LOG_EVERY == 0:
+                logger.info('Jellyfin backends: %s', self.stats())
+
+    def stats(self) -> List[Dict]:
+        return [node.stats() for node in self.nodes]
+
+
+_pool: Optional[Pool] = None
+_pool_lock = threading.Lock()
+
+
+def pool() -> Pool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = Pool(settings.JELLYFIN_URLS, settings.JELLYFIN_RING_REPLICAS)
+                _pool.start_health_checks()
+    return _pool
+
+
+def url_for(item_id: str) -> str:
+    """Base URL of the node serving ``item_id``, for links handed to clients."""
+    return pool().node_for(item_id).url
+
+
+def client(item_id: str = ''):
+    """``JellyfinClient`` on the node for ``item_id``; catalog calls without one share a node."""
+    from .jellyfin_client import JellyfinClient
+
+    return JellyfinClient(url_for(item_id), settings.JELLYFIN_API_KEY, settings.JELLYFIN_USER_ID)
+
+
+def refresh_library() -> None:
+    """Ask every healthy node to rescan; each instance keeps its own catalog."""
+    from .jellyfin_client import JellyfinClient
+
+    for node in pool().nodes:
+        if node.healthy:
+            JellyfinClient(node.url, settings.JELLYFIN_API_KEY, settings.JELLYFIN_USER_ID).refresh_library()
+
+
+def get(item_id: str, path: str, read_timeout: Optional[float] = None, **kwargs):
+    """
+    GET ``path`` from the node for ``item_id``, failing over along the ring on
+    connection errors, timeouts and 5xx. The response is left open when
+    ``stream=True``; pass it to ``body`` or ``release`` once done with it.
+    """
+    import requests
+
+    candidates = pool().candidates(item_id)
+    for attempt, node in enumerate(candidates):
+        last = attempt == len(candidates) - 1
+        node.begin()
+        started = time.perf_counter()
+        try:
+            r = _session().get(node.url + path, timeout=(CONNECT_TIMEOUT_SECONDS, read_timeout), **kwargs)
+        except requests.RequestException:
+            node.end()
+            node.failed(failover=not last)
+            if last:
+                raise
+            continue
+        if r.status_code >= 500:
+            node.failed(failover=not last)
+            if not last:
+                r.close()
+                node.end()
+                continue
+        else:
+            node.succeeded(time.perf_counter() - started)
+        r.backend = node
+        return r
+
+
+def release(response) -> None:
+    node = getattr(response, 'backend', None)
+    if node is not None:
+        response.backend = None
+        response.close()
+        node.end()
+
+
+def body(response, chunk_size: int = 8192) -> Iterator[bytes]:
+    """Stream the response body, releasing it once sent or abandoned."""
+    try:
+        yield from response.iter_content(chunk_size=chunk_size)
+    finally:
+        release(response)
+
+
+def stats() -> List[Dict]:
+    return pool().stats()
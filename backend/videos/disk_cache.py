@@ -0,0 +1,88 @@
+"""
+Size-bounded directories of cached media files.
+
+Serving a file refreshes its mtime (``touch``); when the files under a
+directory outgrow their budget, the least recently served are deleted first.
+``ByteCounter`` keeps the running total in the shared cache, so every worker
+and replica writing to the same volume counts against one budget. The
+directory is walked, under an exclusive ``flock`` on its ``.evict.lock``, when
+the total is unknown or stale and when eviction is due.
+"""
+import fcntl
+import os
+from typing import Callable, Iterator, Optional, Tuple
+
+from django.core.cache import cache
+
+# Fill the cache back up to this share of its budget when evicting
+EVICT_TO = 0.9
+# Re-walk the directory this often, correcting drift from files written or
+# deleted while a walk was in progress
+RESCAN_SECONDS = 300
+KEY_PREFIX = 'disk_cache:bytes:'
+
+
+def touch(path: str) -> bool:
+    """Mark ``path`` as just used; ``False`` if it does not exist."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def cached_files(directory: str, suffixes: Tuple[str, ...]) -> Iterator[Tuple[str, int, float]]:
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            if name.endswith(suffixes):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+
+def evict(directory: str, target_bytes: int, suffixes: Tuple[str, ...],
+          on_evict: Optional[Callable[[str, int], None]] = None) -> int:
+    """Delete least recently used files until the directory fits ``target_bytes``."""
+    files = sorted(cached_files(directory, suffixes), key=lambda f: f[2])
+    total = sum(size for _path, size, _mtime in files)
+    for path, size, _mtime in files:
+        if total <= target_bytes:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        else:
+            if on_evict is not None:
+                on_evict(path, size)
+        total -= size
+    return total
+
+
+class ByteCounter:
+    """Shared running size of a cache directory, evicting once it exceeds its budget."""
+
+    def __init__(self, suffixes: Tuple[str, ...], on_evict: Optional[Callable[[str, int], None]] = None):
+        self.suffixes = suffixes
+        self.on_evict = on_evict
+
+    def add(self, directory: str, max_bytes: int, added: int) -> None:
+        key = KEY_PREFIX + directory
+        try:
+            total = cache.incr(key, added)
+        except ValueError:
+            total = None
+        if total is not None and total <= max_bytes:
+            return
+        with open(os.path.join(directory, '.evict.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                total = sum(size for _path, size, _mtime in cached_files(directory, self.suffixes))
+                if total > max_bytes:
+                    total = evict(directory, int(max_bytes * EVICT_TO), self.suffixes, self.on_evict)
+                cache.set(key, total, timeout=RESCAN_SECONDS)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,68 @@
+"""
+Catalog and transcode events behind the ``videoAdded``, ``videoUpdated``
+and ``transcodeProgress`` subscriptions (published through ``core.events``).
+
+Saving a ``Video`` publishes ``videoAdded`` or ``videoUpdated`` once the
+transaction commits (``video_saved``, connected in ``VideosConfig.ready``).
+Saves of the same instance that happen before then collapse into the pending
+event, as long as that event is still queued: a rollback drops it, and the
+next save queues a new one. ``bulk_create`` does not send signals, so
+``videos_created`` covers it.
+``transcode_progress`` is published as ffmpeg runs, including inside the
+upload transaction.
+"""
+from typing import Any, Dict, Iterable
+
+from django.db import transaction
+
+from core import events
+
+VIDEO_ADDED = 'videoAdded'
+VIDEO_UPDATED = 'videoUpdated'
+TRANSCODE_PROGRESS = 'transcodeProgress'
+
+
+def video_payload(video) -> Dict[str, Any]:
+    return {'id': video.pk, 'active': video.is_active}
+
+
+def _queued(callback) -> bool:
+    """Whether ``callback`` still waits for the current transaction to commit."""
+    return any(entry[1] is callback for entry in transaction.get_connection().run_on_commit)
+
+
+def video_saved(sender, instance, created, raw=False, **kwargs) -> None:
+    if raw:
+        return
+    pending = getattr(instance, '_pending_event', None)
+    if pending is not None and _queued(pending):
+        return
+    topic = VIDEO_ADDED if created else VIDEO_UPDATED
+
+    def send():
+        instance._pending_event = None
+        events.publish(topic, video_payload(instance))
+
+    instance._pending_event = send
+    transaction.on_commit(send)
+
+
+def videos_created(videos: Iterable) -> None:
+    payloads = [video_payload(video) for video in videos]
+
+    def send():
+        for payload in payloads:
+            events.publish(VIDEO_ADDED, payload)
+
+    transaction.on_commit(send)
+
+
+def transcode_progress(video, stage: str, percent: float) -> None:
+    if video.pk is None:
+        return
+    events.publish(TRANSCODE_PROGRESS, {
+        'video_id': video.pk,
+        'title': video.title,
+        'stage': stage,
+        'percent': round(percent, 1),
+    })
@@ -0,0 +1,116 @@
+"""
+Async Jellyfin client for GraphQL resolvers.
+
+Resolvers written as ``async def`` return awaitables, and graphql-core then
+runs sibling fields concurrently. An operation asking for ``a: video(id: ...)``,
+``b: video(id: ...)`` and ``videos`` therefore waits for its slowest upstream
+call instead of the sum of all of them (see ``core.async_execution``).
+
+All resolvers on an event loop share one ``httpx.AsyncClient`` and its
+connection pool (``JELLYFIN_ASYNC_MAX_CONNECTIONS``). Under ASGI that is one
+client per worker. Under WSGI each request runs its async phase on a
+short-lived loop, and ``close_client`` releases that loop's client when it is
+done. Requests are routed and failed over through ``videos.backends``, like
+the synchronous client.
+"""
+import asyncio
+import ssl
+import time
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from . import backends
+
+CONNECT_TIMEOUT_SECONDS = backends.CONNECT_TIMEOUT_SECONDS
+READ_TIMEOUT_SECONDS = 15
+
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]' = weakref.WeakKeyDictionary()
+
+
+@lru_cache(maxsize=None)
+def _ssl_context() -> ssl.SSLContext:
+    # Loading the CA bundle costs tens of milliseconds; short-lived loops reuse it
+    import certifi
+
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+def client():
+    """The ``httpx.AsyncClient`` shared by everything on the running loop."""
+    loop = asyncio.get_running_loop()
+    shared = _clients.get(loop)
+    if shared is None:
+        import httpx
+
+        shared = _clients[loop] = httpx.AsyncClient(
+            headers={'X-MediaBrowser-Token': settings.JELLYFIN_API_KEY},
+            verify=_ssl_context(),
+            timeout=httpx.Timeout(READ_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=settings.JELLYFIN_ASYNC_MAX_CONNECTIONS),
+        )
+    return shared
+
+
+async def close_client() -> None:
+    """Close the running loop's client, before that loop goes away."""
+    shared = _clients.pop(asyncio.get_running_loop(), None)
+    if shared is not None:
+        await shared.aclose()
+
+
+async def get(item_id: str, path: str, params: Optional[Dict[str, Any]] = None):
+    """
+    GET ``path`` from the node for ``item_id`` (see ``backends.get``), failing
+    over along the ring on connection errors, timeouts and 5xx.
+    """
+    import httpx
+
+    candidates = backends.pool().candidates(item_id)
+    for attempt, node in enumerate(candidates):
+        last = attempt == len(candidates) - 1
+        node.begin()
+        started = time.perf_counter()
+        try:
+            r = await client().get(node.url + path, params=params)
+        except httpx.HTTPError:
+            node.failed(failover=not last)
+            if last:
+                raise
+            continue
+        finally:
+            node.end()
+        if r.status_code >= 500:
+            node.failed(failover=not last)
+            if not last:
+                continue
+        else:
+            node.succeeded(time.perf_counter() - started)
+        return r
+
+
+class AsyncJellyfinClient:
+    """Async counterpart of ``JellyfinClient`` for the catalog calls."""
+
+    def __init__(self, user_id: Optional[str] = None):
+        self.user_id = user_id or settings.JELLYFIN_USER_ID
+
+    async def list_items(self, parent_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        params = {
+            'IncludeItemTypes': 'Movie,Video',
+            'Fields': 'PrimaryImageAspectRatio,Path,Overview,Genres,RunTimeTicks',
+            'SortBy': 'DateCreated,SortName',
+            'SortOrder': 'Descending',
+        }
+        if parent_id:
+            params['ParentId'] = parent_id
+        resp = await get('', f"/Users/{self.user_id}/Items", params)
+        resp.raise_for_status()
+        return resp.json().get('Items', [])
+
+    async def get_item(self, item_id: str) -> Dict[str, Any]:
+        resp = await get(item_id, f"/Users/{self.user_id}/Items/{item_id}")
+        resp.raise_for_status()
+        return resp.json()
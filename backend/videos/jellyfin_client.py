@@ -4,12 +4,16 @@ import os
 import time
 from typing import Any, Dict, List, Optional
 
-import requests
 from django.conf import settings
 
+from core.profiling import record_upstream
+
 
 class JellyfinClient:
     def __init__(self, base_url: str, api_key: str, user_id: str):
+        # Imported here: requests (and certifi) are only needed once we talk to Jellyfin
+        import requests
+
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.user_id = user_id
@@ -17,6 +21,7 @@ class JellyfinClient:
         self.session.headers.update({
             'X-MediaBrowser-Token': self.api_key,
         })
+        self.session.hooks['response'].append(record_upstream)
 
     def refresh_library(self) -> None:
         # Trigger a library scan; optional, Jellyfin usually auto-scans
@@ -0,0 +1,76 @@
+"""
+Just-in-time packaging of HLS segments for videos packaged on demand.
+
+Segments of variants that were not packaged at upload are transcoded from the
+original when first requested and kept in ``MEDIA_JIT_CACHE_DIR``. The cache
+is bounded by ``MEDIA_JIT_CACHE_MAX_BYTES``: serving a segment refreshes its
+mtime, and the least recently served segments are evicted first.
+
+Concurrent requests for the same segment (threads or worker processes) share
+one ffmpeg run: generation holds an exclusive ``flock`` on a per-segment lock
+file, and waiters find the finished segment once they get the lock.
+"""
+import fcntl
+import os
+import subprocess
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import disk_cache
+from .models import Video
+from .packaging import RENDITIONS, playlist_segments, ts_segment_command
+from .storage import input_for_ffmpeg
+
+SUFFIXES = ('.ts',)
+
+_counter = disk_cache.ByteCounter(SUFFIXES)
+
+
+def segment_path(video_id, variant: int, filename: str) -> str:
+    return os.path.join(settings.MEDIA_JIT_CACHE_DIR, str(video_id), str(variant), filename)
+
+
+@lru_cache(maxsize=256)
+def _segments(playlist_name: str):
+    with default_storage.open(playlist_name, 'rb') as f:
+        return {uri: (start, duration) for uri, start, duration in playlist_segments(f.read().decode('utf-8'))}
+
+
+def get_segment(video: Video, variant: int, filename: str) -> Optional[str]:
+    """
+    Local path of segment ``filename`` of ``variant``, packaging it first if
+    needed. Returns ``None`` for segments the variant's playlist does not list.
+    """
+    if not 0 < variant < len(RENDITIONS):
+        return None
+    base = os.path.dirname(video.hls_master_playlist.name)
+    timing = _segments(f"{base}/{variant}/index.m3u8").get(filename)
+    if timing is None:
+        return None
+
+    path = segment_path(video.pk, variant, filename)
+    if disk_cache.touch(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if disk_cache.touch(path):
+                return path
+            start, duration = timing
+            tmp = f"{path}.part"
+            cmd = ts_segment_command(input_for_ffmpeg(video.original_file), RENDITIONS[variant], start, duration, tmp)
+            subprocess.run(cmd[:1] + ['-loglevel', 'error'] + cmd[1:], check=True)
+            os.replace(tmp, path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    _counter.add(settings.MEDIA_JIT_CACHE_DIR, settings.MEDIA_JIT_CACHE_MAX_BYTES, os.path.getsize(path))
+    return path
+
+
+def evict(target_bytes: int) -> int:
+    """Delete least recently served segments until the cache fits ``target_bytes``."""
+    return disk_cache.evict(settings.MEDIA_JIT_CACHE_DIR, target_bytes, SUFFIXES)
@@ -0,0 +1,129 @@
+"""
+Helpers for placing media files into ``JELLYFIN_LIBRARY_PATH``.
+
+Files are placed with the cheapest method the filesystem supports: a hardlink
+when source and library share a filesystem, a reflink (copy-on-write clone)
+where the filesystem supports ``FICLONE`` (btrfs, XFS), and a plain copy
+otherwise. Content is identified by its SHA-256, computed while it is read or
+written, so an upload of content that is already stored can be dropped.
+"""
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Iterable, Optional, Set, Tuple
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+COPY = 'copy'
+AUTO = 'auto'
+MODES = (AUTO, HARDLINK, REFLINK, COPY)
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of ``path``, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def receive(chunks: Iterable[bytes], directory: str) -> Tuple[str, str]:
+    """
+    Write ``chunks`` to a temporary file in ``directory``, hashing them as they
+    are written. Returns ``(temporary path, sha256)``; the caller either moves
+    the file into place or discards it when the content is already stored.
+    """
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp, digest.hexdigest()
+
+
+def _reflink(src: str, dest: str) -> None:
+    import fcntl
+
+    with open(src, 'rb') as s, open(dest, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dest)
+            raise
+
+
+def place_file(src: str, dest: str, mode: str = AUTO) -> str:
+    """
+    Put ``src`` at ``dest`` using ``mode`` and return the method actually used.
+    In ``auto`` mode a hardlink is tried first, then a reflink, then a copy.
+    ``dest`` is written under a temporary name and renamed into place, so an
+    interrupted copy never leaves a truncated file in the library.
+    """
+    tmp = f"{dest}.part"
+    if os.path.exists(tmp):
+        os.unlink(tmp)
+    attempts = (HARDLINK, REFLINK, COPY) if mode == AUTO else (mode,)
+    for method in attempts:
+        try:
+            if method == HARDLINK:
+                os.link(src, tmp)
+            elif method == REFLINK:
+                _reflink(src, tmp)
+            else:
+                shutil.copyfile(src, tmp)
+        except OSError as e:
+            if mode != AUTO or method == COPY or e.errno not in _FALLBACK_ERRNOS:
+                raise
+            continue
+        os.replace(tmp, dest)
+        return method
+    raise AssertionError('unreachable')
+
+
+_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.EMLINK,
+}
+
+
+def unique_name(filename: str, taken: Set[str], suffix: Optional[str] = None) -> str:
+    """
+    ``filename`` if it is not in ``taken``, otherwise ``<stem>-<suffix><ext>``
+    (with a counter appended if that is taken too).
+    """
+    if filename not in taken:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    base = f"{stem}-{suffix}" if suffix else stem
+    candidate = f"{base}{ext}"
+    counter = 1
+    while candidate in taken:
+        counter += 1
+        candidate = f"{base}-{counter}{ext}"
+    return candidate
+
+
+def free_name(directory: str, filename: str, sha256: str) -> str:
+    """Name for new content ``filename`` in ``directory`` that never overwrites another file."""
+    if not os.path.exists(os.path.join(directory, filename)):
+        return filename
+    return unique_name(filename, set(os.listdir(directory)), sha256[:8])
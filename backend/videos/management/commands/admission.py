@@ -0,0 +1,29 @@
+"""
+Show the admission counters (``core.admission``): admissions, rejections per
+reason, the upload queue depth and the active sessions and uploads.
+
+    python manage.py admission --json
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import admission
+
+
+class Command(BaseCommand):
+    help = 'Print admission and rejection counters for streams and uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        snapshot = admission.stats()
+        if options['json']:
+            self.stdout.write(json.dumps(snapshot, indent=2))
+            return
+        if not settings.ADMISSION_ENABLED:
+            self.stdout.write('ADMISSION_ENABLED is off; nothing is being limited.')
+        for name, value in snapshot.items():
+            self.stdout.write(f"{name:<30} {value}")
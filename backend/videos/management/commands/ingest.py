@@ -0,0 +1,274 @@
+"""
+Bulk import of a media directory into the Jellyfin library.
+
+    python manage.py ingest /mnt/catalog --genre-from-dir
+
+Files are hashed in parallel and deduplicated by content, placed into
+``JELLYFIN_LIBRARY_PATH`` by hardlink, reflink or parallel copy, and recorded
+with ``bulk_create``. Jellyfin is asked to rescan once, at the end. Progress is
+appended to a state file as it happens, so an interrupted run picks up where it
+stopped when started again.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Set, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from videos.events import videos_created
+from videos.library import AUTO, MODES, hash_file, place_file, unique_name
+from videos.models import Genre, Video
+
+DEFAULT_EXTENSIONS = '.mp4,.mkv,.mov,.m4v,.avi,.webm,.ts'
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Import every video below a directory into the Jellyfin library.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--mode', choices=MODES, default=AUTO,
+                            help='How files are placed in the library (default: try hardlink, reflink, then copy).')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4,
+                            help='Files hashed/copied concurrently.')
+        parser.add_argument('--genre', default='', help='Genre assigned to every imported video.')
+        parser.add_argument('--genre-from-dir', action='store_true',
+                            help='Use the top-level directory below <directory> as the genre.')
+        parser.add_argument('--extensions', default=DEFAULT_EXTENSIONS,
+                            help='Comma-separated file extensions to import.')
+        parser.add_argument('--state', default='',
+                            help='Resume file (default: <library>/.ingest-state.jsonl).')
+        parser.add_argument('--no-refresh', action='store_true', help='Skip the Jellyfin library refresh.')
+
+    def handle(self, *args, **options):
+        root = os.path.realpath(options['directory'])
+        if not os.path.isdir(root):
+            raise CommandError(f"{root} is not a directory")
+        library_path = os.path.realpath(settings.JELLYFIN_LIBRARY_PATH)
+        os.makedirs(library_path, exist_ok=True)
+        state_path = options['state'] or os.path.join(library_path, '.ingest-state.jsonl')
+        extensions = {e.strip().lower() for e in options['extensions'].split(',') if e.strip()}
+        workers = max(options['workers'], 1)
+
+        hashed, placed = _load_state(state_path)
+        sources = _scan(root, library_path, extensions)
+        self.stdout.write(f"Found {len(sources)} files below {root}")
+
+        with open(state_path, 'a', encoding='utf-8') as state:
+            def record(event: Dict) -> None:
+                state.write(json.dumps(event) + '\n')
+                state.flush()
+
+            digests = self._hash(sources, hashed, record, workers)
+            placements = self._place(
+                sources, digests, placed, library_path, options, record, workers, root
+            )
+
+        created = _create_rows(placed)
+        if (placements or created) and not options['no_refresh']:
+            from videos import backends
+
+            backends.refresh_library()
+        if created:
+            from core.response_cache import invalidate_tags
+
+            invalidate_tags(['videos'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {len(sources)} files: {len(set(digests.values()))} unique, "
+            f"{placements} placed, {created} videos created"
+        ))
+
+    def _hash(self, sources: List[str], hashed: Dict[str, Dict], record, workers: int) -> Dict[str, str]:
+        digests: Dict[str, str] = {}
+        pending: List[Tuple[str, os.stat_result]] = []
+        for src in sources:
+            st = os.stat(src)
+            known = hashed.get(src)
+            if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+                digests[src] = known['sha256']
+            else:
+                pending.append((src, st))
+        if not pending:
+            return digests
+
+        self.stdout.write(f"Hashing {len(pending)} files ({len(digests)} known from a previous run)")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(hash_file, src): (src, st) for src, st in pending}
+            for future in as_completed(futures):
+                src, st = futures[future]
+                try:
+                    sha256 = future.result()
+                except OSError as e:
+                    self.stderr.write(f"Could not read {src}: {e}")
+                    continue
+                digests[src] = sha256
+                record({'event': 'hashed', 'src': src, 'size': st.st_size,
+                        'mtime_ns': st.st_mtime_ns, 'sha256': sha256})
+        return digests
+
+    def _place(self, sources, digests, placed, library_path, options, record, workers, root) -> int:
+        taken = set(os.listdir(library_path))
+        stored = _stored_names(set(digests.values()))
+        queued = set()
+        jobs: List[Tuple[str, str, Dict]] = []
+        for src in sources:
+            sha256 = digests.get(src)
+            if sha256 is None:
+                continue
+            done = placed.get(sha256)
+            if done and os.path.exists(os.path.join(library_path, done['name'])):
+                continue
+            if sha256 in queued:
+                continue
+            queued.add(sha256)
+
+            filename = os.path.basename(src)
+            existing = os.path.join(library_path, filename)
+            entry = {
+                'event': 'placed',
+                'sha256': sha256,
+                'title': os.path.splitext(filename)[0],
+                'genre': _genre_for(src, root, options),
+            }
+            if os.path.isfile(os.path.join(library_path, stored.get(sha256, ''))):
+                # Uploaded before under another name, reuse that file
+                entry.update(name=stored[sha256], method='existing')
+                placed[sha256] = entry
+                record(entry)
+                continue
+            if (
+                filename in taken
+                and os.path.isfile(existing)
+                and os.path.getsize(existing) == os.path.getsize(src)
+                and hash_file(existing) == sha256
+            ):
+                # Already in the library (e.g. uploaded before), adopt it as-is
+                entry.update(name=filename, method='existing')
+                placed[sha256] = entry
+                record(entry)
+                continue
+            entry['name'] = unique_name(filename, taken, sha256[:8])
+            taken.add(entry['name'])
+            jobs.append((src, os.path.join(library_path, entry['name']), entry))
+        if not jobs:
+            return 0
+
+        self.stdout.write(f"Placing {len(jobs)} files into {library_path}")
+        count = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(place_file, src, dest, options['mode']): entry for src, dest, entry in jobs}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    entry['method'] = future.result()
+                except OSError as e:
+                    self.stderr.write(f"Could not place {entry['name']}: {e}")
+                    continue
+                placed[entry['sha256']] = entry
+                record(entry)
+                count += 1
+        return count
+
+
+def _load_state(path: str) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+    hashed: Dict[str, Dict] = {}
+    placed: Dict[str, Dict] = {}
+    if not os.path.exists(path):
+        return hashed, placed
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # A line cut short by an interruption
+                continue
+            if event.get('event') == 'hashed':
+                hashed[event['src']] = event
+            elif event.get('event') == 'placed':
+                placed[event['sha256']] = event
+    return hashed, placed
+
+
+def _scan(root: str, library_path: str, extensions) -> List[str]:
+    sources: List[str] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not d.startswith('.') and os.path.realpath(os.path.join(dirpath, d)) != library_path
+        )
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in extensions:
+                sources.append(os.path.join(dirpath, filename))
+    return sources
+
+
+def _genre_for(src: str, root: str, options) -> str:
+    if options['genre_from_dir']:
+        parts = os.path.relpath(src, root).split(os.sep)
+        if len(parts) > 1:
+            return parts[0]
+    return options['genre']
+
+
+def _stored_names(hashes) -> Dict[str, str]:
+    """Library file names of videos already stored, by content hash."""
+    hashes = sorted(hashes)
+    names: Dict[str, str] = {}
+    for i in range(0, len(hashes), BATCH_SIZE):
+        rows = Video.objects.filter(content_hash__in=hashes[i:i + BATCH_SIZE]).exclude(library_file='')
+        names.update(rows.values_list('content_hash', 'library_file'))
+    return names
+
+
+def _library_names(names: List[str]) -> Set[str]:
+    """Those of ``names`` that some Video row already records as its library file."""
+    found: Set[str] = set()
+    for i in range(0, len(names), BATCH_SIZE):
+        batch = names[i:i + BATCH_SIZE]
+        found.update(Video.objects.filter(library_file__in=batch).values_list('library_file', flat=True))
+    return found
+
+
+def _create_rows(placed: Dict[str, Dict]) -> int:
+    """
+    Create the Video (and Genre) rows missing for placed files and return how
+    many were created. Safe to re-run.
+    """
+    entries = list(placed.values())
+    existing = _library_names([e['name'] for e in entries])
+    missing = [e for e in entries if e['name'] not in existing]
+    if not missing:
+        return 0
+
+    with transaction.atomic():
+        genre_names = sorted({e['genre'] for e in missing if e['genre']})
+        Genre.objects.bulk_create([Genre(name=n) for n in genre_names], ignore_conflicts=True)
+        genres = dict(Genre.objects.filter(name__in=genre_names).values_list('name', 'id'))
+        Video.objects.bulk_create(
+            [
+                Video(
+                    title=e['title'],
+                    genre_id=genres.get(e['genre']) if e['genre'] else None,
+                    library_file=e['name'],
+                    content_hash=e['sha256'],
+                )
+                for e in missing
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts leaves pks unset and skips rows that clash with an
+        # existing (content, title), e.g. a GraphQL upload; look up what was
+        # actually inserted, for videoAdded and the count
+        created = 0
+        for i in range(0, len(missing), BATCH_SIZE):
+            names = [e['name'] for e in missing[i:i + BATCH_SIZE]]
+            rows = list(Video.objects.filter(library_file__in=names).only('pk', 'is_active'))
+            videos_created(rows)
+            created += len(rows)
+    return created
@@ -0,0 +1,36 @@
+"""
+Probe the configured Jellyfin backends and show how items spread over the
+consistent-hash ring (``videos.backends``).
+
+    python manage.py jellyfin_backends --sample 10000
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from videos import backends
+
+
+class Command(BaseCommand):
+    help = 'Check the health of each Jellyfin backend and its share of items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=10000, help='Synthetic item ids used to measure shares.')
+
+    def handle(self, *args, **options):
+        pool = backends.Pool(settings.JELLYFIN_URLS, settings.JELLYFIN_RING_REPLICAS)
+        pool.check()
+        sample = max(options['sample'], 1)
+        owners = Counter(pool.ring(f"{i:032x}")[0].url for i in range(sample))
+        failed = 0
+        for node in pool.nodes:
+            state = 'DOWN' if node.failures else 'up'
+            failed += state == 'DOWN'
+            self.stdout.write(
+                f"{node.url:<40} {state:<5} ping {node.latency_ms:7.1f} ms  "
+                f"items {owners[node.url] / sample:6.1%}"
+            )
+        if failed:
+            raise CommandError(f"{failed} of {len(pool.nodes)} backends failed their probe")
+
@@ -0,0 +1,23 @@
+"""
+Print an ``X-Profile-Token`` header value that makes ``core.profiling``
+profile every request carrying it, until it expires.
+
+    python manage.py profile_token --ttl 600
+    curl -H "X-Profile-Token: $(python manage.py profile_token)" ...
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import sign_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed header value that forces request profiling.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, default=600, help='Seconds the token stays valid.')
+
+    def handle(self, *args, **options):
+        if not settings.PROFILING_ENABLED:
+            raise CommandError('PROFILING_ENABLED is off; requests would not be profiled.')
+        self.stdout.write(sign_token(options['ttl']))
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0002_video_jellyfin_item_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='video',
+            constraint=models.UniqueConstraint(condition=models.Q(('content_hash', ''), _negated=True), fields=('content_hash', 'title'), name='video_unique_content_title'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_video_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='dash_manifest',
+            field=models.FileField(blank=True, null=True, upload_to='videos/hls/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0004_video_dash_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='packaged_on_demand',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.6 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+ORIGINALS = 'videos/originals/'
+
+
+def move_library_names(apps, schema_editor):
+    # The admin upload API and ingest stored library-relative names in
+    # original_file; GraphQL uploads always live under ORIGINALS
+    Video = apps.get_model('videos', 'Video')
+    rows = Video.objects.exclude(original_file='').exclude(original_file__startswith=ORIGINALS)
+    for video in rows.only('pk', 'original_file'):
+        Video.objects.filter(pk=video.pk).update(library_file=video.original_file.name, original_file='')
+
+
+def restore_library_names(apps, schema_editor):
+    Video = apps.get_model('videos', 'Video')
+    for video in Video.objects.exclude(library_file='').filter(original_file='').only('pk', 'library_file'):
+        Video.objects.filter(pk=video.pk).update(original_file=video.library_file, library_file='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0005_video_packaged_on_demand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='library_file',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='original_file',
+            field=models.FileField(blank=True, upload_to='videos/originals/'),
+        ),
+        migrations.RunPython(move_library_names, restore_library_names),
+    ]
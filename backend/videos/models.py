@@ -13,7 +13,13 @@ class Video(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, default='')
     genre = models.ForeignKey(Genre, on_delete=models.SET_NULL, null=True, blank=True, related_name='videos')
-    original_file = models.FileField(upload_to='videos/originals/')
+    # Uploads through GraphQL, in default_storage (MEDIA_ROOT or the bucket)
+    original_file = models.FileField(upload_to='videos/originals/', blank=True)
+    # Files placed in the Jellyfin library (admin upload API, ingest), by name
+    # relative to JELLYFIN_LIBRARY_PATH; Jellyfin serves these
+    library_file = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    # SHA-256 of the original; videos sharing it share the stored file and assets
+    content_hash = models.CharField(max_length=64, blank=True, default='')
     jellyfin_item_id = models.CharField(max_length=64, blank=True, default='')
     duration_seconds = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -23,10 +29,40 @@ class Video(models.Model):
     # Generated assets
     thumbnail = models.ImageField(upload_to='videos/thumbnails/', blank=True, null=True)
     hls_master_playlist = models.FileField(upload_to='videos/hls/', blank=True, null=True)
+    # DASH manifest over the same CMAF segments (MEDIA_PACKAGING=cmaf only)
+    dash_manifest = models.FileField(upload_to='videos/hls/', blank=True, null=True)
+    # Only the lowest rendition was packaged at upload (MEDIA_JIT_PACKAGING)
+    packaged_on_demand = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_hash', 'title'],
+                condition=~models.Q(content_hash=''),
+                name='video_unique_content_title',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.title
 
+    def update_metadata(self, description=None, genre=None) -> bool:
+        """
+        Apply the description and genre sent with a re-upload of this video's
+        content under its title. ``None`` keeps the current value. Returns
+        whether anything changed.
+        """
+        changed = []
+        if description is not None and description != self.description:
+            self.description = description
+            changed.append('description')
+        if genre is not None and genre.pk != self.genre_id:
+            self.genre = genre
+            changed.append('genre')
+        if changed:
+            self.save(update_fields=[*changed, 'updated_at'])
+        return bool(changed)
+
 
 class SavedVideo(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='saved_videos')
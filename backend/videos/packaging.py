@@ -0,0 +1,193 @@
+"""
+ffmpeg command lines for packaging renditions, and the playlists of
+renditions packaged on demand.
+
+With ``MEDIA_JIT_PACKAGING`` only the lowest rendition is packaged at upload.
+The other variants get playlists that mirror its segment boundaries (keyframes
+are forced on them, so every variant cuts at the same timestamps) and are
+marked with ``ON_DEMAND_MARKER``; their segments are produced one at a time by
+``ts_segment_command`` when first requested (see ``videos.jit``).
+"""
+import os
+import re
+import subprocess
+from typing import Callable, List, Tuple
+
+from django.conf import settings
+
+ON_DEMAND_MARKER = '## on-demand'
+
+_RESOLUTION = re.compile(r'RESOLUTION=(\d+)x(\d+)')
+
+# (width, height, video bitrate, maxrate, bufsize, audio bitrate in TS mode)
+RENDITIONS = [
+    (854, 480, '800k', '856k', '1200k', '96k'),
+    (1280, 720, '2800k', '2996k', '4200k', '128k'),
+    (1920, 1080, '5000k', '5350k', '7500k', '192k'),
+]
+CMAF_AUDIO_BITRATE = '128k'
+
+
+def video_args(i: int, rendition) -> List[str]:
+    width, height, bitrate, maxrate, bufsize, _audio = rendition
+    return [
+        f'-filter:v:{i}', f'scale=w={width}:h={height}:force_original_aspect_ratio=decrease:force_divisible_by=2',
+        f'-c:v:{i}', 'h264', f'-b:v:{i}', bitrate, f'-maxrate:v:{i}', maxrate, f'-bufsize:v:{i}', bufsize,
+    ]
+
+
+def probe_duration(input_path: str) -> float:
+    """Duration of ``input_path`` in seconds, 0 when ffprobe cannot tell."""
+    try:
+        out = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', input_path],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        return float(out.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return 0.0
+
+
+def run_with_progress(command: List[str], on_progress: Callable[[float], None]) -> None:
+    """
+    ``subprocess.run(command, check=True)`` for an ffmpeg command, calling
+    ``on_progress`` with the seconds of output written so far as it advances.
+    """
+    command = command[:1] + ['-progress', 'pipe:1', '-nostats'] + command[1:]
+    with subprocess.Popen(command, stdout=subprocess.PIPE, text=True) as proc:
+        for line in proc.stdout:
+            key, _, value = line.strip().partition('=')
+            if key == 'out_time_us' and value.isdigit():
+                on_progress(int(value) / 1_000_000)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, command)
+
+
+def keyframe_args() -> List[str]:
+    # Keyframes on every segment boundary: segments get the configured length
+    # and all variants cut at the same timestamps, so players switch cleanly
+    return [
+        '-force_key_frames', f'expr:gte(t,n_forced*{settings.MEDIA_SEGMENT_SECONDS:g})',
+        '-sc_threshold', '0',
+    ]
+
+
+def ts_command(input_path: str, hls_dir: str, renditions=RENDITIONS) -> List[str]:
+    """MPEG-TS HLS; every variant carries its own AAC audio."""
+    maps: List[str] = []
+    variant_cmds: List[str] = []
+    for i, rendition in enumerate(renditions):
+        maps += ['-map', '0:v:0', '-map', '0:a:0']
+        variant_cmds += video_args(i, rendition) + [f'-c:a:{i}', 'aac', f'-b:a:{i}', rendition[5]]
+        os.makedirs(os.path.join(hls_dir, str(i)), exist_ok=True)
+    variant_cmds += keyframe_args()
+
+    hls_flags = [
+        '-f', 'hls', '-hls_playlist_type', 'vod', '-hls_time', f'{settings.MEDIA_SEGMENT_SECONDS:g}',
+        '-hls_list_size', '0', '-master_pl_name', 'master.m3u8',
+        '-var_stream_map', ' '.join(f'v:{i},a:{i}' for i in range(len(renditions))),
+    ]
+    out_pattern = os.path.join(hls_dir, '%v', 'index.m3u8')
+    return ['ffmpeg', '-y', '-i', input_path] + maps + variant_cmds + hls_flags + [out_pattern]
+
+
+def cmaf_command(input_path: str, out_dir: str) -> List[str]:
+    """
+    CMAF (fragmented MP4) packaged once for both HLS and DASH: ``master.m3u8``
+    and ``manifest.mpd`` reference the same segments, and a single audio
+    rendition is shared by every video variant. ``MEDIA_PART_SECONDS`` splits
+    segments into smaller fragments (parts) for low-latency players.
+    """
+    segment = settings.MEDIA_SEGMENT_SECONDS
+    part = settings.MEDIA_PART_SECONDS
+    maps: List[str] = []
+    variant_cmds: List[str] = []
+    for i, rendition in enumerate(RENDITIONS):
+        maps += ['-map', '0:v:0']
+        variant_cmds += video_args(i, rendition)
+    maps += ['-map', '0:a:0']
+    variant_cmds += ['-c:a', 'aac', '-b:a', CMAF_AUDIO_BITRATE, '-ac', '2'] + keyframe_args()
+
+    dash_flags = [
+        '-f', 'dash', '-seg_duration', f'{segment:g}', '-use_template', '1', '-use_timeline', '0',
+        '-adaptation_sets', 'id=0,streams=v id=1,streams=a',
+        '-init_seg_name', 'init-$RepresentationID$.$ext$',
+        '-media_seg_name', 'chunk-$RepresentationID$-$Number%05d$.$ext$',
+        '-hls_playlist', '1', '-hls_master_name', 'master.m3u8',
+    ]
+    if part:
+        dash_flags += ['-frag_type', 'duration', '-frag_duration', f'{part:g}']
+    return ['ffmpeg', '-y', '-i', input_path] + maps + variant_cmds + dash_flags + [
+        os.path.join(out_dir, 'manifest.mpd')
+    ]
+
+
+def ts_segment_command(input_path: str, rendition, start: float, duration: float, out_path: str) -> List[str]:
+    """
+    One MPEG-TS segment of ``rendition`` covering ``[start, start + duration)``.
+    Input seeking is frame-accurate when transcoding, and the output keeps the
+    source timeline so it lines up with segments of the other variants.
+    """
+    return [
+        'ffmpeg', '-y', '-ss', f'{start:.6f}', '-i', input_path, '-t', f'{duration:.6f}',
+        '-map', '0:v:0', '-map', '0:a:0',
+    ] + video_args(0, rendition) + [
+        '-c:a', 'aac', '-b:a', rendition[5],
+        '-output_ts_offset', f'{start:.6f}', '-f', 'mpegts', out_path,
+    ]
+
+
+def playlist_segments(text: str) -> List[Tuple[str, float, float]]:
+    """``(uri, start, duration)`` of every segment in a media playlist."""
+    segments = []
+    start = 0.0
+    duration = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXTINF:'):
+            duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+        elif line and not line.startswith('#') and duration is not None:
+            segments.append((line, start, duration))
+            start += duration
+            duration = None
+    return segments
+
+
+def write_on_demand_playlists(hls_dir: str, renditions=RENDITIONS) -> None:
+    """
+    After ``ts_command`` packaged ``renditions[:1]`` into ``hls_dir``, write
+    the media playlists of the remaining variants and a master listing all.
+    """
+    with open(os.path.join(hls_dir, '0', 'index.m3u8')) as f:
+        lowest = f.read()
+    with open(os.path.join(hls_dir, 'master.m3u8')) as f:
+        packaged = f.read()
+    match = _RESOLUTION.search(packaged)
+    aspect = int(match.group(1)) / int(match.group(2)) if match else 16 / 9
+
+    lines = lowest.splitlines()
+    on_demand = '\n'.join(lines[:1] + [ON_DEMAND_MARKER] + lines[1:]) + '\n'
+    master = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for i, rendition in enumerate(renditions):
+        width, height, bitrate, _maxrate, _bufsize, audio = rendition
+        # Same box fit as the scale filter in video_args
+        if aspect >= width / height:
+            height = _even(width / aspect)
+        else:
+            width = _even(height * aspect)
+        bandwidth = int((_kbps(bitrate) + _kbps(audio)) * 1000 * 1.1)
+        master += [f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height}', f'{i}/index.m3u8']
+        if i:
+            os.makedirs(os.path.join(hls_dir, str(i)), exist_ok=True)
+            with open(os.path.join(hls_dir, str(i), 'index.m3u8'), 'w') as f:
+                f.write(on_demand)
+    with open(os.path.join(hls_dir, 'master.m3u8'), 'w') as f:
+        f.write('\n'.join(master) + '\n')
+
+
+def _kbps(value: str) -> int:
+    return int(value.rstrip('k'))
+
+
+def _even(value: float) -> int:
+    return int(value / 2) * 2
@@ -0,0 +1,171 @@
+"""
+Playback of HLS assets stored in ``default_storage``.
+
+With local storage the playlists are served straight from ``MEDIA_URL``. With
+object storage the bucket stays private: playlists are fetched through
+``StoragePlaylistView``, which rewrites every segment URI into a presigned
+URL so the segment bytes are served by the object store directly, and every
+nested playlist URI into another signed ``/hls/`` URL.
+
+DASH manifests address segments through templates, which cannot carry
+per-object signatures. Their templates get a signature covering the whole
+``/hls/<video id>/`` prefix instead, and segment requests under that prefix
+are redirected to presigned URLs.
+
+Master playlists are filtered per client by ``videos.abr`` (variants lowest
+first, pruned to the client's bandwidth cap), so with ``HLS_ABR_FILTERING``
+they are served through ``StoragePlaylistView`` with local storage too.
+
+Videos packaged on demand are always played through ``StoragePlaylistView``:
+segments of their on-demand variants get signed ``/hls/`` URLs and are
+produced by ``videos.jit`` on first request.
+"""
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import (
+    FileResponse,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotFound,
+    HttpResponseRedirect,
+)
+from django.utils.cache import patch_vary_headers
+from django.views import View
+
+from .abr import bandwidth_cap, filtered_master
+from .jellyfin_client import build_signed_url, verify_signature
+from .models import Video
+from .packaging import ON_DEMAND_MARKER
+from .storage import is_local
+
+_URI_ATTR = re.compile(r'URI="([^"]+)"')
+_TEMPLATE_ATTR = re.compile(r'\b(initialization|media)="([^"?]+)"')
+
+PLAYLIST_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.mpd': 'application/dash+xml',
+}
+
+
+def master_playlist_url(video: Video) -> str:
+    if is_local(video.hls_master_playlist.storage) and not (video.packaged_on_demand or settings.HLS_ABR_FILTERING):
+        return video.hls_master_playlist.url
+    return build_signed_url(f"/hls/{video.pk}/master.m3u8", settings.SIGNED_URL_TTL_SECONDS)
+
+
+def dash_manifest_url(video: Video) -> str:
+    if is_local(video.dash_manifest.storage):
+        return video.dash_manifest.url
+    return build_signed_url(f"/hls/{video.pk}/manifest.mpd", settings.SIGNED_URL_TTL_SECONDS)
+
+
+def _prefix(video_id) -> str:
+    return f"/hls/{video_id}/"
+
+
+def rewrite_manifest(text: str, video_id) -> str:
+    """Append a prefix signature to the segment templates of a DASH manifest."""
+    # A static MPD is fetched once; the prefix expires with the presigned segments
+    query = build_signed_url(_prefix(video_id), settings.MEDIA_SEGMENT_URL_TTL_SECONDS).split('?', 1)[1]
+    query = query.replace('&', '&amp;')
+    return _TEMPLATE_ATTR.sub(lambda m: f'{m.group(1)}="{m.group(2)}?{query}"', text)
+
+
+def _storage_url(name: str) -> str:
+    if is_local(default_storage):
+        return default_storage.url(name)
+    return default_storage.url(name, expire=settings.MEDIA_SEGMENT_URL_TTL_SECONDS)
+
+
+def _read(name: str) -> str:
+    with default_storage.open(name, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def rewrite_playlist(text: str, video_id, filename: str, name: str) -> str:
+    rel_dir = posixpath.dirname(filename)
+    obj_dir = posixpath.dirname(name)
+    on_demand = ON_DEMAND_MARKER in text
+
+    def sign(uri: str) -> str:
+        if '://' in uri:
+            return uri
+        playlist = uri.split('?', 1)[0].endswith('.m3u8')
+        if on_demand or playlist:
+            rel = posixpath.normpath(posixpath.join(rel_dir, uri))
+            # VOD players load a variant playlist once, so its segment URLs
+            # must outlive the playback, like the presigned ones below
+            ttl = settings.SIGNED_URL_TTL_SECONDS if playlist else settings.MEDIA_SEGMENT_URL_TTL_SECONDS
+            return build_signed_url(f"/hls/{video_id}/{rel}", ttl)
+        obj = posixpath.normpath(posixpath.join(obj_dir, uri))
+        return _storage_url(obj)
+
+    out = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith('#'):
+            out.append(sign(stripped))
+        elif 'URI="' in line:
+            out.append(_URI_ATTR.sub(lambda m: f'URI="{sign(m.group(1))}"', line))
+        else:
+            out.append(line)
+    return '\n'.join(out) + '\n'
+
+
+class StoragePlaylistView(View):
+    def get(self, request: HttpRequest, video_id: str, filename: str):
+        ext = posixpath.splitext(filename)[1]
+        expires = request.GET.get('expires')
+        sig = request.GET.get('sig')
+        if not (expires and sig and expires.isdigit()):
+            return HttpResponseForbidden('Invalid signature')
+        path_signed = verify_signature(request.path, int(expires), sig)
+        if not (path_signed or (ext not in PLAYLIST_TYPES and verify_signature(_prefix(video_id), int(expires), sig))):
+            return HttpResponseForbidden('Invalid signature')
+
+        video = (
+            Video.objects.filter(pk=video_id, is_active=True)
+            .only('id', 'hls_master_playlist', 'original_file', 'packaged_on_demand')
+            .first()
+        )
+        if video is None or not video.hls_master_playlist:
+            return HttpResponseNotFound()
+        base = posixpath.dirname(video.hls_master_playlist.name)
+        name = posixpath.normpath(posixpath.join(base, filename))
+        if not name.startswith(base + '/'):
+            return HttpResponseNotFound()
+        if ext not in PLAYLIST_TYPES:
+            if path_signed and video.packaged_on_demand:
+                return self.on_demand_segment(video, filename)
+            return HttpResponseRedirect(_storage_url(name))
+        master = settings.HLS_ABR_FILTERING and name == video.hls_master_playlist.name
+        try:
+            if master:
+                text = filtered_master(name, bandwidth_cap(request), lambda: _read(name))
+            else:
+                text = _read(name)
+        except (FileNotFoundError, OSError):
+            return HttpResponseNotFound()
+        if ext == '.mpd':
+            body = rewrite_manifest(text, video.pk)
+        else:
+            body = rewrite_playlist(text, video.pk, filename, name)
+        response = HttpResponse(body, content_type=PLAYLIST_TYPES[ext])
+        if master:
+            patch_vary_headers(response, ('Save-Data', 'X-Device-Class'))
+        return response
+
+    def on_demand_segment(self, video: Video, filename: str):
+        from .jit import get_segment
+
+        variant, _, segment = filename.partition('/')
+        if not variant.isdigit() or '/' in segment:
+            return HttpResponseNotFound()
+        path = get_segment(video, int(variant), segment)
+        if path is None:
+            return HttpResponseNotFound()
+        return FileResponse(open(path, 'rb'), content_type='video/mp2t')
@@ -0,0 +1,268 @@
+"""
+Segment read-ahead for the ``/stream/`` proxy.
+
+Jellyfin transcodes segments on the fly, so a segment fetched only when the
+player asks for it costs the full transcode latency. The proxy remembers the
+segment order of every variant playlist it serves. When a player requests
+segment N, the next ``STREAM_READAHEAD_SEGMENTS`` segments of that variant are
+fetched in the background from the item's Jellyfin node (``videos.backends``)
+by a pool of ``STREAM_READAHEAD_WORKERS`` threads into
+``STREAM_READAHEAD_CACHE_DIR``. The cache is bounded by
+``STREAM_READAHEAD_CACHE_MAX_BYTES``, and the least recently served segments
+go first. A request for a segment that is being prefetched waits for that
+fetch instead of starting another.
+
+Prefetches are deduplicated across viewers of the same title: within a
+process through the in-flight table, across workers through a short lock in
+the shared cache. Read-ahead pauses when Jellyfin looks saturated, that is
+when any of these holds:
+- ``STREAM_READAHEAD_MAX_PENDING`` prefetches are already queued
+- upstream time-to-headers averages over ``STREAM_READAHEAD_SATURATED_MS``
+- Jellyfin answered 429/5xx in the last ``STREAM_READAHEAD_BACKOFF_SECONDS``
+
+``stats()`` reports per-process hit rate, prefetched and wasted (evicted
+unserved) bytes, and throttled prefetches. The same numbers are logged
+every ``LOG_EVERY`` segment requests.
+"""
+import logging
+import os
+import posixpath
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.lru import LRUCache
+from . import backends, disk_cache
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_KEY_PREFIX = 'readahead:pl:'
+LOCK_KEY_PREFIX = 'readahead:lock:'
+PLAYLIST_TTL_SECONDS = 6 * 3600
+LOCK_TTL_SECONDS = 60
+# A player asking for a segment that is being prefetched waits this long for it
+INFLIGHT_WAIT_SECONDS = 30
+UPSTREAM_TIMEOUT_SECONDS = 60
+# Weight of a new sample in the moving average of upstream latency
+LATENCY_SMOOTHING = 0.2
+LOG_EVERY = 1000
+# Cached segments get their own suffix so half-written ``.part`` files are never served
+SUFFIX = '.seg'
+# Prefetched segments not served yet, remembered per process to count wasted bytes
+UNSERVED_LIMIT = 10000
+
+SEGMENT_TYPES = {
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.aac': 'audio/aac',
+}
+
+_playlists = LRUCache(1000)
+_inflight: Dict[Tuple[str, str], object] = {}
+_unserved: 'OrderedDict[str, int]' = OrderedDict()
+_lock = threading.Lock()
+_stats = Counter()
+_state = {'latency_ms': 0.0, 'backoff_until': 0.0}
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _evicted(path: str, size: int) -> None:
+    with _lock:
+        if _unserved.pop(path, None) is not None:
+            _stats['wasted_bytes'] += size
+
+
+_counter = disk_cache.ByteCounter((SUFFIX,), on_evict=_evicted)
+
+
+def content_type(filename: str) -> str:
+    return SEGMENT_TYPES.get(posixpath.splitext(filename)[1].lower(), 'application/octet-stream')
+
+
+def _clean(filename: str) -> Optional[str]:
+    name = posixpath.normpath(filename)
+    if name.startswith(('/', '..')) or name == '.':
+        return None
+    return name
+
+
+def segment_path(item_id: str, filename: str) -> str:
+    return os.path.join(settings.STREAM_READAHEAD_CACHE_DIR, item_id, filename + SUFFIX)
+
+
+def _playlist_key(item_id: str, directory: str) -> str:
+    return f"{PLAYLIST_KEY_PREFIX}{item_id}:{directory}"
+
+
+def remember_playlist(item_id: str, filename: str, text: str) -> None:
+    """Record the segment order of variant playlist ``filename`` of ``item_id``."""
+    directory = posixpath.dirname(filename)
+    segments = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#') and not line.split('?', 1)[0].endswith('.m3u8'):
+            name = _clean(posixpath.join(directory, line.split('?', 1)[0]))
+            if name is not None:
+                segments.append(name)
+    if not segments:
+        return
+    key = _playlist_key(item_id, directory)
+    _playlists.set(key, _index(segments))
+    cache.set(key, segments, timeout=PLAYLIST_TTL_SECONDS)
+
+
+def _index(segments: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    return segments, {name: i for i, name in enumerate(segments)}
+
+
+def _following(item_id: str, filename: str, count: int) -> List[str]:
+    key = _playlist_key(item_id, posixpath.dirname(filename))
+    entry = _playlists.get(key)
+    if entry is None:
+        segments = cache.get(key)
+        if not segments:
+            return []
+        entry = _index(segments)
+        _playlists.set(key, entry)
+    segments, positions = entry
+    position = positions.get(filename)
+    if position is None:
+        return []
+    return segments[position + 1:position + 1 + count]
+
+
+def cached(item_id: str, filename: str) -> Optional[str]:
+    """
+    Local path of a read-ahead copy of the segment, waiting for an in-flight
+    prefetch of it. ``None`` on a miss. Counts the request either way.
+    """
+    name = _clean(filename)
+    if name is None:
+        return None
+    with _lock:
+        future = _inflight.get((item_id, name))
+    if future is not None:
+        try:
+            future.result(timeout=INFLIGHT_WAIT_SECONDS)
+        except Exception:
+            pass
+    path = segment_path(item_id, name)
+    hit = disk_cache.touch(path)
+    with _lock:
+        _stats['requests'] += 1
+        _stats['hits' if hit else 'misses'] += 1
+        if hit:
+            _unserved.pop(path, None)
+        log = _stats['requests'] % LOG_EVERY == 0
+    if log:
+        logger.info('Segment read-ahead: %s', stats())
+    return path if hit else None
+
+
+def observe_upstream(seconds: float, status: int) -> None:
+    """Feed the saturation detector with an upstream response."""
+    with _lock:
+        _state['latency_ms'] += LATENCY_SMOOTHING * (seconds * 1000 - _state['latency_ms'])
+        if status == 429 or status >= 500:
+            _state['backoff_until'] = time.monotonic() + settings.STREAM_READAHEAD_BACKOFF_SECONDS
+
+
+def _saturated() -> bool:
+    return (
+        len(_inflight) >= settings.STREAM_READAHEAD_MAX_PENDING
+        or _state['latency_ms'] > settings.STREAM_READAHEAD_SATURATED_MS
+        or time.monotonic() < _state['backoff_until']
+    )
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=settings.STREAM_READAHEAD_WORKERS, thread_name_prefix='readahead'
+                )
+    return _pool
+
+
+def schedule(item_id: str, filename: str) -> int:
+    """Queue prefetches of the segments following ``filename``; returns how many."""
+    count = settings.STREAM_READAHEAD_SEGMENTS
+    name = _clean(filename)
+    if count <= 0 or name is None:
+        return 0
+    queued = 0
+    pool = _executor()
+    for following in _following(item_id, name, count):
+        key = (item_id, following)
+        path = segment_path(item_id, following)
+        with _lock:
+            if key in _inflight or os.path.exists(path):
+                continue
+            if _saturated():
+                _stats['throttled'] += 1
+                break
+            # Another worker process may be fetching it already
+            if not cache.add(LOCK_KEY_PREFIX + f"{item_id}:{following}", 1, timeout=LOCK_TTL_SECONDS):
+                continue
+            _inflight[key] = pool.submit(_prefetch, item_id, following, path)
+        queued += 1
+    return queued
+
+
+def _prefetch(item_id: str, filename: str, path: str) -> None:
+    upstream = f"/Videos/{item_id}/{filename}?" + urlencode({'api_key': settings.JELLYFIN_API_KEY})
+    tmp = f"{path}.part"
+    try:
+        started = time.perf_counter()
+        r = backends.get(item_id, upstream, read_timeout=UPSTREAM_TIMEOUT_SECONDS, stream=True)
+        observe_upstream(time.perf_counter() - started, r.status_code)
+        if r.status_code != 200:
+            backends.release(r)
+            with _lock:
+                _stats['errors'] += 1
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 0
+        with open(tmp, 'wb') as f:
+            for chunk in backends.body(r, chunk_size=64 * 1024):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp, path)
+        with _lock:
+            _stats['prefetched'] += 1
+            _stats['prefetched_bytes'] += size
+            _unserved[path] = size
+            while len(_unserved) > UNSERVED_LIMIT:
+                _unserved.popitem(last=False)
+        _counter.add(settings.STREAM_READAHEAD_CACHE_DIR, settings.STREAM_READAHEAD_CACHE_MAX_BYTES, size)
+    except Exception:
+        logger.warning('Prefetch of %s/%s failed', item_id, filename, exc_info=True)
+        with _lock:
+            _stats['errors'] += 1
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+    finally:
+        with _lock:
+            _inflight.pop((item_id, filename), None)
+        cache.delete(LOCK_KEY_PREFIX + f"{item_id}:{filename}")
+
+
+def stats() -> Dict[str, float]:
+    with _lock:
+        snapshot = dict(_stats)
+        latency = _state['latency_ms']
+    requests_count = snapshot.get('requests', 0)
+    snapshot['hit_rate'] = round(snapshot.get('hits', 0) / requests_count, 3) if requests_count else 0.0
+    snapshot['upstream_latency_ms'] = round(latency, 1)
+    return snapshot
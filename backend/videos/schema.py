@@ -1,7 +1,7 @@
 import os
 import shutil
 import time
-from typing import List, Optional
+from typing import Optional
 
 import graphene
 from graphene_django import DjangoObjectType
@@ -10,9 +10,11 @@ from django.db import transaction
 from django.contrib.auth import get_user_model
 
 from .models import Video, Genre, SavedVideo
-from .jellyfin_client import JellyfinClient, build_signed_url
+from core.response_cache import cache_hint, invalidate_tags
+from . import backends
 
 
+@cache_hint(max_age=300, tags=('videos',))
 class VideoType(DjangoObjectType):
     class Meta:
         model = Video
@@ -27,76 +29,6 @@ class VideoType(DjangoObjectType):
         )
 
 
-class GQLVideo(graphene.ObjectType):
-    id = graphene.ID()
-    title = graphene.String()
-    description = graphene.String()
-    duration_seconds = graphene.Int()
-    thumbnail_url = graphene.String()
-    playback_url = graphene.String(description="Signed HLS master.m3u8 URL via Django proxy")
-    genre = graphene.String()
-
-
-class VideosQuery(graphene.ObjectType):
-    videos = graphene.List(GQLVideo, genre=graphene.String(required=False))
-    video = graphene.Field(GQLVideo, id=graphene.ID(required=True))
-
-    def _client(self) -> JellyfinClient:
-        return JellyfinClient(settings.JELLYFIN_URL, settings.JELLYFIN_API_KEY, settings.JELLYFIN_USER_ID)
-
-    def resolve_videos(self, info, genre=None):
-        client = self._client()
-        items = client.list_items()
-        results: List[GQLVideo] = []
-        for it in items:
-            item_id = it.get('Id')
-            title = it.get('Name')
-            overview = it.get('Overview') or ''
-            runtime_ticks = it.get('RunTimeTicks') or 0
-            duration_seconds = int(runtime_ticks / 10_000_000) if runtime_ticks else 0
-            thumb_url = f"{settings.JELLYFIN_URL}/Items/{item_id}/Images/Primary?quality=80&fillHeight=540&fillWidth=960"
-            proxy_path = f"/stream/{item_id}/master.m3u8"
-            playback_signed = build_signed_url(proxy_path, settings.SIGNED_URL_TTL_SECONDS)
-            first_genre = None
-            genres = it.get('Genres') or []
-            if genres:
-                first_genre = genres[0]
-            results.append(GQLVideo(
-                id=item_id,
-                title=title,
-                description=overview,
-                duration_seconds=duration_seconds,
-                thumbnail_url=thumb_url,
-                playback_url=playback_signed,
-                genre=first_genre,
-            ))
-        if genre:
-            results = [r for r in results if (r.genre or '').lower() == genre.lower()]
-        return results
-
-    def resolve_video(self, info, id):
-        client = self._client()
-        it = client.get_item(id)
-        runtime_ticks = it.get('RunTimeTicks') or 0
-        duration_seconds = int(runtime_ticks / 10_000_000) if runtime_ticks else 0
-        thumb_url = f"{settings.JELLYFIN_URL}/Items/{id}/Images/Primary?quality=80&fillHeight=540&fillWidth=960"
-        proxy_path = f"/stream/{id}/master.m3u8"
-        playback_signed = build_signed_url(proxy_path, settings.SIGNED_URL_TTL_SECONDS)
-        first_genre = None
-        genres = it.get('Genres') or []
-        if genres:
-            first_genre = genres[0]
-        return GQLVideo(
-            id=id,
-            title=it.get('Name'),
-            description=it.get('Overview') or '',
-            duration_seconds=duration_seconds,
-            thumbnail_url=thumb_url,
-            playback_url=playback_signed,
-            genre=first_genre,
-        )
-
-
 class UploadVideo(graphene.Mutation):
     class Arguments:
         title = graphene.String(required=True)
@@ -125,8 +57,8 @@ class UploadVideo(graphene.Mutation):
         dest_path = os.path.join(library_path, original_name)
         shutil.copyfile(file, dest_path)
 
-        client = JellyfinClient(settings.JELLYFIN_URL, settings.JELLYFIN_API_KEY, settings.JELLYFIN_USER_ID)
-        client.refresh_library()
+        backends.refresh_library()
+        client = backends.client()
         time.sleep(2)
 
         # Try to find the item by Name or Path
@@ -144,6 +76,7 @@ class UploadVideo(graphene.Mutation):
             original_file=original_name,
             jellyfin_item_id=jellyfin_item_id or '',
         )
+        transaction.on_commit(lambda: invalidate_tags(['videos']))
         return UploadVideo(ok=True, video=video)
 
 
@@ -188,27 +121,52 @@ class VideosMutation(graphene.ObjectType):
     unsave_video = UnsaveVideo.Field()
 
 import os
+import shutil
 import subprocess
+import tempfile
+import time
 import uuid
-from typing import List
+from contextlib import contextmanager
+from typing import Iterator, List
 
 import graphene
 from graphene_django import DjangoObjectType
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.core.files.storage import default_storage
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.contrib.auth import get_user_model
-
+from graphql import GraphQLError
+
+from core import admission, events
+from core.response_cache import cache_hint, invalidate_tags
+from . import backends
+from .abr import record_throughput
+from .events import TRANSCODE_PROGRESS, VIDEO_ADDED, VIDEO_UPDATED, transcode_progress
+from .jellyfin_async import AsyncJellyfinClient
+from .jellyfin_client import build_signed_url
 from .models import Video, Genre, SavedVideo
-
-
+from .library import hash_file
+from .packaging import (
+    RENDITIONS,
+    cmaf_command,
+    probe_duration,
+    run_with_progress,
+    ts_command,
+    write_on_demand_playlists,
+)
+from .playback import dash_manifest_url, master_playlist_url
+from .storage import input_for_ffmpeg, is_local, save_path, upload_tree
+
+
+@cache_hint(max_age=300, tags=('videos',))
 class GenreType(DjangoObjectType):
     class Meta:
         model = Genre
         fields = ("id", "name")
 
 
+@cache_hint(max_age=300, signed_urls=True, tags=('videos',))
 class VideoType(DjangoObjectType):
     class Meta:
         model = Video
@@ -220,22 +178,138 @@ class VideoType(DjangoObjectType):
             "duration_seconds",
             "thumbnail",
             "hls_master_playlist",
+            "dash_manifest",
             "created_at",
         )
 
+    def resolve_thumbnail(self, info):
+        return self.thumbnail.url if self.thumbnail else None
+
+    def resolve_hls_master_playlist(self, info):
+        return master_playlist_url(self) if self.hls_master_playlist else None
+
+    def resolve_dash_manifest(self, info):
+        return dash_manifest_url(self) if self.dash_manifest else None
+
+
+@cache_hint(max_age=300, signed_urls=True, tags=('videos',))
+class JellyfinVideoType(graphene.ObjectType):
+    id = graphene.ID()
+    title = graphene.String()
+    description = graphene.String()
+    duration_seconds = graphene.Int()
+    thumbnail_url = graphene.String()
+    playback_url = graphene.String(description="Signed HLS master.m3u8 URL via Django proxy")
+    genre = graphene.String()
+
+    @classmethod
+    def from_item(cls, item) -> 'JellyfinVideoType':
+        item_id = item.get('Id')
+        runtime_ticks = item.get('RunTimeTicks') or 0
+        genres = item.get('Genres') or []
+        return cls(
+            id=item_id,
+            title=item.get('Name'),
+            description=item.get('Overview') or '',
+            duration_seconds=int(runtime_ticks / 10_000_000) if runtime_ticks else 0,
+            thumbnail_url=f"{backends.url_for(item_id)}/Items/{item_id}/Images/Primary?quality=80&fillHeight=540&fillWidth=960",
+            playback_url=build_signed_url(f"/stream/{item_id}/master.m3u8", settings.SIGNED_URL_TTL_SECONDS),
+            genre=genres[0] if genres else None,
+        )
+
 
 class VideosQuery(graphene.ObjectType):
     videos = graphene.List(VideoType, genre=graphene.String(required=False))
     video = graphene.Field(VideoType, id=graphene.ID(required=True))
+    # Read straight from Jellyfin. The resolvers are async, so sibling fields
+    # fetch concurrently (videos.jellyfin_async, core.async_execution).
+    jellyfin_videos = graphene.List(JellyfinVideoType, genre=graphene.String(required=False))
+    jellyfin_video = graphene.Field(JellyfinVideoType, id=graphene.ID(required=True))
 
     def resolve_videos(self, info, genre=None):
-        qs = Video.objects.filter(is_active=True).order_by('-created_at')
+        qs = Video.objects.filter(is_active=True).select_related('genre').order_by('-created_at')
         if genre:
             qs = qs.filter(genre__name__iexact=genre)
         return qs
 
     def resolve_video(self, info, id):
-        return Video.objects.get(pk=id, is_active=True)
+        return Video.objects.select_related('genre').get(pk=id, is_active=True)
+
+    async def resolve_jellyfin_videos(self, info, genre=None):
+        items = await AsyncJellyfinClient().list_items()
+        results: List[JellyfinVideoType] = [JellyfinVideoType.from_item(it) for it in items]
+        if genre:
+            results = [r for r in results if (r.genre or '').lower() == genre.lower()]
+        return results
+
+    async def resolve_jellyfin_video(self, info, id):
+        return JellyfinVideoType.from_item(await AsyncJellyfinClient().get_item(id))
+
+
+class TranscodeProgressType(graphene.ObjectType):
+    video_id = graphene.ID()
+    title = graphene.String()
+    stage = graphene.String(description="thumbnail, packaging, uploading, done or failed")
+    percent = graphene.Float(description="Progress of the current stage, 0-100")
+
+
+async def _events(topics, accept):
+    subscription = events.subscribe(topics)
+    try:
+        async for event in subscription:
+            if accept(event.payload):
+                yield event
+    finally:
+        subscription.close()
+
+
+class VideosSubscription(graphene.ObjectType):
+    """
+    Pushed over WebSocket (``core.subscriptions``). Each event carries a video
+    id, and the selection is resolved from the database like ``video``.
+    """
+    video_added = graphene.Field(VideoType)
+    video_updated = graphene.Field(VideoType, id=graphene.ID(required=False))
+    transcode_progress = graphene.Field(TranscodeProgressType, video_id=graphene.ID(required=False))
+
+    def subscribe_video_added(root, info):
+        return _events([VIDEO_ADDED], lambda payload: payload['active'])
+
+    def subscribe_video_updated(root, info, id=None):
+        return _events(
+            [VIDEO_UPDATED], lambda payload: payload['active'] and (id is None or str(payload['id']) == str(id))
+        )
+
+    def subscribe_transcode_progress(root, info, video_id=None):
+        user = info.context.user
+        if not user.is_authenticated or not user.is_staff:
+            raise Exception("Admin authentication required")
+        return _events(
+            [TRANSCODE_PROGRESS], lambda payload: video_id is None or str(payload['video_id']) == str(video_id)
+        )
+
+    def resolve_video_added(event, info):
+        return Video.objects.filter(pk=event.payload['id'], is_active=True).first()
+
+    def resolve_video_updated(event, info, id=None):
+        return Video.objects.filter(pk=event.payload['id'], is_active=True).first()
+
+    def resolve_transcode_progress(event, info, video_id=None):
+        return event.payload
+
+
+@contextmanager
+def upload_slot(request) -> Iterator[None]:
+    """
+    ``admission.upload`` for a mutation. A rejection becomes a
+    ``RATE_LIMITED`` error, and the view answers 429 with ``Retry-After``.
+    """
+    try:
+        with admission.upload(request):
+            yield
+    except admission.AdmissionRejected as exc:
+        request.retry_after = exc.retry_after
+        raise GraphQLError(str(exc), extensions={'code': 'RATE_LIMITED', 'retryAfter': exc.retry_after})
 
 
 class UploadVideo(graphene.Mutation):
@@ -249,27 +323,80 @@ class UploadVideo(graphene.Mutation):
     video = graphene.Field(VideoType)
 
     @classmethod
-    @transaction.atomic
     def mutate(cls, root, info, title, file, description=None, genre_name=None):
         user = info.context.user
         if not user.is_authenticated or not user.is_staff:
             raise Exception("Admin authentication required")
+        # Outside the transaction: a queued upload must not hold it open
+        with upload_slot(info.context):
+            return cls.store(title, file, description, genre_name)
 
+    @classmethod
+    @transaction.atomic
+    def store(cls, title, file, description=None, genre_name=None):
         genre = None
         if genre_name:
             genre, _ = Genre.objects.get_or_create(name=genre_name)
 
-        video = Video.objects.create(title=title, description=description or '', genre=genre)
-
-        # Save original file
-        original_name = os.path.basename(file)
-        with open(file, 'rb') as f:
-            video.original_file.save(original_name, ContentFile(f.read()))
+        content_hash = hash_file(file)
+        video = Video.objects.filter(content_hash=content_hash, title=title).first()
+        if video is not None:
+            return cls.reuploaded(video, description, genre)
+
+        video = Video(title=title, description=description or '', genre=genre, content_hash=content_hash)
+        existing = (
+            Video.objects.filter(content_hash=content_hash)
+            .exclude(original_file='')
+            .exclude(hls_master_playlist='')
+            .exclude(hls_master_playlist__isnull=True)
+            .first()
+        )
+        if existing is not None and default_storage.exists(existing.original_file.name):
+            # Same content as an earlier upload: share its original and assets
+            video.original_file.name = existing.original_file.name
+            video.thumbnail.name = existing.thumbnail.name
+            video.hls_master_playlist.name = existing.hls_master_playlist.name
+            video.dash_manifest.name = existing.dash_manifest.name
+            video.packaged_on_demand = existing.packaged_on_demand
+            video.duration_seconds = existing.duration_seconds
+            if not cls.insert(video):
+                return cls.reuploaded(Video.objects.get(content_hash=content_hash, title=title), description, genre)
+        else:
+            # Save original file, streamed (multipart upload on object storage)
+            original_name = os.path.basename(file)
+            with open(file, 'rb') as f:
+                video.original_file.save(original_name, File(f), save=False)
+            # Saved first so transcodeProgress events carry the id; videoAdded
+            # is still published once, after commit (videos.events)
+            if not cls.insert(video):
+                video.original_file.delete(save=False)
+                return cls.reuploaded(Video.objects.get(content_hash=content_hash, title=title), description, genre)
+
+            # Generate thumbnail and HLS
+            generate_assets_for_video(video)
+            video.save()
+
+        transaction.on_commit(lambda: invalidate_tags(['videos']))
+        return UploadVideo(ok=True, video=video)
 
-        # Generate thumbnail and HLS
-        generate_assets_for_video(video)
+    @staticmethod
+    def insert(video) -> bool:
+        """
+        Insert ``video``, or return ``False`` when a concurrent upload of the
+        same content and title committed first (the unique constraint).
+        """
+        try:
+            with transaction.atomic():
+                video.save()
+        except IntegrityError:
+            return False
+        return True
 
-        video.save()
+    @classmethod
+    def reuploaded(cls, video, description, genre):
+        # Same content under the same title: keep the row, take the new metadata
+        if video.update_metadata(description, genre):
+            transaction.on_commit(lambda: invalidate_tags(['videos']))
         return UploadVideo(ok=True, video=video)
 
 
@@ -304,55 +431,101 @@ class UnsaveVideo(graphene.Mutation):
         return UnsaveVideo(ok=True)
 
 
+class ReportPlayback(graphene.Mutation):
+    class Arguments:
+        throughput_kbps = graphene.Int(required=True, description="Throughput measured by the player")
+
+    ok = graphene.Boolean()
+    throughput_kbps = graphene.Int(description="Smoothed throughput used to pick variants")
+
+    @classmethod
+    def mutate(cls, root, info, throughput_kbps):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise Exception("Authentication required")
+        if throughput_kbps <= 0:
+            raise Exception("throughputKbps must be positive")
+        return ReportPlayback(ok=True, throughput_kbps=record_throughput(user.pk, throughput_kbps))
+
+
 class VideosMutation(graphene.ObjectType):
     upload_video = UploadVideo.Field()
     save_video = SaveVideo.Field()
     unsave_video = UnsaveVideo.Field()
+    report_playback = ReportPlayback.Field()
 
 
 def generate_assets_for_video(video: Video) -> None:
     """
     Use ffmpeg to create a thumbnail and HLS variants (480p, 720p, 1080p).
     This is a synchronous helper for now; later we can move to Celery.
+    Progress is published as ``transcodeProgress`` events.
+
+    With local storage ffmpeg writes straight into MEDIA_ROOT. With object
+    storage it reads the original through a presigned URL (ranged GETs) and
+    writes to a scratch directory that is uploaded in parallel and removed.
     """
-    input_path = video.original_file.path
-    media_root = settings.MEDIA_ROOT
+    input_path = input_for_ffmpeg(video.original_file)
+    local = is_local(default_storage)
+    work_root = default_storage.path('') if local else tempfile.mkdtemp(prefix='maxstudio-assets-')
+    try:
+        _generate_assets(video, input_path, work_root, local)
+    except Exception:
+        transcode_progress(video, 'failed', 0)
+        raise
+    else:
+        transcode_progress(video, 'done', 100)
+    finally:
+        if not local:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+
+def _generate_assets(video: Video, input_path: str, work_root: str, local: bool) -> None:
     uid = uuid.uuid4().hex
-    hls_dir = os.path.join(media_root, 'videos', 'hls', uid)
+    hls_dir = os.path.join(work_root, 'videos', 'hls', uid)
     os.makedirs(hls_dir, exist_ok=True)
 
     # Thumbnail at 3 seconds
-    thumb_path = os.path.join(media_root, 'videos', 'thumbnails', f'{uid}.jpg')
+    transcode_progress(video, 'thumbnail', 0)
+    thumb_path = os.path.join(work_root, 'videos', 'thumbnails', f'{uid}.jpg')
     os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
     subprocess.run([
         'ffmpeg', '-y', '-ss', '00:00:03', '-i', input_path, '-vframes', '1', '-vf', 'scale=640:-1', thumb_path
     ], check=True)
-    rel_thumb = os.path.relpath(thumb_path, media_root)
-    video.thumbnail.name = rel_thumb.replace('\\', '/')
-
-    # Build HLS outputs
-    master_playlist_path = os.path.join(hls_dir, 'master.m3u8')
-    variant_cmds: List[str] = [
-        '-filter:v:0', 'scale=w=854:h=480:force_original_aspect_ratio=decrease', '-c:v:0', 'h264', '-b:v:0', '800k', '-maxrate:v:0', '856k', '-bufsize:v:0', '1200k', '-c:a:0', 'aac', '-b:a:0', '96k',
-        '-filter:v:1', 'scale=w=1280:h=720:force_original_aspect_ratio=decrease', '-c:v:1', 'h264', '-b:v:1', '2800k', '-maxrate:v:1', '2996k', '-bufsize:v:1', '4200k', '-c:a:1', 'aac', '-b:a:1', '128k',
-        '-filter:v:2', 'scale=w=1920:h=1080:force_original_aspect_ratio=decrease', '-c:v:2', 'h264', '-b:v:2', '5000k', '-maxrate:v:2', '5350k', '-bufsize:v:2', '7500k', '-c:a:2', 'aac', '-b:a:2', '192k',
-    ]
-
-    hls_flags = [
-        '-f', 'hls', '-hls_playlist_type', 'vod', '-hls_time', '6', '-hls_list_size', '0',
-        '-master_pl_name', 'master.m3u8', '-var_stream_map', 'v:0,a:0 v:1,a:1 v:2,a:2',
-    ]
-
-    # Output pattern
-    out_pattern = os.path.join(hls_dir, '%v', 'index.m3u8')
-    os.makedirs(os.path.join(hls_dir, '0'), exist_ok=True)
-    os.makedirs(os.path.join(hls_dir, '1'), exist_ok=True)
-    os.makedirs(os.path.join(hls_dir, '2'), exist_ok=True)
-
-    cmd = ['ffmpeg', '-y', '-i', input_path, '-map', '0:v:0', '-map', '0:a:0'] + variant_cmds + hls_flags + ['-strftime_mkdir', '1', '-use_localtime_mkdir', '1', out_pattern]
-    subprocess.run(cmd, check=True)
-
-    rel_master = os.path.relpath(master_playlist_path, media_root)
-    video.hls_master_playlist.name = rel_master.replace('\\', '/')
-
-
+    rel_thumb = os.path.relpath(thumb_path, work_root).replace('\\', '/')
+    if not local:
+        rel_thumb = save_path(rel_thumb, thumb_path)
+    video.thumbnail.name = rel_thumb
+
+    on_progress = _packaging_progress(video, input_path)
+    if settings.MEDIA_PACKAGING == 'cmaf':
+        run_with_progress(cmaf_command(input_path, hls_dir), on_progress)
+    elif settings.MEDIA_JIT_PACKAGING:
+        # Lowest rendition now, the others segment by segment on first request
+        run_with_progress(ts_command(input_path, hls_dir, RENDITIONS[:1]), on_progress)
+        write_on_demand_playlists(hls_dir)
+        video.packaged_on_demand = True
+    else:
+        run_with_progress(ts_command(input_path, hls_dir), on_progress)
+
+    rel_hls = os.path.relpath(hls_dir, work_root).replace('\\', '/')
+    if not local:
+        transcode_progress(video, 'uploading', 0)
+        upload_tree(hls_dir, rel_hls)
+    video.hls_master_playlist.name = f"{rel_hls}/master.m3u8"
+    if settings.MEDIA_PACKAGING == 'cmaf':
+        video.dash_manifest.name = f"{rel_hls}/manifest.mpd"
+
+
+def _packaging_progress(video: Video, input_path: str):
+    """``on_progress`` publishing the packaging stage at most every EVENTS_PROGRESS_INTERVAL_SECONDS."""
+    duration = probe_duration(input_path)
+    last = [0.0]
+
+    def on_progress(seconds: float) -> None:
+        now = time.monotonic()
+        if duration and now - last[0] >= settings.EVENTS_PROGRESS_INTERVAL_SECONDS:
+            last[0] = now
+            transcode_progress(video, 'packaging', min(seconds / duration * 100, 100))
+
+    return on_progress
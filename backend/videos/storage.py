@@ -0,0 +1,64 @@
+"""
+Helpers for moving media between local disk and ``default_storage``.
+
+``default_storage`` is either the local ``MEDIA_ROOT`` or an S3-compatible
+bucket (``MEDIA_STORAGE=s3``). Everything here streams: files are handed to
+the storage as open file objects, so S3 uploads go through boto3's parallel
+multipart transfer instead of being read into memory.
+"""
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+
+def is_local(storage=default_storage) -> bool:
+    try:
+        storage.path('')
+    except NotImplementedError:
+        return False
+    return True
+
+
+def save_path(name: str, local_path: str, storage=default_storage) -> str:
+    """Stream ``local_path`` into ``storage`` under ``name``; returns the stored name."""
+    with open(local_path, 'rb') as f:
+        return storage.save(name, File(f, name=os.path.basename(local_path)))
+
+
+def upload_tree(local_dir: str, prefix: str, storage=default_storage) -> List[str]:
+    """
+    Upload every file below ``local_dir`` to ``prefix/<relative path>``, several
+    files at a time. Large files additionally use multipart uploads.
+    """
+    jobs: List[Tuple[str, str]] = []
+    for root, _dirs, files in os.walk(local_dir):
+        for filename in files:
+            local_path = os.path.join(root, filename)
+            rel = os.path.relpath(local_path, local_dir).replace(os.sep, '/')
+            jobs.append((posixpath.join(prefix, rel), local_path))
+    with ThreadPoolExecutor(max_workers=settings.MEDIA_UPLOAD_CONCURRENCY) as pool:
+        return list(pool.map(lambda job: _replace(job[0], job[1], storage), jobs))
+
+
+def _replace(name: str, local_path: str, storage) -> str:
+    # Generated asset names are unique per video, keep them verbatim
+    if storage.exists(name):
+        storage.delete(name)
+    return save_path(name, local_path, storage)
+
+
+def input_for_ffmpeg(field_file) -> str:
+    """
+    Path or URL ffmpeg can read ``field_file`` from. Remote objects are read
+    through a presigned URL, which ffmpeg fetches with ranged GETs as it seeks.
+    """
+    storage = field_file.storage
+    if is_local(storage):
+        return field_file.path
+    return storage.url(field_file.name, expire=settings.MEDIA_TRANSCODE_URL_TTL_SECONDS)
+
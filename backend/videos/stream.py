@@ -0,0 +1,95 @@
+"""
+HLS stream proxy. Kept apart from ``videos.views`` so workers that only serve
+``/stream/`` do not import the GraphQL/JWT stack.
+
+The view itself only checks the URL signature; the main URLconf additionally
+wraps it in ``login_required``, while the stream-only entry point
+(``core.stream_wsgi``) relies on the signature alone. Playback sessions are
+admitted by ``core.admission``. Upstream requests go to the item's node in
+the ``videos.backends`` pool. Master playlists are read in full and filtered
+for the client by ``videos.abr``; variant playlists are read in full so
+``videos.readahead`` can prefetch the segments that follow each requested
+one.
+"""
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpRequest,
+    HttpResponse,
+    StreamingHttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotFound,
+)
+from django.utils.cache import patch_vary_headers
+from django.views import View
+
+from core import admission
+from . import backends, readahead
+from .jellyfin_client import verify_signature
+
+
+class ProxyHLSView(View):
+    def get(self, request: HttpRequest, item_id: str, filename: str):
+        import requests
+
+        expires = request.GET.get('expires')
+        sig = request.GET.get('sig')
+        path = request.path.split('?')[0]
+        if not (expires and sig and verify_signature(path, int(expires), sig)):
+            return HttpResponseForbidden('Invalid signature')
+        try:
+            admission.admit_stream(request, item_id)
+        except admission.AdmissionRejected as exc:
+            return admission.retry_later(HttpResponse(str(exc), content_type='text/plain'), exc)
+
+        is_playlist = filename.endswith('.m3u8')
+        if not is_playlist and settings.STREAM_READAHEAD_SEGMENTS:
+            local = readahead.cached(item_id, filename)
+            if local is not None:
+                readahead.schedule(item_id, filename)
+                resp = FileResponse(open(local, 'rb'), content_type=readahead.content_type(filename))
+                resp['X-Readahead'] = 'hit'
+                return resp
+
+        # Proxy request to the Jellyfin node that owns the item
+        started = time.perf_counter()
+        try:
+            r = backends.get(
+                item_id, f"/Videos/{item_id}/{filename}?" + urlencode({'api_key': settings.JELLYFIN_API_KEY}),
+                stream=True,
+            )
+        except requests.RequestException:
+            return HttpResponse('Jellyfin unavailable', status=502, content_type='text/plain')
+        readahead.observe_upstream(time.perf_counter() - started, r.status_code)
+        if r.status_code == 404:
+            backends.release(r)
+            return HttpResponseNotFound()
+        if filename == 'master.m3u8' and r.status_code == 200 and settings.HLS_ABR_FILTERING:
+            return self.filtered_master(request, r)
+        if is_playlist and r.status_code == 200 and settings.STREAM_READAHEAD_SEGMENTS:
+            # Variant playlists are small: read them whole to learn the segment order
+            text = r.text
+            backends.release(r)
+            readahead.remember_playlist(item_id, filename, text)
+            return HttpResponse(text, content_type=r.headers.get('Content-Type', 'application/vnd.apple.mpegurl'))
+        if not is_playlist and r.status_code == 200 and settings.STREAM_READAHEAD_SEGMENTS:
+            readahead.schedule(item_id, filename)
+        headers = {k: v for k, v in r.headers.items() if k.lower() in ['content-type', 'content-length']}
+        resp = StreamingHttpResponse(backends.body(r), status=r.status_code)
+        for k, v in headers.items():
+            resp[k] = v
+        return resp
+
+    def filtered_master(self, request: HttpRequest, r):
+        # Jellyfin masters differ per request, so they are filtered but not cached
+        from .abr import bandwidth_cap, filter_master
+
+        text = r.text
+        backends.release(r)
+        body = filter_master(text, bandwidth_cap(request))
+        resp = HttpResponse(body, content_type=r.headers.get('Content-Type', 'application/vnd.apple.mpegurl'))
+        patch_vary_headers(resp, ('Save-Data', 'X-Device-Class'))
+        return resp
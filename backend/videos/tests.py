@@ -0,0 +1,191 @@
+import html
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+
+from . import disk_cache
+from .events import VIDEO_ADDED, VIDEO_UPDATED
+from .library import hash_file
+from .models import Video
+from .packaging import ON_DEMAND_MARKER
+from .playback import rewrite_manifest, rewrite_playlist
+from .views import AdminUploadAPI
+
+
+class ByteCounterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name: str, age: int) -> int:
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 100)
+        os.utime(path, (time.time() - age, time.time() - age))
+        return 100
+
+    def test_workers_share_one_budget(self):
+        # Two workers, each under the budget on its own
+        workers = [disk_cache.ByteCounter(('.ts',)), disk_cache.ByteCounter(('.ts',))]
+        for i in range(5):
+            workers[i % 2].add(self.directory, 450, self.write(f"{i}.ts", age=100 - i))
+
+        self.assertEqual(sorted(os.listdir(self.directory)), ['.evict.lock', '1.ts', '2.ts', '3.ts', '4.ts'])
+        self.assertEqual(cache.get(disk_cache.KEY_PREFIX + self.directory), 400)
+
+
+@override_settings(SIGNED_URL_TTL_SECONDS=900, MEDIA_SEGMENT_URL_TTL_SECONDS=21600)
+class RewritePlaylistTests(SimpleTestCase):
+    def expires_in(self, uri: str) -> int:
+        return int(parse_qs(urlparse(uri).query)['expires'][0]) - int(time.time())
+
+    def test_on_demand_segments_outlive_the_playlist_ttl(self):
+        text = '\n'.join([
+            '#EXTM3U', ON_DEMAND_MARKER, '#EXT-X-PLAYLIST-TYPE:VOD',
+            '#EXTINF:6.000,', 'segment0.ts', '#EXT-X-ENDLIST',
+        ])
+        lines = rewrite_playlist(text, 7, '0/index.m3u8', 'hls/7/0/index.m3u8').splitlines()
+        segment = next(line for line in lines if line.startswith('/hls/'))
+
+        self.assertTrue(segment.startswith('/hls/7/0/segment0.ts?'))
+        self.assertAlmostEqual(self.expires_in(segment), 21600, delta=5)
+
+    def test_nested_playlists_keep_the_signed_url_ttl(self):
+        text = '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\n0/index.m3u8\n'
+        lines = rewrite_playlist(text, 7, 'master.m3u8', 'hls/7/master.m3u8').splitlines()
+
+        self.assertTrue(lines[-1].startswith('/hls/7/0/index.m3u8?'))
+        self.assertAlmostEqual(self.expires_in(lines[-1]), 900, delta=5)
+
+
+@override_settings(SIGNED_URL_TTL_SECONDS=900, MEDIA_SEGMENT_URL_TTL_SECONDS=21600)
+class RewriteManifestTests(SimpleTestCase):
+    def test_template_signature_expires_with_the_segments(self):
+        text = '<SegmentTemplate initialization="init_$RepresentationID$.m4s" media="chunk_$Number$.m4s"/>'
+        templates = re.findall(r'(?:initialization|media)="([^"]+)"', rewrite_manifest(text, 7))
+
+        self.assertEqual(len(templates), 2)
+        for template in templates:
+            query = parse_qs(urlparse(html.unescape(template)).query)
+            self.assertAlmostEqual(int(query['expires'][0]) - int(time.time()), 21600, delta=5)
+
+
+@override_settings(ADMISSION_ENABLED=False)
+@mock.patch('videos.views.backends.refresh_library')
+class AdminUploadTests(TestCase):
+    def setUp(self):
+        self.library = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.library)
+        override = override_settings(JELLYFIN_LIBRARY_PATH=self.library)
+        override.enable()
+        self.addCleanup(override.disable)
+        staff = get_user_model().objects.create_user('staff', password='pw', is_staff=True)
+        self.token = get_token(staff)
+
+    def upload(self, title: str, content: bytes = b'movie'):
+        request = RequestFactory().post(
+            '/api/admin/upload/',
+            {'title': title, 'file': SimpleUploadedFile('movie.mp4', content)},
+            HTTP_AUTHORIZATION=f"JWT {self.token}",
+        )
+        return json.loads(AdminUploadAPI.__wrapped__.as_view()(request).content)
+
+    def test_library_file_is_relative_to_the_library(self, refresh):
+        self.upload('Movie')
+
+        video = Video.objects.get(title='Movie')
+        self.assertEqual(video.library_file, 'movie.mp4')
+        self.assertFalse(video.original_file)
+        self.assertTrue(os.path.isfile(os.path.join(self.library, video.library_file)))
+
+    def test_dedupe_ignores_media_root_originals(self, refresh):
+        content = b'movie'
+        path = os.path.join(self.library, 'probe')
+        with open(path, 'wb') as f:
+            f.write(content)
+        Video.objects.create(title='Uploaded', original_file='videos/originals/movie.mp4', content_hash=hash_file(path))
+        os.unlink(path)
+
+        response = self.upload('Library copy', content)
+
+        self.assertFalse(response['duplicate'])
+        self.assertEqual(Video.objects.get(title='Library copy').library_file, 'movie.mp4')
+        self.assertTrue(self.upload('Second title', content)['duplicate'])
+        self.assertEqual(os.listdir(self.library), ['movie.mp4'])
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.library = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.library)
+        override = override_settings(JELLYFIN_LIBRARY_PATH=self.library)
+        override.enable()
+        self.addCleanup(override.disable)
+        for name in ('first.mp4', 'second.mp4'):
+            with open(os.path.join(self.source, name), 'wb') as f:
+                f.write(name.encode())
+
+    def ingest(self) -> str:
+        out = io.StringIO()
+        call_command('ingest', self.source, '--no-refresh', '--workers', '2', stdout=out)
+        return out.getvalue()
+
+    def test_rerun_creates_nothing(self):
+        self.assertIn('2 videos created', self.ingest())
+        self.assertIn('0 videos created', self.ingest())
+        self.assertEqual(
+            sorted(Video.objects.values_list('library_file', flat=True)), ['first.mp4', 'second.mp4']
+        )
+
+    def test_rows_skipped_by_conflicts_are_not_counted(self):
+        # Same content and title uploaded through GraphQL before
+        Video.objects.create(
+            title='first', original_file='videos/originals/first.mp4',
+            content_hash=hash_file(os.path.join(self.source, 'first.mp4')),
+        )
+
+        self.assertIn('1 videos created', self.ingest())
+        self.assertEqual(Video.objects.count(), 2)
+
+
+@mock.patch('videos.events.events.publish')
+class VideoSavedTests(TestCase):
+    def test_saves_collapse_into_one_event(self, publish):
+        with self.captureOnCommitCallbacks(execute=True):
+            video = Video.objects.create(title='Movie')
+            video.save()
+
+        publish.assert_called_once_with(VIDEO_ADDED, {'id': video.pk, 'active': True})
+
+    def test_rolled_back_save_does_not_swallow_the_next_event(self, publish):
+        with self.captureOnCommitCallbacks(execute=True):
+            video = Video.objects.create(title='Movie')
+        publish.reset_mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    video.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            video.save()
+
+        publish.assert_called_once_with(VIDEO_UPDATED, {'id': video.pk, 'active': True})
@@ -1,51 +1,17 @@
-from urllib.parse import urlencode
-
 from django.conf import settings
-from django.contrib.auth.decorators import login_required
 from django.http import (
     HttpRequest,
-    HttpResponse,
-    StreamingHttpResponse,
-    HttpResponseForbidden,
-    HttpResponseNotFound,
     JsonResponse,
 )
-from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-import requests
 import os
 from typing import Optional
 
-from .jellyfin_client import verify_signature, JellyfinClient
-from graphql_jwt.settings import jwt_settings
-from graphql_jwt.utils import get_user_by_payload
-
-
-@method_decorator(login_required, name='dispatch')
-class ProxyHLSView(View):
-    def get(self, request: HttpRequest, item_id: str, filename: str):
-        expires = request.GET.get('expires')
-        sig = request.GET.get('sig')
-        path = request.path.split('?')[0]
-        if not (expires and sig and verify_signature(path, int(expires), sig)):
-            return HttpResponseForbidden('Invalid signature')
-
-        # Proxy request to Jellyfin
-        upstream = f"{settings.JELLYFIN_URL}/Videos/{item_id}/{filename}"
-        params = {
-            'api_key': settings.JELLYFIN_API_KEY,
-        }
-        upstream_url = upstream + '?' + urlencode(params)
-        r = requests.get(upstream_url, stream=True)
-        if r.status_code == 404:
-            return HttpResponseNotFound()
-        headers = {k: v for k, v in r.headers.items() if k.lower() in ['content-type', 'content-length']}
-        resp = StreamingHttpResponse(r.iter_content(chunk_size=8192), status=r.status_code)
-        for k, v in headers.items():
-            resp[k] = v
-        return resp
-
+from core import admission
+from . import backends
+from .library import free_name, receive
+from .models import Genre, Video
 
 
 @csrf_exempt
@@ -53,17 +19,21 @@ class AdminUploadAPI(View):
     """
     Accepts multipart/form-data with fields: file (binary), title, description (optional), genre (optional).
     Auth: Authorization: JWT <token> (must be an authenticated staff user).
-    Copies file into Jellyfin library and triggers library refresh.
+    Streams the file into the Jellyfin library, hashing it as it is written, and
+    triggers a library refresh. The Video row records the file in
+    ``library_file``, relative to ``JELLYFIN_LIBRARY_PATH``. Content already in
+    the library is not stored again; the new row points at the existing file.
+    Re-uploading content under a title it already has updates that row's
+    description and genre.
     """
     def _authenticate(self, request: HttpRequest) -> Optional[object]:
         auth = request.headers.get('Authorization', '')
         if not auth.startswith('JWT '):
             return None
         token = auth[4:]
+        from accounts.identity_cache import get_user_by_token
         try:
-            payload = jwt_settings.JWT_DECODE_HANDLER(token)
-            user = get_user_by_payload(payload)
-            return user
+            return get_user_by_token(token, request)
         except Exception:
             return None
 
@@ -71,30 +41,70 @@ class AdminUploadAPI(View):
         user = self._authenticate(request)
         if not user or not user.is_authenticated or not user.is_staff:
             return JsonResponse({"error": "Admin authentication required"}, status=401)
+        request.user = user
+        # Before request.FILES, so a rejected upload is not read
+        try:
+            with admission.upload(request):
+                return self._store(request)
+        except admission.AdmissionRejected as exc:
+            return admission.retry_later(JsonResponse({"error": str(exc)}), exc)
 
+    def _store(self, request: HttpRequest):
         upload = request.FILES.get('file')
         title = request.POST.get('title') or ''
-        description = request.POST.get('description') or ''
+        description = request.POST.get('description')
         genre = request.POST.get('genre') or ''
         if not upload or not title:
             return JsonResponse({"error": "Missing file or title"}, status=400)
 
         library_path = settings.JELLYFIN_LIBRARY_PATH
         os.makedirs(library_path, exist_ok=True)
-        dest_filename = upload.name
+        tmp_path, content_hash = receive(upload.chunks(), library_path)
+
+        existing = Video.objects.filter(content_hash=content_hash).exclude(library_file='').first()
+        if existing is not None and os.path.exists(os.path.join(library_path, existing.library_file)):
+            os.unlink(tmp_path)
+            dest_filename = existing.library_file
+            duplicate = True
+        else:
+            dest_filename = free_name(library_path, os.path.basename(upload.name), content_hash)
+            os.replace(tmp_path, os.path.join(library_path, dest_filename))
+            duplicate = False
         dest_path = os.path.join(library_path, dest_filename)
-        with open(dest_path, 'wb') as f:
-            for chunk in upload.chunks():
-                f.write(chunk)
 
-        client = JellyfinClient(settings.JELLYFIN_URL, settings.JELLYFIN_API_KEY, settings.JELLYFIN_USER_ID)
-        client.refresh_library()
+        genre_row = Genre.objects.get_or_create(name=genre)[0] if genre else None
+        # get_or_create also absorbs a concurrent upload of the same content and title
+        video, created = Video.objects.get_or_create(
+            content_hash=content_hash,
+            title=title,
+            defaults={
+                'description': description or '',
+                'genre': genre_row,
+                'library_file': dest_filename,
+                'jellyfin_item_id': existing.jellyfin_item_id if duplicate else '',
+            },
+        )
+        if not created:
+            video.update_metadata(description, genre_row)
+            if video.library_file != dest_filename:
+                # Uploaded through GraphQL before, or its library copy is gone
+                video.library_file = dest_filename
+                video.save(update_fields=['library_file', 'updated_at'])
+
+        if not duplicate:
+            backends.refresh_library()
+
+        from core.response_cache import invalidate_tags
+        invalidate_tags(['videos'])
 
         return JsonResponse({
             "ok": True,
+            "id": video.pk,
             "stored_path": dest_path,
+            "content_hash": content_hash,
+            "duplicate": duplicate,
             "title": title,
-            "description": description,
+            "description": video.description,
             "genre": genre,
         })
 
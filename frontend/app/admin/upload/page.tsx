@@ -1,7 +1,8 @@
 "use client";
 import { gql } from "@apollo/client";
 import { useMutation } from "@apollo/client/react";
-import { useState } from "react";
+import { useEffect, useState } from "react";
+import { subscribe } from "../../subscriptions";
 
 const UPLOAD = gql`
   mutation UploadVideo($title: String!, $file: String!, $description: String, $genreName: String) {
@@ -11,6 +12,18 @@ const UPLOAD = gql`
   }
 `;
 
+const PROGRESS = `
+  subscription TranscodeProgress {
+    transcodeProgress {
+      title
+      stage
+      percent
+    }
+  }
+`;
+
+type ProgressData = { transcodeProgress: { title: string; stage: string; percent: number } };
+
 export default function AdminUploadPage() {
   const [title, setTitle] = useState("");
   const [description, setDescription] = useState("");
@@ -19,6 +32,15 @@ export default function AdminUploadPage() {
   type UploadResult = { uploadVideo: { ok: boolean } };
   type UploadVars = { title: string; file: string; description?: string; genreName?: string | null };
   const [upload, { loading, error, data }] = useMutation<UploadResult, UploadVars>(UPLOAD);
+  const [progress, setProgress] = useState<string | null>(null);
+
+  useEffect(() => {
+    if (!loading) return;
+    setProgress(null);
+    return subscribe<ProgressData>(PROGRESS, {}, ({ transcodeProgress: p }) => {
+      if (p.title === title) setProgress(`${p.stage} ${Math.round(p.percent)}%`);
+    });
+  }, [loading, title]);
 
   return (
     <div className="min-h-screen bg-neutral-950 text-neutral-100">
@@ -72,6 +94,7 @@ export default function AdminUploadPage() {
               required
             />
           </div>
+          {loading && progress ? <div className="text-neutral-400 text-sm">Processing: {progress}</div> : null}
           {error ? <div className="text-red-400 text-sm">{error.message}</div> : null}
           {data?.uploadVideo?.ok ? (
             <div className="text-green-400 text-sm">Upload requested. Library refresh may take a moment.</div>
@@ -3,7 +3,8 @@ import { gql } from "@apollo/client";
 import { useQuery } from "@apollo/client/react";
 import Image from "next/image";
 import Link from "next/link";
-import { useMemo, useState } from "react";
+import { useEffect, useMemo, useState } from "react";
+import { subscribe } from "./subscriptions";
 
 const VIDEOS = gql`
   query Videos($genre: String) {
@@ -33,7 +34,15 @@ type VideosVars = { genre?: string };
 export default function Home() {
   const [query, setQuery] = useState("");
   const [genre, setGenre] = useState<string | undefined>(undefined);
-  const { data, loading } = useQuery<VideosData, VideosVars>(VIDEOS, { variables: { genre } });
+  const { data, loading, refetch } = useQuery<VideosData, VideosVars>(VIDEOS, { variables: { genre } });
+
+  // Refresh when the catalog changes instead of polling for it
+  useEffect(() => {
+    const stops = ["videoAdded", "videoUpdated"].map((field) =>
+      subscribe(`subscription { ${field} { id } }`, {}, () => refetch())
+    );
+    return () => stops.forEach((stop) => stop());
+  }, [refetch]);
 
   const items = useMemo(() => {
     const list: VideoItem[] = data?.videos ?? [];
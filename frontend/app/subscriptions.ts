@@ -0,0 +1,46 @@
+"use client";
+
+// Minimal graphql-transport-ws client for the backend's /graphql/ WebSocket.
+// Reconnects with backoff until unsubscribed.
+
+const httpUrl = process.env.NEXT_PUBLIC_GRAPHQL_URL || "http://localhost:8000/graphql/";
+const wsUrl = process.env.NEXT_PUBLIC_GRAPHQL_WS_URL || httpUrl.replace(/^http/, "ws");
+
+type Next<T> = (data: T) => void;
+
+export function subscribe<T>(query: string, variables: Record<string, unknown>, onNext: Next<T>): () => void {
+  let socket: WebSocket | null = null;
+  let stopped = false;
+  let retry = 0;
+
+  const connect = () => {
+    socket = new WebSocket(wsUrl, "graphql-transport-ws");
+    socket.onopen = () => {
+      const token = localStorage.getItem("token");
+      socket?.send(JSON.stringify({ type: "connection_init", payload: token ? { authorization: `JWT ${token}` } : {} }));
+    };
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === "connection_ack") {
+        retry = 0;
+        socket?.send(JSON.stringify({ id: "1", type: "subscribe", payload: { query, variables } }));
+      } else if (message.type === "ping") {
+        socket?.send(JSON.stringify({ type: "pong" }));
+      } else if (message.type === "next" && message.payload?.data) {
+        onNext(message.payload.data as T);
+      }
+    };
+    socket.onclose = (event) => {
+      // 4403: rejected token, retrying will not help
+      if (stopped || event.code === 4403) return;
+      retry = Math.min(retry + 1, 6);
+      setTimeout(connect, 500 * 2 ** retry);
+    };
+  };
+
+  connect();
+  return () => {
+    stopped = true;
+    socket?.close();
+  };
+}
@@ -33,7 +33,24 @@ class MyApp extends StatelessWidget {
       },
     );
     
-    final link = authLink.concat(httpLink);
+    // Subscriptions (catalog and transcode events) go over the WebSocket
+    final wsLink = WebSocketLink(
+      'ws://10.0.2.2:8000/graphql/',
+      subProtocol: GraphQLProtocol.graphqlTransportWs,
+      config: SocketClientConfig(
+        initialPayload: () async {
+          final prefs = await SharedPreferences.getInstance();
+          final token = prefs.getString('token');
+          return token != null ? {'authorization': 'JWT $token'} : {};
+        },
+      ),
+    );
+
+    final link = Link.split(
+      (request) => request.isSubscription,
+      wsLink,
+      authLink.concat(httpLink),
+    );
     
     final client = ValueNotifier(
       GraphQLClient(